@@ -1,14 +1,34 @@
-from flask import Flask, render_template, request, jsonify, flash, redirect, url_for
+from flask import Flask, Response, g, render_template, request, jsonify, flash, redirect, url_for
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+import json
 import logging
 import os
+import redis
+import secrets
+import time
+import uuid
 from config import config
 from src.services.decision_analyzer import DecisionAnalyzer
-from src.services.behavior_engine import BehaviorEngine
-from src.models.population import PopulationGenerator
+from src.services.decision_registry import DecisionRegistry
+from src.services.behavior_engine import BehaviorEngine, SimulationCancelled
+from src.services.checkpoint_store import CheckpointStore
+from src.services.population_store import PopulationStore
+from src.services.job_manager import JobManager, JobQueueFull
+from src.services.llm_provider import create_provider
+from src.services.aggregation import OnlineAggregator
+from src.services.archetypes import ArchetypeGrouper, ArchetypeSignature
+from src.services.sampling import SamplingPlan
+from src.services.surrogate import SurrogatePlan
+from src.services.work_queue import RedisWorkQueue
+from src.models.population import PopulationGenerator, PopulationFrame, population_key
+from src.utils.cache import TwoTierCache, create_cache_backend
+from src.utils.rate_limiter import AdaptiveRateLimiter
 from src.utils.logger import setup_logger
+from src.utils.metrics import REQUEST_BYTES, REQUEST_LATENCY, RESPONSE_BYTES, render_metrics, time_stage
+from src.utils.profiler import ProfilerBusy, ProfileStore
+from src.utils.tracing import current_trace_id, end_trace, log_span, start_trace
 
 def create_app(config_name=None):
     """Application factory pattern"""
@@ -25,14 +45,165 @@ def create_app(config_name=None):
         storage_uri=app.config['RATELIMIT_STORAGE_URL']
     )
     limiter.init_app(app)
-
+    
     # Setup logging
     setup_logger(app.config['LOG_LEVEL'])
     
+    # Initialize caches: in-process LRU in front of the shared backend
+    cache_backend = create_cache_backend(
+        app.config['CACHE_BACKEND'],
+        redis_url=app.config['REDIS_URL'],
+        sqlite_path=app.config['CACHE_SQLITE_PATH'],
+        max_entries=app.config['CACHE_MAX_ENTRIES']
+    )
+    analysis_cache = TwoTierCache('analyses', ttl=app.config['CACHE_TTL'], maxsize=1000, backend=cache_backend)
+    reaction_cache = TwoTierCache('reactions', ttl=app.config['CACHE_TTL'], maxsize=5000, backend=cache_backend)
+    decision_cache = TwoTierCache('decisions', ttl=app.config['DECISION_TTL'], maxsize=1000, backend=cache_backend)
+    
+    # One client-side limiter for every Gemini call made by this process
+    rate_limiter = AdaptiveRateLimiter(
+        requests_per_minute=app.config['GEMINI_REQUESTS_PER_MINUTE'],
+        tokens_per_minute=app.config['GEMINI_TOKENS_PER_MINUTE'],
+        max_concurrency=app.config['MAX_WORKERS'],
+        max_retries=app.config['GEMINI_MAX_RETRIES']
+    )
+    
+    # One LLM backend shared by both services
+    llm_provider = create_provider(
+        app.config['LLM_PROVIDER'],
+        api_key=app.config['GEMINI_API_KEY'],
+        stub_latency=app.config['STUB_LATENCY'],
+        stub_latency_distribution=app.config['STUB_LATENCY_DISTRIBUTION'],
+        stub_error_rate=app.config['STUB_ERROR_RATE'],
+        stub_rate_limit_rate=app.config['STUB_RATE_LIMIT_RATE'],
+        stub_malformed_rate=app.config['STUB_MALFORMED_RATE']
+    )
+    
+    # Distributed simulations: jobs queue their people for worker.py processes
+    work_queue = None
+    if app.config['SIMULATION_BACKEND'] == 'redis':
+        work_queue = RedisWorkQueue.from_url(
+            app.config['REDIS_URL'],
+            visibility_timeout=app.config['QUEUE_VISIBILITY_TIMEOUT'],
+            max_attempts=app.config['QUEUE_MAX_ATTEMPTS'],
+            max_pending=app.config['QUEUE_MAX_PENDING']
+        )
+    
     # Initialize services
-    decision_analyzer = DecisionAnalyzer(app.config['GEMINI_API_KEY'])
-    behavior_engine = BehaviorEngine(app.config['GEMINI_API_KEY'])
+    decision_analyzer = DecisionAnalyzer(
+        cache_ttl=app.config['CACHE_TTL'],
+        cache=analysis_cache,
+        rate_limiter=rate_limiter,
+        provider=llm_provider,
+        coalesce_timeout=app.config['COALESCE_TIMEOUT']
+    )
+    behavior_engine = BehaviorEngine(
+        cache_ttl=app.config['CACHE_TTL'],
+        max_workers=app.config['MAX_WORKERS'],
+        cache=reaction_cache,
+        personas_per_prompt=app.config['PERSONAS_PER_PROMPT'],
+        max_batch_retries=app.config['MAX_BATCH_RETRIES'],
+        rate_limiter=rate_limiter,
+        provider=llm_provider,
+        work_queue=work_queue,
+        coalesce_timeout=app.config['COALESCE_TIMEOUT']
+    )
+    decision_registry = DecisionRegistry(decision_cache)
     population_generator = PopulationGenerator()
+    job_manager = JobManager(
+        max_workers=app.config['JOB_WORKERS'],
+        max_queued=app.config['JOB_MAX_QUEUED'],
+        job_timeout=app.config['JOB_TIMEOUT'],
+        retention=app.config['JOB_RETENTION']
+    )
+    profile_store = ProfileStore(
+        interval=app.config['PROFILE_INTERVAL'],
+        max_seconds=app.config['PROFILE_MAX_SECONDS']
+    )
+    
+    def _pinned_populations():
+        """Populations of queued or running jobs and of checkpointed simulations, kept out of eviction"""
+        pinned = {job.metadata.get('population_id') for job in job_manager.active()}
+        if checkpoint_store is not None:
+            pinned |= checkpoint_store.population_ids()
+        return pinned
+    
+    population_store = PopulationStore(
+        app.config['POPULATION_STORE_DIR'],
+        max_populations=app.config['POPULATION_STORE_MAX'],
+        pinned=_pinned_populations
+    )
+    checkpoint_store = None
+    if app.config['CHECKPOINT_PATH']:
+        checkpoint_store = CheckpointStore(
+            app.config['CHECKPOINT_PATH'],
+            retention=app.config['CHECKPOINT_RETENTION']
+        )
+    
+    def _is_admin():
+        """Whether the request carries the configured admin token"""
+        token = app.config['ADMIN_TOKEN']
+        return bool(token) and secrets.compare_digest(request.headers.get('X-Admin-Token', ''), token)
+    
+    @app.before_request
+    def start_request_trace():
+        """Trace id (the caller's X-Trace-Id, or a new one) and timer for the request"""
+        trace_id = request.headers.get('X-Trace-Id', '')
+        valid = 0 < len(trace_id) <= 64 and all(char.isalnum() or char == '-' for char in trace_id)
+        g.trace_tokens = start_trace(trace_id if valid else None)
+        g.request_started = time.perf_counter()
+        
+        # Admins can profile a single request with X-Profile: 1
+        g.profiler = None
+        if request.headers.get('X-Profile') and _is_admin():
+            try:
+                g.profiler = profile_store.start()
+            except ProfilerBusy as e:
+                g.profile_error = str(e)
+    
+    @app.after_request
+    def record_request_metrics(response):
+        """Latency and payload sizes by route template, so ids do not explode label cardinality"""
+        started = g.pop('request_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            duration = time.perf_counter() - started
+            REQUEST_LATENCY.labels(request.method, route, response.status_code).observe(duration)
+            if request.content_length:
+                REQUEST_BYTES.labels(route).observe(request.content_length)
+            if not response.is_streamed and response.content_length is not None:
+                RESPONSE_BYTES.labels(route).observe(response.content_length)
+            log_span('request', duration, method=request.method, route=route, status=response.status_code)
+        
+        trace_id = current_trace_id()
+        if trace_id:
+            response.headers['X-Trace-Id'] = trace_id
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            if response.is_streamed:
+                # The body is produced after this returns; profile until the stream closes
+                response.call_on_close(lambda: profile_store.finish(trace_id, profiler))
+            else:
+                profile_store.finish(trace_id, profiler)
+            response.headers['X-Profile-Id'] = trace_id
+        elif 'profile_error' in g:
+            response.headers['X-Profile-Error'] = g.pop('profile_error')
+        return response
+    
+    @app.teardown_request
+    def end_request_trace(error=None):
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            # after_request did not run (unhandled error); still release the profiler
+            profile_store.finish(current_trace_id(), profiler)
+        tokens = g.pop('trace_tokens', None)
+        if tokens is not None:
+            end_trace(tokens)
+    
+    def _analyze_decision(decision_text, decision_params):
+        """Decision analysis for registry misses, timed as its own stage"""
+        with time_stage('decision_analysis'):
+            return decision_analyzer.analyze_decision(decision_text, decision_params)
     
     @app.route('/')
     def index():
@@ -51,15 +222,22 @@ def create_app(config_name=None):
         try:
             data = request.get_json()
             decision_text = data.get('decision')
+            decision_params = data.get('parameters')
             
             if not decision_text:
                 return jsonify({'error': 'Decision text is required'}), 400
+            if decision_params is not None and not isinstance(decision_params, dict):
+                return jsonify({'error': 'Parameters must be an object'}), 400
             
-            # Analyze the decision
-            analysis = decision_analyzer.analyze_decision(decision_text)
+            # Analyze the decision, or reuse the analysis registered under its content hash
+            decision_id, analysis = decision_registry.resolve(
+                decision_text, decision_params, _analyze_decision
+            )
             
             return jsonify({
                 'success': True,
+                # A fallback analysis is not registered, so there is no id to reuse
+                'decision_id': None if analysis.get('fallback') else decision_id,
                 'analysis': analysis
             })
             
@@ -74,62 +252,580 @@ def create_app(config_name=None):
         try:
             data = request.get_json()
             population_params = data.get('parameters', {})
-            size = min(data.get('size', 1000), app.config['MAX_POPULATION_SIZE'])
+            stream = data.get('stream') or request.accept_mimetypes.best == 'application/x-ndjson'
+            max_size = app.config['MAX_STREAM_POPULATION_SIZE' if stream else 'MAX_POPULATION_SIZE']
+            size = min(data.get('size', 1000), max_size)
             
-            # Generate population
-            population = population_generator.generate_population(size, population_params)
+            # Seeded so the same request can reproduce the same population
+            seed = data.get('seed')
+            if seed is None:
+                seed = secrets.randbits(63)
+            elif not isinstance(seed, int) or isinstance(seed, bool) or seed < 0:
+                return jsonify({'error': 'Seed must be a non-negative integer'}), 400
             
-            return jsonify({
+            if stream:
+                return _stream_population(size, population_params, seed)
+            
+            # Seeded populations are stored under their key, so repeating a
+            # request reuses the stored copy instead of regenerating it
+            population_id = population_key(size, population_params, seed)
+            if population_store.exists(population_id):
+                population = population_store.load(population_id)
+            else:
+                with time_stage('population_generation'):
+                    population = population_generator.generate_population(
+                        size, population_params, seed=seed, workers=app.config['POPULATION_WORKERS']
+                    )
+                population_store.save(population, population_id, metadata={
+                    'parameters': population_params,
+                    'seed': seed
+                })
+            
+            response = {
                 'success': True,
-                'population': population,
-                'size': len(population)
-            })
+                'population_id': population_id,
+                'size': len(population),
+                'seed': seed,
+                'summary': population.summary()
+            }
+            
+            # Full profiles only on request; the dashboard pages through
+            # /api/populations/<id>/people instead
+            if data.get('include_population'):
+                response['population'] = population.to_dicts()
             
+            return jsonify(response)
+            
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         except Exception as e:
             app.logger.error(f"Error generating population: {str(e)}")
             return jsonify({'error': 'Failed to generate population'}), 500
     
+    def _stream_population(size, population_params, seed):
+        """Chunked NDJSON response emitting people as they are generated"""
+        chunk_size = app.config['STREAM_CHUNK_SIZE']
+        
+        def generate():
+            emitted = 0
+            people = population_generator.iter_population(size, population_params, seed=seed, chunk_size=chunk_size)
+            try:
+                lines = []
+                for person in people:
+                    lines.append(json.dumps(person, separators=(',', ':')))
+                    if len(lines) == chunk_size:
+                        emitted += len(lines)
+                        yield '\n'.join(lines) + '\n'
+                        lines = []
+                if lines:
+                    emitted += len(lines)
+                    yield '\n'.join(lines) + '\n'
+            finally:
+                # Runs on completion and when the server closes the response
+                # because the client went away; closing `people` stops generation
+                people.close()
+                if emitted < size:
+                    app.logger.info(f"Population stream cancelled after {emitted}/{size} people")
+        
+        return Response(generate(), mimetype='application/x-ndjson', headers={
+            'X-Population-Size': str(size),
+            'X-Population-Seed': str(seed)
+        })
+    
+    @app.route('/api/populations/<population_id>')
+    def get_population(population_id):
+        """Summary of a stored population"""
+        try:
+            population = population_store.load(population_id)
+            metadata = population_store.metadata(population_id)
+        except KeyError:
+            return jsonify({'error': 'Population not found'}), 404
+        
+        return jsonify({
+            'success': True,
+            'population_id': population_id,
+            'size': len(population),
+            'seed': metadata.get('seed'),
+            'parameters': metadata.get('parameters', {}),
+            'summary': population.summary()
+        })
+    
+    @app.route('/api/populations/<population_id>/people')
+    def get_population_people(population_id):
+        """One page of person profiles from a stored population"""
+        try:
+            population = population_store.load(population_id)
+        except KeyError:
+            return jsonify({'error': 'Population not found'}), 404
+        
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        limit = min(max(request.args.get('limit', 100, type=int), 1), app.config['POPULATION_PAGE_MAX'])
+        
+        return jsonify({
+            'success': True,
+            'population_id': population_id,
+            'size': len(population),
+            'offset': offset,
+            'limit': limit,
+            'people': population.to_dicts(offset, offset + limit)
+        })
+    
+    def _archetype_grouper(option):
+        """
+        Grouper for the `archetypes` request option: false to simulate every
+        person, true for the default signature, or a dict of signature
+        overrides plus an optional `per_archetype` count.
+        """
+        if not option:
+            return None
+        
+        option = option if isinstance(option, dict) else {}
+        return ArchetypeGrouper(
+            ArchetypeSignature.from_dict(option),
+            per_archetype=int(option.get('per_archetype', app.config['ARCHETYPES_PER_GROUP']))
+        )
+    
+    def _sampling_plan(option):
+        """
+        Plan for the `sampling` request option: false to simulate everyone,
+        true for the configured defaults, or a dict of SamplingPlan overrides.
+        """
+        if not option:
+            return None
+        
+        option = option if isinstance(option, dict) else {}
+        return SamplingPlan.from_dict({
+            'precision': app.config['SAMPLING_PRECISION'],
+            'confidence': app.config['SAMPLING_CONFIDENCE'],
+            'min_samples': app.config['SAMPLING_MIN_SAMPLES'],
+            **option
+        })
+    
+    def _surrogate_plan(option):
+        """
+        Plan for the `surrogate` request option: false to simulate everyone,
+        true for the configured defaults, or a dict of SurrogatePlan overrides.
+        """
+        if not option:
+            return None
+        
+        option = option if isinstance(option, dict) else {}
+        return SurrogatePlan.from_dict({
+            'training_samples': app.config['SURROGATE_TRAINING_SAMPLES'],
+            'confidence_threshold': app.config['SURROGATE_CONFIDENCE'],
+            'max_llm_fraction': app.config['SURROGATE_MAX_LLM_FRACTION'],
+            **option
+        })
+    
+    def _parse_simulation_request(data):
+        """
+        Validate a simulation request body.
+        
+        Returns:
+            (request, None) with the decision (and its analysis, when a
+            decision_id was given), population frame, archetype grouper,
+            sampling plan and surrogate plan (plus the raw options they came
+            from), or (None, error_response) if it is invalid
+        """
+        data = data or {}
+        decision_id = data.get('decision_id')
+        decision_text = data.get('decision')
+        decision_params = data.get('parameters')
+        population_id = data.get('population_id')
+        population = data.get('population')
+        
+        if not (decision_id or decision_text) or not (population_id or population):
+            return None, (jsonify({'error': 'Decision (or decision_id) and population_id (or population) are required'}), 400)
+        if decision_params is not None and not isinstance(decision_params, dict):
+            return None, (jsonify({'error': 'Parameters must be an object'}), 400)
+        
+        # A registered decision skips analysis entirely
+        decision_analysis = None
+        if decision_id:
+            try:
+                record = decision_registry.get(decision_id)
+            except KeyError:
+                return None, (jsonify({'error': 'Decision not found'}), 404)
+            decision_text, decision_params = record['decision_text'], record['decision_params']
+            decision_analysis = record['analysis']
+        
+        if population_id:
+            try:
+                population = population_store.load(population_id)
+            except KeyError:
+                return None, (jsonify({'error': 'Population not found'}), 404)
+        else:
+            try:
+                population = PopulationFrame.from_records(population)
+            except ValueError as e:
+                return None, (jsonify({'error': str(e)}), 400)
+        
+        if len(population) > app.config['JOB_MAX_POPULATION']:
+            return None, (jsonify({
+                'error': f"Population exceeds the per-job limit of {app.config['JOB_MAX_POPULATION']}"
+            }), 400)
+        
+        try:
+            sampling = _sampling_plan(data.get('sampling'))
+            if sampling is not None:
+                sampling.strata(population[:0])  # reject unknown strata before queueing
+        except (TypeError, ValueError) as e:
+            return None, (jsonify({'error': f"Invalid sampling option: {e}"}), 400)
+        
+        try:
+            surrogate = _surrogate_plan(data.get('surrogate'))
+        except (TypeError, ValueError) as e:
+            return None, (jsonify({'error': f"Invalid surrogate option: {e}"}), 400)
+        
+        # Sampling and surrogate runs replace archetypes unless the request asks for both
+        default_archetypes = app.config['ARCHETYPES_ENABLED'] and sampling is None and surrogate is None
+        options = {
+            'archetypes': data.get('archetypes', default_archetypes),
+            'sampling': data.get('sampling'),
+            'surrogate': data.get('surrogate')
+        }
+        try:
+            archetypes = _archetype_grouper(options['archetypes'])
+        except (TypeError, ValueError) as e:
+            return None, (jsonify({'error': f"Invalid archetypes option: {e}"}), 400)
+        
+        if sum(option is not None for option in (archetypes, sampling, surrogate)) > 1:
+            return None, (jsonify({'error': 'Archetypes, sampling and surrogate cannot be combined'}), 400)
+        
+        profile = bool(data.get('profile'))
+        if profile and not _is_admin():
+            return None, (jsonify({'error': 'Profiling requires the admin token'}), 403)
+        
+        return {
+            'decision_id': decision_id,
+            'decision_text': decision_text,
+            'decision_params': decision_params,
+            'decision_analysis': decision_analysis,
+            'population_id': population_id,
+            'population': population,
+            'archetypes': archetypes,
+            'sampling': sampling,
+            'surrogate': surrogate,
+            'options': options,
+            'profile': profile
+        }, None
+    
+    def _open_checkpoint(simulation_id, simulation, decision_id, decision_analysis):
+        """
+        Record a simulation in the checkpoint store and open its checkpoint.
+        Inline populations are stored first, so the run can be resumed.
+        """
+        population_id = simulation['population_id']
+        if population_id is None:
+            population_id = population_store.save(simulation['population'])
+        checkpoint_store.begin(simulation_id, decision_id, {
+            'decision': simulation['decision_text'],
+            'parameters': simulation['decision_params'],
+            'population_id': population_id,
+            **simulation['options']
+        }, decision_analysis)
+        return checkpoint_store.open(simulation_id, decision_id)
+    
+    def _submit_simulation(simulation):
+        """Queue a parsed simulation request (or a resumed one) as a background job"""
+        decision_text = simulation['decision_text']
+        population = simulation['population']
+        archetypes = simulation['archetypes']
+        # A new simulation is checkpointed under its first job's id
+        simulation_id = simulation.get('simulation_id') or uuid.uuid4().hex
+        
+        def run(job):
+            decision_id, decision_analysis = simulation['decision_id'], simulation['decision_analysis']
+            if decision_analysis is None:
+                job.stage = 'analyzing'
+                decision_id, decision_analysis = decision_registry.resolve(
+                    decision_text, simulation['decision_params'], _analyze_decision
+                )
+            
+            checkpoint = None
+            if checkpoint_store is not None:
+                checkpoint = _open_checkpoint(simulation_id, simulation, decision_id, decision_analysis)
+            
+            # Running totals, served as partial results while the job runs
+            aggregator = OnlineAggregator(decision_analysis)
+            job.partial = aggregator.snapshot
+            job.partial_version = lambda: aggregator.version
+            
+            job.stage = 'simulating'
+            status = 'failed'
+            try:
+                with time_stage('simulation'):
+                    results = behavior_engine.simulate_population_behavior(
+                        population,
+                        decision_analysis,
+                        batch_size=app.config['DEFAULT_BATCH_SIZE'],
+                        archetypes=archetypes,
+                        cancel_event=job.cancel_event,
+                        progress=lambda reactions, total: job.advance(len(reactions), total),
+                        aggregator=aggregator,
+                        sampling=simulation['sampling'],
+                        surrogate=simulation['surrogate'],
+                        checkpoint=checkpoint
+                    )
+                status = 'completed'
+            except SimulationCancelled:
+                status = 'cancelled'
+                raise
+            finally:
+                if checkpoint is not None:
+                    checkpoint.flush()
+                    checkpoint_store.finish(simulation_id, status)
+            
+            return {
+                'simulation_id': simulation_id,
+                'decision_id': decision_id,
+                'decision_analysis': decision_analysis,
+                'simulation_results': results
+            }
+        
+        def run_profiled(job):
+            """`run` under the sampling profiler; the profile is kept under the job id"""
+            try:
+                profiler = profile_store.start()
+            except ProfilerBusy as e:
+                app.logger.warning(f"Job {job.job_id} runs unprofiled: {str(e)}")
+                return run(job)
+            try:
+                return run(job)
+            finally:
+                profile_store.finish(job.job_id, profiler)
+        
+        return job_manager.submit(
+            run_profiled if simulation['profile'] else run,
+            job_id=None if 'simulation_id' in simulation else simulation_id,
+            simulation_id=simulation_id,
+            resumed='simulation_id' in simulation,
+            decision_id=simulation['decision_id'],
+            population_id=simulation['population_id'],
+            population_size=len(population),
+            trace_id=current_trace_id(),
+            profiled=simulation['profile']
+        )
+    
+    @app.route('/api/simulations', methods=['POST'])
+    @limiter.limit("5 per minute")
+    def submit_simulation():
+        """Queue a simulation and return its job id immediately"""
+        simulation, error = _parse_simulation_request(request.get_json())
+        if error:
+            return error
+        
+        try:
+            job = _submit_simulation(simulation)
+        except JobQueueFull:
+            return jsonify({'error': 'Simulation queue is full, try again later'}), 503
+        
+        return jsonify({'success': True, **job.to_dict()}), 202
+    
+    @app.route('/api/simulations/<job_id>')
+    def get_simulation(job_id):
+        """Job status with completed/total counts, plus results once completed"""
+        try:
+            job = job_manager.get(job_id)
+        except KeyError:
+            return jsonify({'error': 'Simulation not found'}), 404
+        
+        response = job.to_dict()
+        if job.status == 'completed':
+            response.update(job.result)
+        return jsonify(response)
+    
+    @app.route('/api/simulations/<job_id>/partial')
+    def get_simulation_partial(job_id):
+        """Results aggregated over the reactions completed so far"""
+        try:
+            job = job_manager.get(job_id)
+        except KeyError:
+            return jsonify({'error': 'Simulation not found'}), 404
+        
+        response = job.to_dict()
+        response['partial_results'] = job.partial() if job.partial and job.completed else None
+        return jsonify(response)
+    
+    @app.route('/api/simulations/<job_id>/events')
+    def simulation_events(job_id):
+        """
+        Server-Sent Events stream of a job.
+        
+        Sends a `progress` event with the job status and partial results
+        whenever new reactions have been aggregated, comment heartbeats in
+        between, and a final `done` event with the full status (and
+        results, if it completed).
+        """
+        try:
+            job = job_manager.get(job_id)
+        except KeyError:
+            return jsonify({'error': 'Simulation not found'}), 404
+        
+        interval = app.config['SSE_INTERVAL']
+        
+        def event(name, payload):
+            return f"event: {name}\ndata: {json.dumps(payload)}\n\n"
+        
+        def generate():
+            last_version = None
+            while not job.wait(interval):
+                version = job.partial_version() if job.partial_version else None
+                if version is None or version == last_version:
+                    yield ": keep-alive\n\n"
+                    continue
+                last_version = version
+                yield event('progress', {**job.to_dict(), 'partial_results': job.partial()})
+            
+            final = job.to_dict()
+            if job.status == 'completed':
+                final.update(job.result)
+            yield event('done', final)
+        
+        return Response(generate(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+    
+    @app.route('/api/simulations/<job_id>/cancel', methods=['POST'])
+    def cancel_simulation(job_id):
+        """Stop a queued or running simulation"""
+        try:
+            job = job_manager.cancel(job_id)
+        except KeyError:
+            return jsonify({'error': 'Simulation not found'}), 404
+        return jsonify(job.to_dict())
+    
+    @app.route('/api/simulations/<simulation_id>/resume', methods=['POST'])
+    @limiter.limit("5 per minute")
+    def resume_simulation(simulation_id):
+        """
+        Run a checkpointed simulation again with its original options. People
+        with a checkpointed reaction are replayed and only the rest are
+        simulated, so a finished simulation is re-aggregated without any
+        Gemini calls.
+        """
+        if checkpoint_store is None:
+            return jsonify({'error': 'Checkpoints are disabled'}), 404
+        try:
+            record = checkpoint_store.get(simulation_id)
+        except KeyError:
+            return jsonify({'error': 'Simulation checkpoint not found'}), 404
+        
+        if job_manager.active(simulation_id=simulation_id):
+            return jsonify({'error': 'Simulation is already running'}), 409
+        
+        simulation, error = _parse_simulation_request(record['request'])
+        if error:
+            return error
+        # Keep the analysis the checkpointed reactions were simulated against
+        simulation.update(
+            simulation_id=simulation_id,
+            decision_id=record['decision_id'],
+            decision_analysis=record['analysis']
+        )
+        
+        try:
+            job = _submit_simulation(simulation)
+        except JobQueueFull:
+            return jsonify({'error': 'Simulation queue is full, try again later'}), 503
+        
+        return jsonify({'success': True, 'checkpointed_reactions': record['reactions'], **job.to_dict()}), 202
+    
     @app.route('/api/run-simulation', methods=['POST'])
     @limiter.limit("5 per minute")
     def run_simulation():
-        """Run a complete simulation on a population"""
+        """
+        Run a complete simulation on a population.
+        
+        Runs as a job; results are returned inline if it finishes within
+        SYNC_SIMULATION_WAIT seconds, otherwise a 202 with the job status
+        to poll at /api/simulations/<job_id>.
+        """
         try:
-            data = request.get_json()
-            decision_text = data.get('decision')
-            population = data.get('population')
+            simulation, error = _parse_simulation_request(request.get_json())
+            if error:
+                return error
             
-            if not decision_text or not population:
-                return jsonify({'error': 'Decision and population are required'}), 400
+            try:
+                job = _submit_simulation(simulation)
+            except JobQueueFull:
+                return jsonify({'error': 'Simulation queue is full, try again later'}), 503
             
-            # Analyze decision first
-            decision_analysis = decision_analyzer.analyze_decision(decision_text)
+            if not job.wait(app.config['SYNC_SIMULATION_WAIT']):
+                return jsonify({'success': True, **job.to_dict()}), 202
             
-            # Run behavior simulation
-            results = behavior_engine.simulate_population_behavior(
-                population, 
-                decision_analysis,
-                batch_size=app.config['DEFAULT_BATCH_SIZE']
-            )
+            if job.status != 'completed':
+                raise Exception(job.error or job.status)
             
             return jsonify({
                 'success': True,
-                'decision_analysis': decision_analysis,
-                'simulation_results': results
+                'job_id': job.job_id,
+                **job.result
             })
             
         except Exception as e:
             app.logger.error(f"Error running simulation: {str(e)}")
             return jsonify({'error': 'Failed to run simulation'}), 500
     
+    def _queue_stats():
+        if work_queue is None:
+            return None
+        try:
+            return work_queue.stats()
+        except redis.RedisError as e:
+            return {'error': str(e)}
+    
     @app.route('/api/health')
     def health_check():
         """Health check endpoint"""
         return jsonify({
             'status': 'healthy',
             'version': '1.0.0',
-            'gemini_configured': bool(app.config['GEMINI_API_KEY'])
+            'gemini_configured': bool(app.config['GEMINI_API_KEY']),
+            'llm_provider': llm_provider.name,
+            'cache': {
+                'backend': app.config['CACHE_BACKEND'],
+                'analyses': analysis_cache.stats(),
+                'reactions': reaction_cache.stats(),
+                'decisions': decision_registry.stats()
+            },
+            'rate_limiter': rate_limiter.stats(),
+            'prompts': behavior_engine.prompt_stats(),
+            'parsing': {**decision_analyzer.parse_stats.snapshot(), **behavior_engine.parse_stats.snapshot()},
+            'jobs': job_manager.stats(),
+            'simulation_backend': app.config['SIMULATION_BACKEND'],
+            'queue': _queue_stats(),
+            'checkpoints': checkpoint_store.stats() if checkpoint_store is not None else None
         })
     
+    @app.route('/api/admin/profiles/<profile_id>')
+    @limiter.exempt
+    def get_profile(profile_id):
+        """
+        Sampling profile of a request (by its trace id) or job (by its job
+        id) in collapsed-stack format, for flamegraph.pl or speedscope
+        """
+        if not _is_admin():
+            return jsonify({'error': 'Admin token required'}), 403
+        
+        try:
+            profiler = profile_store.get(profile_id)
+        except KeyError:
+            return jsonify({'error': 'Profile not found (it may have been recorded by another worker)'}), 404
+        
+        return Response(profiler.collapsed(), mimetype='text/plain', headers={
+            'X-Profile-Samples': str(profiler.samples),
+            'X-Profile-Duration': f"{profiler.duration:.3f}"
+        })
+    
+    @app.route('/api/metrics')
+    @limiter.exempt
+    def metrics():
+        """Prometheus metrics, summed over gunicorn workers when PROMETHEUS_MULTIPROC_DIR is set"""
+        body, content_type = render_metrics()
+        return Response(body, content_type=content_type)
+    
     @app.errorhandler(404)
     def not_found(error):
         return render_template('404.html'), 404
@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+"""
+Offline benchmark suite for Heuristics AI.
+
+Times each pipeline stage (population generation, prompt building,
+response parsing, aggregation and the full /api/run-simulation path) at
+several population sizes, using the stub LLM provider so no network or
+API quota is involved. Each stage is run once for wall time (best of
+--repeat) and once more under tracemalloc for peak and retained memory.
+
+Usage:
+    python benchmarks/bench.py                          # 1k, 10k, 100k, 1M
+    python benchmarks/bench.py --sizes 1000 10000 --stages aggregate_columns
+    python benchmarks/bench.py --save-baseline          # store benchmarks/baseline.json
+    python benchmarks/bench.py --compare                # exit 1 on regressions vs the baseline
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Offline, unthrottled settings; they must be in place before config.py is imported
+os.environ.update({
+    'LLM_PROVIDER': 'stub',
+    'STUB_LATENCY': '0',
+    'STUB_LATENCY_DISTRIBUTION': 'fixed',
+    'GEMINI_REQUESTS_PER_MINUTE': '0',
+    'RATELIMIT_STORAGE_URL': 'memory://',
+    'CACHE_BACKEND': 'memory',
+    'SYNC_SIMULATION_WAIT': '86400',
+    'LOG_LEVEL': 'WARNING'
+})
+
+import numpy as np
+
+from src.models.population import PopulationGenerator
+from src.services.aggregation import REACTION_TYPES, OnlineAggregator, ReactionColumns, aggregate_columns
+from src.services.behavior_engine import BehaviorEngine
+from src.services.llm_provider import StubProvider
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, 'baseline.json')
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, 'results')
+DECISION_ANALYSIS = {
+    'decision_type': 'pricing',
+    'key_factors': ['30% price increase', 'new customers only'],
+    'decision_parameters': {'price_change': 0.3},
+    'psychological_triggers': ['loss aversion', 'anchoring'],
+    'risk_level': 'high'
+}
+
+def _engine() -> BehaviorEngine:
+    return BehaviorEngine(provider=StubProvider(latency=0, latency_distribution='fixed'), personas_per_prompt=10)
+
+def _population(size: int):
+    return PopulationGenerator().generate_population(size, seed=42)
+
+# Each stage is (setup(size) -> state, run(state)); only `run` is measured
+
+def _setup_generate(size: int):
+    return size
+
+def _run_generate(size: int):
+    PopulationGenerator().generate_population(size, seed=42)
+
+def _setup_person_prompts(size: int):
+    return _engine(), _population(size).to_dicts()
+
+def _run_person_prompts(state):
+    engine, people = state
+    for person in people:
+        engine._build_person_reaction_prompt(person, DECISION_ANALYSIS)
+
+def _setup_batch_prompts(size: int):
+    engine, people = _setup_person_prompts(size)
+    return engine, [people[start:start + engine.personas_per_prompt]
+                    for start in range(0, len(people), engine.personas_per_prompt)]
+
+def _run_batch_prompts(state):
+    engine, units = state
+    for unit in units:
+        engine._build_batch_reaction_prompt(unit, DECISION_ANALYSIS)
+
+def _setup_parse_person(size: int):
+    engine, people = _setup_person_prompts(size)
+    return engine, [
+        (person['id'], engine.provider._respond(engine._build_person_reaction_prompt(person, DECISION_ANALYSIS)).text)
+        for person in people
+    ]
+
+def _run_parse_person(state):
+    engine, responses = state
+    for person_id, text in responses:
+        engine._parse_person_reaction(text, person_id)
+
+def _setup_parse_batch(size: int):
+    engine, units = _setup_batch_prompts(size)
+    return engine, [
+        ([person['id'] for person in unit],
+         engine.provider._respond(engine._build_batch_reaction_prompt(unit, DECISION_ANALYSIS)).text)
+        for unit in units
+    ]
+
+def _run_parse_batch(state):
+    engine, responses = state
+    for person_ids, text in responses:
+        engine._parse_batch_reactions(text, person_ids)
+
+def _random_reactions(size: int) -> ReactionColumns:
+    rng = np.random.default_rng(0)
+    return ReactionColumns(
+        reaction_type=rng.integers(0, len(REACTION_TYPES), size).astype(np.int8),
+        strength=rng.random(size).astype(np.float32),
+        likelihood=rng.random(size).astype(np.float32),
+        fallback=np.zeros(size, dtype=bool)
+    )
+
+def _setup_aggregate_columns(size: int):
+    return _population(size), _random_reactions(size)
+
+def _run_aggregate_columns(state):
+    population, reactions = state
+    aggregate_columns(population, reactions, DECISION_ANALYSIS)
+
+def _setup_online_aggregate(size: int):
+    reactions = _random_reactions(size)
+    return [
+        {'reaction_type': REACTION_TYPES[code], 'reaction_strength': float(strength), 'likelihood_to_act': float(likelihood)}
+        for code, strength, likelihood in zip(reactions.reaction_type.tolist(), reactions.strength.tolist(),
+                                               reactions.likelihood.tolist())
+    ]
+
+def _run_online_aggregate(reactions: List[Dict]):
+    aggregator = OnlineAggregator(DECISION_ANALYSIS)
+    aggregator.add_many(reactions)
+    aggregator.snapshot()
+
+def _setup_run_simulation(size: int):
+    os.environ.update({
+        'POPULATION_STORE_DIR': tempfile.mkdtemp(prefix='heuristics-bench-'),
+        'MAX_POPULATION_SIZE': str(max(size, 10000)),
+        'JOB_MAX_POPULATION': str(max(size, 1000000))
+    })
+    from app import create_app
+    app = create_app('testing')
+    for limiter in app.extensions.get('limiter', ()):
+        limiter.enabled = False
+    client = app.test_client()
+    population_id = client.post('/api/generate-population', json={'size': size, 'seed': 42}).json['population_id']
+    return {'client': client, 'population_id': population_id, 'run': 0}
+
+def _run_simulation(state):
+    # A new decision text per run, so cached reactions from earlier runs never apply
+    state['run'] += 1
+    response = state['client'].post('/api/run-simulation', json={
+        'decision': f"Increase our SaaS pricing by 30% (benchmark run {state['run']})",
+        'population_id': state['population_id'],
+        'archetypes': False
+    })
+    if response.status_code != 200:
+        raise RuntimeError(f"run-simulation answered {response.status_code}: {response.get_data(as_text=True)[:200]}")
+
+STAGES: Dict[str, Tuple[Callable, Callable]] = {
+    'generate_population': (_setup_generate, _run_generate),
+    'build_person_prompts': (_setup_person_prompts, _run_person_prompts),
+    'build_batch_prompts': (_setup_batch_prompts, _run_batch_prompts),
+    'parse_person_reactions': (_setup_parse_person, _run_parse_person),
+    'parse_batch_reactions': (_setup_parse_batch, _run_parse_batch),
+    'aggregate_columns': (_setup_aggregate_columns, _run_aggregate_columns),
+    'online_aggregate': (_setup_online_aggregate, _run_online_aggregate),
+    'run_simulation': (_setup_run_simulation, _run_simulation)
+}
+
+def measure(stage: str, size: int, repeat: int) -> Dict:
+    """Best-of-`repeat` wall time, then one traced run for memory"""
+    setup, run = STAGES[stage]
+    state = setup(size)
+    
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        run(state)
+        timings.append(time.perf_counter() - started)
+    
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run(state)
+        snapshot = tracemalloc.take_snapshot()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    
+    return {
+        'stage': stage,
+        'size': size,
+        'seconds': round(min(timings), 6),
+        'per_person_us': round(min(timings) / size * 1e6, 3),
+        'peak_bytes': peak,
+        'retained_bytes': retained,
+        'retained_blocks': sum(stat.count for stat in snapshot.statistics('filename'))
+    }
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: List[Dict], baseline: Dict, time_tolerance: float, memory_tolerance: float) -> List[str]:
+    """Regression messages for results slower or hungrier than the baseline beyond the tolerances"""
+    reference = {(entry['stage'], entry['size']): entry for entry in baseline.get('results', [])}
+    regressions = []
+    for entry in results:
+        previous = reference.get((entry['stage'], entry['size']))
+        if previous is None:
+            continue
+        if entry['seconds'] > previous['seconds'] * (1 + time_tolerance):
+            regressions.append(f"{entry['stage']}@{entry['size']}: {entry['seconds']:.4f}s vs "
+                               f"{previous['seconds']:.4f}s baseline")
+        # Ignore sub-megabyte noise in the memory check
+        if entry['peak_bytes'] > previous['peak_bytes'] * (1 + memory_tolerance) + 2 ** 20:
+            regressions.append(f"{entry['stage']}@{entry['size']}: peak {entry['peak_bytes'] / 2 ** 20:.1f} MiB vs "
+                               f"{previous['peak_bytes'] / 2 ** 20:.1f} MiB baseline")
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per stage; the fastest counts')
+    parser.add_argument('--output', help='results file (default: benchmarks/results/<timestamp>.json)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='also write the results to --baseline')
+    parser.add_argument('--compare', action='store_true', help='flag regressions against --baseline')
+    parser.add_argument('--time-tolerance', type=float, default=0.2)
+    parser.add_argument('--memory-tolerance', type=float, default=0.1)
+    args = parser.parse_args(argv)
+    
+    results = []
+    for size in args.sizes:
+        for stage in args.stages:
+            entry = measure(stage, size, args.repeat)
+            results.append(entry)
+            print(f"{stage:<24} {size:>9,} {entry['seconds']:>10.4f}s {entry['per_person_us']:>10.2f}us/person "
+                  f"{entry['peak_bytes'] / 2 ** 20:>9.1f} MiB peak {entry['retained_blocks']:>9,} blocks",
+                  flush=True)
+    
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'repeat': args.repeat
+        },
+        'results': results
+    }
+    
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+    
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"No baseline at {args.baseline}; run with --save-baseline first")
+            return 2
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.time_tolerance, args.memory_tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            return 1
+        print("No regressions against the baseline")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+"""
+Delivery check for the distributed simulation queue.
+
+Runs a coordinator and a SimulationWorker against a Redis server, with
+the stub LLM provider, and checks the queue's delivery guarantees:
+
+- redelivery: a task reserved by a worker that dies without completing it
+  is delivered again once the visibility timeout has passed
+- idempotent completion: a second `complete` of the same task returns
+  False and the coordinator receives the task's people once
+- drain: a run of several tasks is fully simulated by a worker, every
+  person once, with no fallback reactions and nothing left queued
+
+Keys live under a random namespace that is deleted afterwards, so a
+shared Redis can be used. Exits 1 if any check fails. fakeredis holds
+its server lock through the coordinator's blocking pop, so under --fake
+the drain runs at about one task per second; a real Redis drains the
+default run in well under a second.
+
+Usage:
+    python benchmarks/queue_check.py                          # REDIS_URL, or redis://localhost:6379/15
+    python benchmarks/queue_check.py --redis-url redis://localhost:6379/2
+    python benchmarks/queue_check.py --fake                   # in-process fakeredis (pip install fakeredis lupa)
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import redis
+
+from src.models.population import PopulationGenerator
+from src.services.behavior_engine import BehaviorEngine
+from src.services.llm_provider import StubProvider
+from src.services.simulation_worker import SimulationWorker
+from src.services.work_queue import QueueTask, RedisWorkQueue
+
+DECISION_ANALYSIS = {
+    'decision_type': 'pricing',
+    'key_factors': ['30% price increase', 'new customers only'],
+    'decision_parameters': {'price_change': 0.3},
+    'psychological_triggers': ['loss aversion', 'anchoring'],
+    'risk_level': 'high'
+}
+
+class Checks:
+    """Prints each check as it runs and remembers whether any failed"""
+    
+    def __init__(self):
+        self.failed = 0
+    
+    def __call__(self, name: str, passed: bool, detail: str = '') -> bool:
+        print(f"{'PASS' if passed else 'FAIL'} {name}" + (f" ({detail})" if detail and not passed else ''))
+        self.failed += not passed
+        return passed
+
+def _client(args) -> redis.Redis:
+    if not args.fake:
+        return redis.Redis.from_url(args.redis_url, socket_timeout=10.0, socket_connect_timeout=1.0)
+    try:
+        import fakeredis
+    except ImportError:
+        raise SystemExit("--fake needs fakeredis with Lua support: pip install fakeredis lupa")
+    return fakeredis.FakeRedis()
+
+def _start_run(queue: RedisWorkQueue, size: int, unit_size: int) -> Tuple[threading.Thread, List, Dict]:
+    """Coordinate a run of `size` people in the background, as a web worker would"""
+    population = PopulationGenerator().generate_population(size, seed=7)
+    received: List[Tuple[int, List[Dict]]] = []
+    outcome: Dict = {}
+    
+    def run():
+        outcome['done'] = queue.simulate(population, DECISION_ANALYSIS, unit_size=unit_size, batch_size=size,
+                                         on_unit=lambda offset, reactions: received.append((offset, reactions)))
+    
+    thread = threading.Thread(target=run, name='queue-check-coordinator', daemon=True)
+    thread.start()
+    return thread, received, outcome
+
+def _reserve(queue: RedisWorkQueue, timeout: float) -> Optional[QueueTask]:
+    """Reserve a task, waiting up to `timeout` seconds for the coordinator to queue one"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        task = queue.reserve()
+        if task is not None:
+            return task
+        time.sleep(0.05)
+    return None
+
+def check_redelivery(queue: RedisWorkQueue, engine: BehaviorEngine, unit_size: int, timeout: float, check: Checks):
+    """A task whose worker dies is redelivered, and completing it twice writes it once"""
+    thread, received, outcome = _start_run(queue, unit_size, unit_size)  # a single task
+    
+    # The "dead" worker reserves the task and never completes it
+    first = _reserve(queue, timeout)
+    if not check('task delivered', first is not None and first.attempts == 1,
+                 f"got {first.attempts if first else None} attempts"):
+        return
+    check('reserved task hidden until the visibility timeout', queue.reserve() is None)
+    
+    time.sleep(queue.visibility_timeout + 0.5)
+    second = _reserve(queue, timeout)
+    if not check('task redelivered after the visibility timeout',
+                 second is not None and second.task_id == first.task_id and second.attempts == 2,
+                 f"got {second.task_id if second else None}, attempt {second.attempts if second else None}"):
+        return
+    
+    reactions = engine.simulate_batch_reactions(second.people, DECISION_ANALYSIS)
+    check('redelivered task completes', queue.complete(second, reactions))
+    check('duplicate complete returns False', not queue.complete(first, reactions))
+    
+    thread.join(timeout)
+    check('coordinator receives the task once',
+          not thread.is_alive() and outcome.get('done') == unit_size and len(received) == 1,
+          f"done={outcome.get('done')}, units received={len(received)}")
+
+def check_drain(queue: RedisWorkQueue, engine: BehaviorEngine, size: int, unit_size: int, timeout: float,
+                check: Checks):
+    """A worker drains a multi-task run: every person once, no fallbacks, nothing left queued"""
+    worker = SimulationWorker(queue, engine, concurrency=4, poll_interval=0.05)
+    worker_thread = threading.Thread(target=worker.run, name='queue-check-worker', daemon=True)
+    worker_thread.start()
+    
+    started = time.monotonic()
+    thread, received, outcome = _start_run(queue, size, unit_size)
+    thread.join(timeout)
+    elapsed = time.monotonic() - started
+    worker.stop()
+    worker_thread.join(timeout)
+    
+    reactions = [reaction for _, unit in received for reaction in unit]
+    check('run drains', not thread.is_alive() and outcome.get('done') == size,
+          f"done={outcome.get('done')} of {size} after {elapsed:.1f}s")
+    check('every person simulated once', len({reaction['person_id'] for reaction in reactions}) == size == len(reactions),
+          f"{len(reactions)} reactions")
+    fallbacks = sum(1 for reaction in reactions if reaction.get('fallback'))
+    check('no fallback reactions', fallbacks == 0, f"{fallbacks} fallbacks")
+    stats = queue.stats()
+    check('nothing left queued', stats['ready'] == 0 and stats['reserved'] == 0,
+          f"ready={stats['ready']}, reserved={stats['reserved']}")
+    print(f"     drained {size:,} people in {elapsed:.2f}s")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--redis-url', default=os.environ.get('REDIS_URL', 'redis://localhost:6379/15'))
+    parser.add_argument('--fake', action='store_true', help='use an in-process fakeredis server instead')
+    parser.add_argument('--size', type=int, default=200, help='people in the drain check')
+    parser.add_argument('--unit-size', type=int, default=10, help='people per task')
+    parser.add_argument('--visibility-timeout', type=float, default=2.0)
+    parser.add_argument('--timeout', type=float, default=60.0, help='seconds any one step may take')
+    args = parser.parse_args(argv)
+    
+    client = _client(args)
+    namespace = f"heuristics:queue-check:{uuid.uuid4().hex[:8]}"
+    queue = RedisWorkQueue(client, namespace=namespace, visibility_timeout=args.visibility_timeout)
+    engine = BehaviorEngine(provider=StubProvider(latency=0, latency_distribution='fixed'),
+                            personas_per_prompt=args.unit_size)
+    check = Checks()
+    try:
+        check_redelivery(queue, engine, args.unit_size, args.timeout, check)
+        check_drain(queue, engine, args.size, args.unit_size, args.timeout, check)
+    finally:
+        keys = list(client.scan_iter(match=f"{namespace}:*"))
+        if keys:
+            client.delete(*keys)
+    
+    print(f"{check.failed} checks failed" if check.failed else "All queue checks passed")
+    return 1 if check.failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,6 +8,14 @@ class Config:
     """Base configuration class"""
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
+    # LLM backend: 'gemini', or 'stub' for offline benchmarks and load tests
+    # (synthetic responses with the latency and failure rates below)
+    LLM_PROVIDER = os.environ.get('LLM_PROVIDER', 'gemini')
+    STUB_LATENCY = float(os.environ.get('STUB_LATENCY', 0.05))
+    STUB_LATENCY_DISTRIBUTION = os.environ.get('STUB_LATENCY_DISTRIBUTION', 'lognormal')
+    STUB_ERROR_RATE = float(os.environ.get('STUB_ERROR_RATE', 0.0))
+    STUB_RATE_LIMIT_RATE = float(os.environ.get('STUB_RATE_LIMIT_RATE', 0.0))
+    STUB_MALFORMED_RATE = float(os.environ.get('STUB_MALFORMED_RATE', 0.0))
     REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379')
     RATELIMIT_STORAGE_URL = os.environ.get('RATELIMIT_STORAGE_URL', 'redis://localhost:6379')
     
@@ -15,9 +23,99 @@ class Config:
     MAX_POPULATION_SIZE = int(os.environ.get('MAX_POPULATION_SIZE', 10000))
     DEFAULT_BATCH_SIZE = int(os.environ.get('DEFAULT_BATCH_SIZE', 50))
     CACHE_TTL = int(os.environ.get('CACHE_TTL', 3600))
+    # How long decision ids from /api/analyze-decision stay usable
+    DECISION_TTL = int(os.environ.get('DECISION_TTL', 7 * 24 * 3600))
     
-    # Logging
+    # Shared cache tier behind the in-process caches: 'memory' (none),
+    # 'redis' (REDIS_URL) or 'sqlite' (a local file for single-box deploys)
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+    CACHE_SQLITE_PATH = os.environ.get('CACHE_SQLITE_PATH', os.path.join('data', 'cache.sqlite3'))
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 100000))
+    # Seconds a caller waits for an identical analysis or persona prompt already in
+    # flight (across workers for analyses, with a shared cache tier) before giving up
+    COALESCE_TIMEOUT = float(os.environ.get('COALESCE_TIMEOUT', 120))
+    
+    # Population generation and storage
+    POPULATION_WORKERS = int(os.environ.get('POPULATION_WORKERS', 1))
+    POPULATION_STORE_DIR = os.environ.get('POPULATION_STORE_DIR', os.path.join('data', 'populations'))
+    POPULATION_STORE_MAX = int(os.environ.get('POPULATION_STORE_MAX', 100))
+    POPULATION_PAGE_MAX = int(os.environ.get('POPULATION_PAGE_MAX', 1000))
+    MAX_STREAM_POPULATION_SIZE = int(os.environ.get('MAX_STREAM_POPULATION_SIZE', 1000000))
+    STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE', 1000))
+    
+    # Simulation: simulate one representative per archetype (or k, for
+    # diversity) instead of every person. Off by default, since the results
+    # are then an approximation; requests can still opt in with "archetypes"
+    ARCHETYPES_ENABLED = os.environ.get('ARCHETYPES_ENABLED', 'false').lower() == 'true'
+    ARCHETYPES_PER_GROUP = int(os.environ.get('ARCHETYPES_PER_GROUP', 1))
+    
+    # Defaults for sequential sampling runs: target confidence-interval
+    # half-width on reaction shares, confidence level, and minimum sample
+    SAMPLING_PRECISION = float(os.environ.get('SAMPLING_PRECISION', 0.03))
+    SAMPLING_CONFIDENCE = float(os.environ.get('SAMPLING_CONFIDENCE', 0.95))
+    SAMPLING_MIN_SAMPLES = int(os.environ.get('SAMPLING_MIN_SAMPLES', 200))
+    
+    # Defaults for surrogate-assisted runs: Gemini-simulated training sample,
+    # model confidence below which people are escalated to Gemini, and the
+    # largest share of the population Gemini may simulate
+    SURROGATE_TRAINING_SAMPLES = int(os.environ.get('SURROGATE_TRAINING_SAMPLES', 500))
+    SURROGATE_CONFIDENCE = float(os.environ.get('SURROGATE_CONFIDENCE', 0.6))
+    SURROGATE_MAX_LLM_FRACTION = float(os.environ.get('SURROGATE_MAX_LLM_FRACTION', 0.3))
+    
+    # People simulated per Gemini request, and how often personas missing
+    # from a batched response (or invalid) are re-asked before falling back
+    PERSONAS_PER_PROMPT = int(os.environ.get('PERSONAS_PER_PROMPT', 10))
+    MAX_BATCH_RETRIES = int(os.environ.get('MAX_BATCH_RETRIES', 2))
+    
+    # Gemini client-side rate limiting (per process): MAX_WORKERS caps
+    # concurrent requests, the quotas feed token buckets (0 disables one)
+    MAX_WORKERS = int(os.environ.get('MAX_WORKERS', 5))
+    GEMINI_REQUESTS_PER_MINUTE = float(os.environ.get('GEMINI_REQUESTS_PER_MINUTE', 60))
+    GEMINI_TOKENS_PER_MINUTE = float(os.environ.get('GEMINI_TOKENS_PER_MINUTE', 0))
+    GEMINI_MAX_RETRIES = int(os.environ.get('GEMINI_MAX_RETRIES', 4))
+    
+    # Background simulation jobs: worker threads, queued jobs beyond them,
+    # and per-job limits (population size, runtime in seconds)
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_MAX_QUEUED = int(os.environ.get('JOB_MAX_QUEUED', 20))
+    JOB_MAX_POPULATION = int(os.environ.get('JOB_MAX_POPULATION', 1000000))
+    JOB_TIMEOUT = float(os.environ.get('JOB_TIMEOUT', 3600))
+    JOB_RETENTION = float(os.environ.get('JOB_RETENTION', 3600))
+    # How long /api/run-simulation waits for a job before answering 202
+    SYNC_SIMULATION_WAIT = float(os.environ.get('SYNC_SIMULATION_WAIT', 20))
+    # Seconds between Server-Sent Events snapshots of a running job
+    SSE_INTERVAL = float(os.environ.get('SSE_INTERVAL', 1.0))
+    
+    # Durable checkpoints of simulated reactions, so interrupted simulations
+    # can be resumed and finished ones re-aggregated without Gemini calls
+    # (an empty path disables them), and how long they are kept in seconds
+    CHECKPOINT_PATH = os.environ.get('CHECKPOINT_PATH', os.path.join('data', 'checkpoints.sqlite3'))
+    CHECKPOINT_RETENTION = float(os.environ.get('CHECKPOINT_RETENTION', 7 * 24 * 3600))
+    
+    # Where population simulations run: 'local' (threads of the web worker
+    # that accepted the job) or 'redis' (prompt-sized tasks queued on
+    # REDIS_URL for worker.py processes on any box)
+    SIMULATION_BACKEND = os.environ.get('SIMULATION_BACKEND', 'local')
+    # Redis queue: seconds a task stays reserved before it is redelivered,
+    # deliveries before its people get fallback reactions, and tasks queued
+    # per simulation at a time
+    QUEUE_VISIBILITY_TIMEOUT = float(os.environ.get('QUEUE_VISIBILITY_TIMEOUT', 300))
+    QUEUE_MAX_ATTEMPTS = int(os.environ.get('QUEUE_MAX_ATTEMPTS', 3))
+    QUEUE_MAX_PENDING = int(os.environ.get('QUEUE_MAX_PENDING', 200))
+    # worker.py: tasks processed at once per worker process, the cap on tasks
+    # in progress across all workers (0 = no cap), and a Prometheus port (0 = off)
+    WORKER_CONCURRENCY = int(os.environ.get('WORKER_CONCURRENCY', 5))
+    WORKER_GLOBAL_CONCURRENCY = int(os.environ.get('WORKER_GLOBAL_CONCURRENCY', 0))
+    WORKER_METRICS_PORT = int(os.environ.get('WORKER_METRICS_PORT', 0))
+    
+    # Logging; trace spans are logged at INFO, prompt and parse spans at DEBUG
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    
+    # Admin-only profiling: requests sending X-Admin-Token may ask for a
+    # sampling profile (disabled while ADMIN_TOKEN is unset)
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+    PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', 0.005))
+    PROFILE_MAX_SECONDS = float(os.environ.get('PROFILE_MAX_SECONDS', 300))
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -0,0 +1,40 @@
+"""
+Gunicorn settings for Heuristics AI.
+
+Simulation jobs run on threads of the worker process that accepted them,
+and their status, cancel and events endpoints only work in that process,
+so the app runs as a single gthread worker. Each open events stream holds
+one thread for as long as the job runs; GUNICORN_THREADS bounds how many
+requests (streams included) are served at once.
+
+Prometheus metrics are kept per worker in files under
+PROMETHEUS_MULTIPROC_DIR and summed by /api/metrics. The directory has to
+be known before any worker imports prometheus_client, so it is set here,
+in the master, and emptied on startup so files from earlier runs are not
+counted.
+"""
+
+import os
+import shutil
+import tempfile
+
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'heuristics-prometheus'))
+
+worker_class = 'gthread'
+workers = 1
+threads = int(os.environ.get('GUNICORN_THREADS', 32))
+# Seconds without a heartbeat before the master restarts the worker. gthread
+# workers keep beating while requests run, so this only catches a stuck
+# process; kept long so a busy one is not killed along with its running jobs
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 600))
+graceful_timeout = 60
+
+def on_starting(server):
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+def child_exit(server, worker):
+    """Drop the live gauges of a worker that exited; its counters and histograms keep counting"""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,12 +1,60 @@
-import random
-import uuid
-from typing import Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+import hashlib
+import json
 import logging
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from enum import Enum
 
 logger = logging.getLogger(__name__)
 
+OCCUPATIONS = [
+    "Software Developer", "Teacher", "Healthcare Worker", "Manager", "Sales Representative",
+    "Engineer", "Consultant", "Student", "Entrepreneur", "Retail Worker", "Administrative Assistant",
+    "Marketing Professional", "Financial Analyst", "Designer", "Researcher", "Service Worker",
+    "Manufacturing Worker", "Government Employee", "Non-profit Worker", "Freelancer"
+]
+
+EDUCATION_LEVELS = [
+    "High School", "Some College", "Bachelor's Degree", "Master's Degree", "PhD", "Trade School"
+]
+
+PERSONALITY_TRAITS = [
+    "openness", "conscientiousness", "extraversion", "agreeableness", "neuroticism"
+]
+
+CORE_VALUES = [
+    "security", "achievement", "convenience", "quality", "status", "family", 
+    "environment", "innovation", "tradition", "independence", "community", "health"
+]
+
+LIFESTYLE_CATEGORIES = [
+    "urban_professional", "suburban_family", "rural_traditional", "student", 
+    "retiree", "entrepreneur", "budget_conscious", "luxury_oriented"
+]
+
+REGIONS = {
+    "us": ["New York", "Los Angeles", "Chicago", "Houston", "Phoenix", "Philadelphia", 
+           "San Antonio", "San Diego", "Dallas", "San Jose", "Austin", "Jacksonville"],
+    "europe": ["London", "Paris", "Berlin", "Madrid", "Rome", "Amsterdam", 
+               "Vienna", "Stockholm", "Copenhagen", "Dublin", "Brussels", "Zurich"],
+    "asia": ["Tokyo", "Shanghai", "Mumbai", "Seoul", "Singapore", "Hong Kong", 
+             "Bangkok", "Jakarta", "Manila", "Kuala Lumpur", "Taipei", "Osaka"],
+    "global": ["New York", "London", "Tokyo", "Shanghai", "Los Angeles", "Paris", 
+               "Berlin", "Mumbai", "São Paulo", "Sydney", "Toronto", "Dubai"]
+}
+
+# People per shard. Shard boundaries and streams depend only on the seed and
+# this size, never on the number of workers, so results are reproducible.
+SHARD_SIZE = 100_000
+
+# Bump when generation logic changes so population keys stop matching
+GENERATOR_VERSION = 1
+
+# Every city across all regions, so frames from different regions share codes
+LOCATIONS = list(dict.fromkeys(city for cities in REGIONS.values() for city in cities))
+
 class IncomeLevel(Enum):
     LOW = "low"
     MIDDLE = "middle"
@@ -31,10 +79,19 @@ class InnovationAdoption(Enum):
     LATE = "late"
     MIXED = "mixed"
 
+def _levels(enum_cls) -> List[str]:
+    """Ordered labels of a trait enum without MIXED; a label's position is its code"""
+    return [member.value for member in enum_cls if member.name != 'MIXED']
+
+INCOME_LEVELS = _levels(IncomeLevel)
+TECH_SAVVINESS_LEVELS = _levels(TechSavviness)
+PRICE_SENSITIVITY_LEVELS = _levels(PriceSensitivity)
+INNOVATION_ADOPTION_STAGES = _levels(InnovationAdoption)
+
 @dataclass
 class PersonProfile:
     """Individual person profile with demographics and traits"""
-    id: str
+    id: int
     age: int
     income: int
     location: str
@@ -47,157 +104,482 @@ class PersonProfile:
     values: List[str]
     lifestyle: str
 
-class PopulationGenerator:
+def _integer_id(record: Any) -> Optional[int]:
+    """A record's id if it is an integer (or an integer string), else None"""
+    person_id = record.get('id') if isinstance(record, dict) else None
+    if isinstance(person_id, bool):
+        return None
+    if isinstance(person_id, (int, np.integer)):
+        return int(person_id)
+    if isinstance(person_id, str) and person_id.strip().lstrip('-').isdigit():
+        return int(person_id)
+    return None
+
+@dataclass
+class PopulationFrame:
     """
-    Generates realistic synthetic populations with diverse demographics and behavioral traits.
+    Columnar population: one array per attribute instead of one dict per person.
+    
+    Categorical attributes are stored as uint8 codes into the module-level
+    vocabularies (LOCATIONS, OCCUPATIONS, TECH_SAVVINESS_LEVELS, ...), the
+    Big Five as a float32 matrix ordered like PERSONALITY_TRAITS, and values
+    as a uint16 bitmask over CORE_VALUES. A person costs about 40 bytes.
+    
+    Dict views (`to_dicts`, `iter_dicts`, `person`) are only meant for the
+    edges that need them: JSON responses and prompt building.
     """
+    ids: np.ndarray
+    age: np.ndarray
+    income: np.ndarray
+    location: np.ndarray
+    occupation: np.ndarray
+    education: np.ndarray
+    tech_savviness: np.ndarray
+    price_sensitivity: np.ndarray
+    innovation_adoption: np.ndarray
+    personality: np.ndarray
+    values: np.ndarray
+    lifestyle: np.ndarray
     
-    def __init__(self):
-        self.occupations = [
-            "Software Developer", "Teacher", "Healthcare Worker", "Manager", "Sales Representative",
-            "Engineer", "Consultant", "Student", "Entrepreneur", "Retail Worker", "Administrative Assistant",
-            "Marketing Professional", "Financial Analyst", "Designer", "Researcher", "Service Worker",
-            "Manufacturing Worker", "Government Employee", "Non-profit Worker", "Freelancer"
-        ]
-        
-        self.education_levels = [
-            "High School", "Some College", "Bachelor's Degree", "Master's Degree", "PhD", "Trade School"
-        ]
+    COLUMNS = (
+        'ids', 'age', 'income', 'location', 'occupation', 'education', 'tech_savviness',
+        'price_sensitivity', 'innovation_adoption', 'personality', 'values', 'lifestyle'
+    )
+    DTYPES = {
+        'ids': np.int64,
+        'age': np.uint8,
+        'income': np.int32,
+        'location': np.uint8,
+        'occupation': np.uint8,
+        'education': np.uint8,
+        'tech_savviness': np.uint8,
+        'price_sensitivity': np.uint8,
+        'innovation_adoption': np.uint8,
+        'personality': np.float32,
+        'values': np.uint16,
+        'lifestyle': np.uint8
+    }
+    # Vocabulary behind each categorical column
+    CATEGORIES = {
+        'location': LOCATIONS,
+        'occupation': OCCUPATIONS,
+        'education': EDUCATION_LEVELS,
+        'tech_savviness': TECH_SAVVINESS_LEVELS,
+        'price_sensitivity': PRICE_SENSITIVITY_LEVELS,
+        'innovation_adoption': INNOVATION_ADOPTION_STAGES,
+        'lifestyle': LIFESTYLE_CATEGORIES
+    }
+    
+    def __post_init__(self):
+        for column in self.COLUMNS:
+            setattr(self, column, np.asarray(getattr(self, column), dtype=self.DTYPES[column]))
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def __getitem__(self, index: Union[slice, np.ndarray, Sequence[int]]) -> 'PopulationFrame':
+        """Select a subset of people by slice, index array or boolean mask"""
+        return PopulationFrame(**{column: getattr(self, column)[index] for column in self.COLUMNS})
+    
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the columns, in bytes"""
+        return sum(getattr(self, column).nbytes for column in self.COLUMNS)
+    
+    @classmethod
+    def concat(cls, frames: Sequence['PopulationFrame']) -> 'PopulationFrame':
+        """Concatenate frames in order"""
+        return cls(**{
+            column: np.concatenate([getattr(frame, column) for frame in frames])
+            for column in cls.COLUMNS
+        })
+    
+    @classmethod
+    def from_records(cls, records: Sequence[Dict]) -> 'PopulationFrame':
+        """
+        Build a frame from person profile dictionaries (e.g. a JSON request body).
         
-        self.personality_traits = [
-            "openness", "conscientiousness", "extraversion", "agreeableness", "neuroticism"
-        ]
+        Integer ids are kept; when no record has one (no ids, or legacy
+        UUID strings), people are numbered by position.
         
-        self.core_values = [
-            "security", "achievement", "convenience", "quality", "status", "family", 
-            "environment", "innovation", "tradition", "independence", "community", "health"
-        ]
+        Raises:
+            ValueError: If a record is not a profile, or has a missing or
+                wrong-typed field or an unknown category, or if ids are
+                duplicated or only some records have an integer id
+        """
+        ids = [_integer_id(record) for record in records]
+        if all(person_id is None for person_id in ids):
+            ids = range(len(records))
+        elif any(person_id is None for person_id in ids):
+            missing = sum(person_id is None for person_id in ids)
+            raise ValueError(f"Invalid person profile: {missing} of {len(ids)} records have no integer id")
+        elif len(set(ids)) != len(ids):
+            raise ValueError("Invalid person profile: duplicate person ids")
+        
+        lookups = {
+            column: {label: code for code, label in enumerate(vocabulary)}
+            for column, vocabulary in cls.CATEGORIES.items()
+        }
+        value_bits = {value: 1 << bit for bit, value in enumerate(CORE_VALUES)}
+        
+        try:
+            columns = {
+                column: [lookup[record[column]] for record in records]
+                for column, lookup in lookups.items()
+            }
+            columns['age'] = [record['age'] for record in records]
+            columns['income'] = [record['income'] for record in records]
+            columns['personality'] = np.array(
+                [[record['personality_traits'][trait] for trait in PERSONALITY_TRAITS] for record in records],
+                dtype=np.float32
+            ).reshape(len(records), len(PERSONALITY_TRAITS))
+            columns['values'] = [
+                sum(value_bits[value] for value in set(record['values'])) for record in records
+            ]
+            return cls(ids=ids, **columns)
+        except KeyError as e:
+            raise ValueError(f"Invalid person profile: missing or unknown {e}")
+        except (TypeError, ValueError, OverflowError) as e:
+            raise ValueError(f"Invalid person profile: {e}")
+    
+    def to_dicts(self, start: int = 0, stop: Optional[int] = None) -> List[Dict]:
+        """Person profile dictionaries for people[start:stop]"""
+        window = slice(start, stop)
+        labels = {
+            column: np.asarray(vocabulary, dtype=object)[getattr(self, column)[window]].tolist()
+            for column, vocabulary in self.CATEGORIES.items()
+        }
+        # Round through float64 so 0.57 stays 0.57 rather than 0.5699999928
+        personality = np.round(self.personality[window].astype(np.float64), 2).tolist()
+        values_by_mask = {}
+        
+        people = []
+        for i, (person_id, age, income, values) in enumerate(zip(
+                self.ids[window].tolist(), self.age[window].tolist(),
+                self.income[window].tolist(), self.values[window].tolist())):
+            if values not in values_by_mask:
+                values_by_mask[values] = [value for bit, value in enumerate(CORE_VALUES) if values >> bit & 1]
+            
+            people.append({
+                'id': person_id,
+                'age': age,
+                'income': income,
+                'location': labels['location'][i],
+                'occupation': labels['occupation'][i],
+                'education': labels['education'][i],
+                'tech_savviness': labels['tech_savviness'][i],
+                'price_sensitivity': labels['price_sensitivity'][i],
+                'innovation_adoption': labels['innovation_adoption'][i],
+                'personality_traits': dict(zip(PERSONALITY_TRAITS, personality[i])),
+                'values': list(values_by_mask[values]),
+                'lifestyle': labels['lifestyle'][i]
+            })
+        
+        return people
+    
+    def iter_dicts(self, chunk_size: int = 1000) -> Iterator[Dict]:
+        """Lazily yield person profile dictionaries, converting a chunk at a time"""
+        for start in range(0, len(self), chunk_size):
+            yield from self.to_dicts(start, start + chunk_size)
+    
+    def person(self, index: int) -> PersonProfile:
+        """Profile of the person at a position"""
+        return PersonProfile(**self.to_dicts(index, index + 1)[0])
+    
+    def summary(self) -> Dict:
+        """Aggregate description of the population, computed from the columns"""
+        size = len(self)
+        if size == 0:
+            return {'size': 0}
         
-        self.lifestyle_categories = [
-            "urban_professional", "suburban_family", "rural_traditional", "student", 
-            "retiree", "entrepreneur", "budget_conscious", "luxury_oriented"
-        ]
+        income = self.income.astype(np.float64)
+        value_bits = (self.values[:, None] >> np.arange(len(CORE_VALUES), dtype=np.uint16)) & 1
         
-        self.regions = {
-            "us": ["New York", "Los Angeles", "Chicago", "Houston", "Phoenix", "Philadelphia", 
-                   "San Antonio", "San Diego", "Dallas", "San Jose", "Austin", "Jacksonville"],
-            "europe": ["London", "Paris", "Berlin", "Madrid", "Rome", "Amsterdam", 
-                      "Vienna", "Stockholm", "Copenhagen", "Dublin", "Brussels", "Zurich"],
-            "asia": ["Tokyo", "Shanghai", "Mumbai", "Seoul", "Singapore", "Hong Kong", 
-                    "Bangkok", "Jakarta", "Manila", "Kuala Lumpur", "Taipei", "Osaka"],
-            "global": ["New York", "London", "Tokyo", "Shanghai", "Los Angeles", "Paris", 
-                      "Berlin", "Mumbai", "São Paulo", "Sydney", "Toronto", "Dubai"]
+        return {
+            'size': size,
+            'age': {
+                'min': int(self.age.min()),
+                'max': int(self.age.max()),
+                'mean': round(float(self.age.mean()), 1)
+            },
+            'income': {
+                'min': int(self.income.min()),
+                'max': int(self.income.max()),
+                'mean': round(float(income.mean())),
+                'median': round(float(np.median(income)))
+            },
+            'categories': {
+                column: {
+                    label: int(count)
+                    for label, count in zip(vocabulary, np.bincount(getattr(self, column), minlength=len(vocabulary)))
+                    if count
+                }
+                for column, vocabulary in self.CATEGORIES.items()
+            },
+            'values': dict(zip(CORE_VALUES, value_bits.sum(axis=0).tolist())),
+            'personality_means': dict(zip(
+                PERSONALITY_TRAITS, np.round(self.personality.mean(axis=0, dtype=np.float64), 3).tolist()
+            ))
         }
+
+def population_key(size: int, parameters: Optional[Dict], seed: int) -> str:
+    """
+    Stable key for a seeded population.
+    
+    The same (size, parameters, seed) always generates the same population,
+    so the key can stand in for the population itself in caches and stores.
+    """
+    key_string = json.dumps({
+        'version': GENERATOR_VERSION,
+        'size': size,
+        'parameters': parameters or {},
+        'seed': seed
+    }, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(key_string.encode()).hexdigest()
+
+def _generate_shard(task: Tuple[int, int, int, Dict]) -> 'PopulationFrame':
+    """Generate one shard in a worker process"""
+    seed, shard_index, size, parameters = task
+    return PopulationGenerator().generate_shard(seed, shard_index, size, parameters)
+
+class PopulationGenerator:
+    """
+    Generates realistic synthetic populations with diverse demographics and behavioral traits.
+    """
+    
+    def __init__(self):
+        self.occupations = OCCUPATIONS
+        self.education_levels = EDUCATION_LEVELS
+        self.personality_traits = PERSONALITY_TRAITS
+        self.core_values = CORE_VALUES
+        self.lifestyle_categories = LIFESTYLE_CATEGORIES
+        self.regions = REGIONS
+        
+        # Conditional pools used by the vectorized generators, stored as
+        # index arrays into the vocabularies above
+        self._young_occupations = self._codes(self.occupations, [
+            "Student", "Retail Worker", "Service Worker", "Administrative Assistant"])
+        self._high_income_occupations = self._codes(self.occupations, [
+            "Software Developer", "Manager", "Engineer", "Consultant",
+            "Financial Analyst", "Marketing Professional", "Entrepreneur"])
+        self._middle_income_occupations = self._codes(self.occupations, [
+            "Teacher", "Healthcare Worker", "Sales Representative",
+            "Administrative Assistant", "Designer", "Government Employee"])
+        self._lower_income_occupations = self._codes(self.occupations, [
+            "Retail Worker", "Service Worker", "Manufacturing Worker",
+            "Administrative Assistant", "Student"])
+        
+        self._student_education = self._codes(self.education_levels, ["High School", "Some College"])
+        self._high_income_education = self._codes(self.education_levels, [
+            "Bachelor's Degree", "Master's Degree", "PhD"])
+        self._middle_income_education = self._codes(self.education_levels, [
+            "High School", "Some College", "Bachelor's Degree", "Trade School"])
+        self._lower_income_education = self._codes(self.education_levels, [
+            "High School", "Some College", "Trade School"])
+        
+        # Rows: under 30, 30-49, 50 and over
+        self._age_values = np.stack([
+            self._codes(self.core_values, ['innovation', 'independence', 'achievement', 'convenience']),
+            self._codes(self.core_values, ['family', 'security', 'quality', 'achievement']),
+            self._codes(self.core_values, ['security', 'tradition', 'health', 'quality'])
+        ])
+        # Rows: income up to 80k, above 80k
+        self._income_values = np.stack([
+            self._codes(self.core_values, ['security', 'family', 'community']),
+            self._codes(self.core_values, ['quality', 'status', 'convenience'])
+        ])
+        # Pairs added when openness, conscientiousness, agreeableness exceed 0.7
+        self._personality_values = [
+            ('openness', self._codes(self.core_values, ['innovation', 'independence'])),
+            ('conscientiousness', self._codes(self.core_values, ['quality', 'achievement'])),
+            ('agreeableness', self._codes(self.core_values, ['family', 'community']))
+        ]
+        # Popcount lookup for the values bitmask
+        self._value_bit_counts = np.array(
+            [bin(mask).count('1') for mask in range(1 << len(self.core_values))], dtype=np.int8
+        )
     
-    def generate_population(self, size: int, parameters: Optional[Dict] = None) -> List[Dict]:
+    @staticmethod
+    def _codes(vocabulary: List[str], labels: List[str]) -> np.ndarray:
+        """Map labels to their integer codes within a vocabulary"""
+        return np.array([vocabulary.index(label) for label in labels], dtype=np.int64)
+    
+    @staticmethod
+    def _pick(rng: np.random.Generator, options: np.ndarray, size: int) -> np.ndarray:
+        """Draw `size` uniform choices from an array of options"""
+        return options[rng.integers(0, len(options), size)]
+    
+    def generate_population(self, size: int, parameters: Optional[Dict] = None,
+                            seed: Optional[int] = None, workers: int = 1) -> PopulationFrame:
         """
         Generate a synthetic population with specified parameters.
         
+        Every attribute is drawn for the whole population at once as NumPy
+        arrays, so the result is a columnar PopulationFrame; call
+        `to_dicts()` on it where person dictionaries are needed.
+        
+        The population is split into shards of SHARD_SIZE people, each with
+        its own random stream derived from `seed`. Shards can be generated in
+        a process pool and are merged in order, so the same seed and
+        parameters give a byte-identical population for any worker count.
+        
         Args:
             size: Number of people to generate
             parameters: Optional dict with population parameters
+            seed: Optional non-negative integer seed; fresh entropy when omitted
+            workers: Number of processes to generate shards in
             
         Returns:
-            List of person profile dictionaries
+            PopulationFrame holding the generated people
         """
         if parameters is None:
             parameters = {}
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
         
         logger.info(f"Generating population of {size} people with parameters: {parameters}")
         
-        population = []
+        tasks = [
+            (seed, shard_index, min(SHARD_SIZE, size - start), parameters)
+            for shard_index, start in enumerate(range(0, size, SHARD_SIZE))
+        ]
+        
+        if workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+                shards = list(executor.map(_generate_shard, tasks))
+        else:
+            shards = [self.generate_shard(*task) for task in tasks]
         
-        for _ in range(size):
-            person = self._generate_person(parameters)
-            population.append(person.dict() if hasattr(person, 'dict') else person)
+        population = PopulationFrame.concat(shards) if shards else self._generate_frame(
+            0, parameters, np.random.default_rng(seed)
+        )
         
-        logger.info(f"Successfully generated population of {len(population)} people")
+        logger.info(f"Successfully generated population of {len(population)} people "
+                    f"({population.nbytes / 1e6:.1f} MB, {len(tasks)} shards)")
         return population
     
-    def _generate_person(self, parameters: Dict) -> Dict:
-        """Generate a single person profile"""
-        person_id = str(uuid.uuid4())
+    def iter_population(self, size: int, parameters: Optional[Dict] = None,
+                        seed: Optional[int] = None, chunk_size: int = 1000) -> Iterator[Dict]:
+        """
+        Lazily yield person profile dictionaries.
+        
+        Streaming counterpart of `generate_population`: shards are generated
+        one at a time and converted to dicts a chunk at a time, so memory
+        stays constant however large the population. With the same seed the
+        people yielded are identical to the ones `generate_population` builds.
+        
+        Args:
+            size: Number of people to generate
+            parameters: Optional dict with population parameters
+            seed: Optional non-negative integer seed; fresh entropy when omitted
+            chunk_size: Number of profiles converted to dicts at once
+            
+        Yields:
+            Person profile dictionaries
+        """
+        if parameters is None:
+            parameters = {}
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+        
+        logger.info(f"Streaming population of {size} people with parameters: {parameters}")
+        
+        for shard_index, start in enumerate(range(0, size, SHARD_SIZE)):
+            shard = self.generate_shard(seed, shard_index, min(SHARD_SIZE, size - start), parameters)
+            yield from shard.iter_dicts(chunk_size)
+    
+    def generate_shard(self, seed: int, shard_index: int, size: int, parameters: Dict) -> PopulationFrame:
+        """
+        Generate a single shard of a seeded population.
         
+        Each shard draws from an independent stream spawned from the seed,
+        and its ids start at shard_index * SHARD_SIZE so shards never collide.
+        """
+        rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(shard_index,)))
+        return self._generate_frame(size, parameters, rng, first_id=shard_index * SHARD_SIZE)
+    
+    def _generate_frame(self, size: int, parameters: Dict, rng: np.random.Generator,
+                        first_id: int = 0) -> PopulationFrame:
+        """Draw every attribute for `size` people, numbering them from `first_id`"""
         # Age distribution
-        age_min = parameters.get('age_min', 18)
-        age_max = parameters.get('age_max', 65)
-        age = self._generate_realistic_age(age_min, age_max)
+        ages = self._generate_ages(rng, size, parameters.get('age_min', 18), parameters.get('age_max', 65))
         
         # Income based on age and parameters
-        income_level = parameters.get('income_level', 'mixed')
-        income = self._generate_income(age, income_level)
+        incomes = self._generate_incomes(rng, ages, parameters.get('income_level', 'mixed'))
         
         # Location
         region = parameters.get('region', 'us')
-        location = random.choice(self.regions.get(region, self.regions['us']))
+        cities = self._codes(LOCATIONS, self.regions.get(region, self.regions['us']))
+        locations = self._pick(rng, cities, size)
         
         # Occupation based on age and income
-        occupation = self._generate_occupation(age, income)
+        occupations = self._generate_occupations(rng, ages, incomes)
         
         # Education correlated with income and occupation
-        education = self._generate_education(income, occupation)
+        education = self._generate_education(rng, incomes, occupations)
         
         # Behavioral traits
-        tech_savviness = self._generate_trait_value(parameters.get('tech_savvy', 'mixed'), age)
-        price_sensitivity = self._generate_price_sensitivity(income, parameters.get('price_sensitive', 'mixed'))
-        innovation_adoption = self._generate_innovation_adoption(age, tech_savviness, parameters.get('innovation', 'mixed'))
+        tech_savviness = self._generate_tech_savviness(rng, ages, parameters.get('tech_savvy', 'mixed'))
+        price_sensitivity = self._generate_price_sensitivity(rng, incomes, parameters.get('price_sensitive', 'mixed'))
+        innovation_adoption = self._generate_innovation_adoption(
+            rng, ages, tech_savviness, parameters.get('innovation', 'mixed')
+        )
         
-        # Personality traits (Big Five)
-        personality_traits = self._generate_personality_traits()
+        # Personality traits (Big Five), one column per trait
+        personality = self._generate_personality_traits(rng, size)
         
         # Values based on demographics and personality
-        values = self._generate_values(age, income, personality_traits)
+        values = self._generate_values(rng, ages, incomes, personality)
         
         # Lifestyle
-        lifestyle = self._generate_lifestyle(age, income, location, personality_traits)
-        
-        return {
-            'id': person_id,
-            'age': age,
-            'income': income,
-            'location': location,
-            'occupation': occupation,
-            'education': education,
-            'tech_savviness': tech_savviness,
-            'price_sensitivity': price_sensitivity,
-            'innovation_adoption': innovation_adoption,
-            'personality_traits': personality_traits,
-            'values': values,
-            'lifestyle': lifestyle
-        }
+        lifestyle = self._generate_lifestyle(rng, ages, incomes, locations, personality)
+        
+        return PopulationFrame(
+            ids=np.arange(first_id, first_id + size),
+            age=ages,
+            income=incomes,
+            location=locations,
+            occupation=occupations,
+            education=education,
+            tech_savviness=tech_savviness,
+            price_sensitivity=price_sensitivity,
+            innovation_adoption=innovation_adoption,
+            personality=personality,
+            values=values,
+            lifestyle=lifestyle
+        )
     
-    def _generate_realistic_age(self, min_age: int, max_age: int) -> int:
-        """Generate age with realistic distribution (weighted toward middle ages)"""
-        # Create a weighted distribution that favors middle ages
-        ages = list(range(min_age, max_age + 1))
-        weights = []
-        
-        for age in ages:
-            if 25 <= age <= 45:
-                weight = 3  # Higher weight for prime working age
-            elif 18 <= age <= 24 or 46 <= age <= 55:
-                weight = 2  # Medium weight for young adults and middle-aged
-            else:
-                weight = 1  # Lower weight for very young or older
-            weights.append(weight)
-        
-        return random.choices(ages, weights=weights)[0]
+    def _generate_ages(self, rng: np.random.Generator, size: int, min_age: int, max_age: int) -> np.ndarray:
+        """
+        Generate ages with realistic distribution (weighted toward middle ages)
+        
+        Raises:
+            ValueError: If the bounds are reversed or do not fit the age column
+        """
+        limits = np.iinfo(PopulationFrame.DTYPES['age'])
+        if not limits.min <= min_age <= max_age <= limits.max:
+            raise ValueError(f"Invalid age range {min_age}-{max_age}: ages must satisfy "
+                             f"{limits.min} <= age_min <= age_max <= {limits.max}")
+        ages = np.arange(min_age, max_age + 1)
+        
+        # Higher weight for prime working age, medium weight for young adults
+        # and middle-aged, lower weight for very young or older
+        weights = np.select(
+            [(ages >= 25) & (ages <= 45), ((ages >= 18) & (ages <= 24)) | ((ages >= 46) & (ages <= 55))],
+            [3.0, 2.0],
+            default=1.0
+        )
+        
+        return rng.choice(ages, size=size, p=weights / weights.sum())
     
-    def _generate_income(self, age: int, income_level: str) -> int:
-        """Generate income based on age and specified level"""
-        base_income = 30000
-        
-        # Age-based income adjustment
-        if age < 25:
-            age_multiplier = 0.7
-        elif age < 35:
-            age_multiplier = 1.0
-        elif age < 45:
-            age_multiplier = 1.3
-        elif age < 55:
-            age_multiplier = 1.4
-        else:
-            age_multiplier = 1.2  # Often lower due to retirement
+    def _generate_incomes(self, rng: np.random.Generator, ages: np.ndarray, income_level: str) -> np.ndarray:
+        """Generate incomes based on age and specified level"""
+        # Age-based income adjustment (lower after 55, often due to retirement)
+        age_multiplier = np.select(
+            [ages < 25, ages < 35, ages < 45, ages < 55],
+            [0.7, 1.0, 1.3, 1.4],
+            default=1.2
+        )
         
         if income_level == 'low':
             income_range = (20000, 40000)
@@ -208,144 +590,140 @@ class PopulationGenerator:
         else:  # mixed
             income_range = (20000, 150000)
         
-        base = random.randint(income_range[0], income_range[1])
-        final_income = int(base * age_multiplier)
-        
-        return final_income
+        base = rng.integers(income_range[0], income_range[1], size=len(ages), endpoint=True)
+        return (base * age_multiplier).astype(np.int64)
     
-    def _generate_occupation(self, age: int, income: int) -> str:
-        """Generate occupation that correlates with age and income"""
-        if age < 25:
-            # Younger people more likely to be students or entry-level
-            young_occupations = ["Student", "Retail Worker", "Service Worker", "Administrative Assistant"]
-            if random.random() < 0.3:
-                return random.choice(young_occupations)
-        
-        if income > 80000:
-            # Higher income occupations
-            high_income_occupations = ["Software Developer", "Manager", "Engineer", "Consultant", 
-                                     "Financial Analyst", "Marketing Professional", "Entrepreneur"]
-            return random.choice(high_income_occupations)
-        elif income > 40000:
-            # Middle income occupations
-            middle_income_occupations = ["Teacher", "Healthcare Worker", "Sales Representative", 
-                                       "Administrative Assistant", "Designer", "Government Employee"]
-            return random.choice(middle_income_occupations)
-        else:
-            # Lower income occupations
-            lower_income_occupations = ["Retail Worker", "Service Worker", "Manufacturing Worker", 
-                                      "Administrative Assistant", "Student"]
-            return random.choice(lower_income_occupations)
+    def _generate_occupations(self, rng: np.random.Generator, ages: np.ndarray, incomes: np.ndarray) -> np.ndarray:
+        """Generate occupation codes that correlate with age and income"""
+        size = len(ages)
+        occupations = np.select(
+            [incomes > 80000, incomes > 40000],
+            [self._pick(rng, self._high_income_occupations, size),
+             self._pick(rng, self._middle_income_occupations, size)],
+            default=self._pick(rng, self._lower_income_occupations, size)
+        )
+        
+        # Younger people more likely to be students or entry-level
+        young = (ages < 25) & (rng.random(size) < 0.3)
+        return np.where(young, self._pick(rng, self._young_occupations, size), occupations)
     
-    def _generate_education(self, income: int, occupation: str) -> str:
-        """Generate education level correlated with income and occupation"""
-        if "Student" in occupation:
-            return random.choice(["High School", "Some College"])
-        
-        if income > 80000:
-            return random.choice(["Bachelor's Degree", "Master's Degree", "PhD"])
-        elif income > 40000:
-            return random.choice(["High School", "Some College", "Bachelor's Degree", "Trade School"])
-        else:
-            return random.choice(["High School", "Some College", "Trade School"])
+    def _generate_education(self, rng: np.random.Generator, incomes: np.ndarray, occupations: np.ndarray) -> np.ndarray:
+        """Generate education codes correlated with income and occupation"""
+        size = len(incomes)
+        student = occupations == self.occupations.index("Student")
+        
+        return np.select(
+            [student, incomes > 80000, incomes > 40000],
+            [self._pick(rng, self._student_education, size),
+             self._pick(rng, self._high_income_education, size),
+             self._pick(rng, self._middle_income_education, size)],
+            default=self._pick(rng, self._lower_income_education, size)
+        )
     
-    def _generate_trait_value(self, param_value: str, age: int) -> str:
-        """Generate trait value based on parameter and age"""
-        if param_value in ['low', 'medium', 'high']:
-            return param_value
-        
-        # For 'mixed', generate based on age and randomness
-        if age < 30:
-            # Younger people tend to be more tech-savvy
-            options = ['medium', 'high', 'high']
-        elif age > 50:
-            # Older people tend to be less tech-savvy
-            options = ['low', 'low', 'medium']
-        else:
-            options = ['low', 'medium', 'high']
-        
-        return random.choice(options)
+    def _generate_tech_savviness(self, rng: np.random.Generator, ages: np.ndarray, param_value: str) -> np.ndarray:
+        """Generate tech savviness codes based on parameter and age"""
+        if param_value in TECH_SAVVINESS_LEVELS:
+            return np.full(len(ages), TECH_SAVVINESS_LEVELS.index(param_value))
+        
+        # For 'mixed': younger people tend to be more tech-savvy, older less
+        draw = rng.integers(0, 3, len(ages))
+        return np.select(
+            [ages < 30, ages > 50],
+            [np.array([1, 2, 2])[draw], np.array([0, 0, 1])[draw]],
+            default=np.array([0, 1, 2])[draw]
+        )
     
-    def _generate_price_sensitivity(self, income: int, param_value: str) -> str:
-        """Generate price sensitivity based on income"""
-        if param_value in ['low', 'medium', 'high']:
-            return param_value
+    def _generate_price_sensitivity(self, rng: np.random.Generator, incomes: np.ndarray, param_value: str) -> np.ndarray:
+        """Generate price sensitivity codes based on income"""
+        if param_value in PRICE_SENSITIVITY_LEVELS:
+            return np.full(len(incomes), PRICE_SENSITIVITY_LEVELS.index(param_value))
         
         # Higher income = lower price sensitivity
-        if income > 80000:
-            return random.choice(['low', 'low', 'medium'])
-        elif income > 40000:
-            return random.choice(['low', 'medium', 'high'])
-        else:
-            return random.choice(['medium', 'high', 'high'])
+        draw = rng.integers(0, 3, len(incomes))
+        return np.select(
+            [incomes > 80000, incomes > 40000],
+            [np.array([0, 0, 1])[draw], np.array([0, 1, 2])[draw]],
+            default=np.array([1, 2, 2])[draw]
+        )
     
-    def _generate_innovation_adoption(self, age: int, tech_savviness: str, param_value: str) -> str:
-        """Generate innovation adoption pattern"""
-        if param_value in ['early', 'mainstream', 'late']:
-            return param_value
+    def _generate_innovation_adoption(self, rng: np.random.Generator, ages: np.ndarray,
+                                      tech_savviness: np.ndarray, param_value: str) -> np.ndarray:
+        """Generate innovation adoption codes"""
+        if param_value in INNOVATION_ADOPTION_STAGES:
+            return np.full(len(ages), INNOVATION_ADOPTION_STAGES.index(param_value))
         
         # Younger + tech-savvy = early adopter
-        if age < 35 and tech_savviness in ['medium', 'high']:
-            return random.choice(['early', 'early', 'mainstream'])
-        elif age > 50:
-            return random.choice(['mainstream', 'late', 'late'])
-        else:
-            return random.choice(['early', 'mainstream', 'late'])
+        draw = rng.integers(0, 3, len(ages))
+        return np.select(
+            [(ages < 35) & (tech_savviness >= 1), ages > 50],
+            [np.array([0, 0, 1])[draw], np.array([1, 2, 2])[draw]],
+            default=np.array([0, 1, 2])[draw]
+        )
     
-    def _generate_personality_traits(self) -> Dict[str, float]:
-        """Generate Big Five personality traits"""
-        traits = {}
-        for trait in self.personality_traits:
-            # Generate values between 0.0 and 1.0 with normal distribution
-            value = max(0.0, min(1.0, random.gauss(0.5, 0.2)))
-            traits[trait] = round(value, 2)
-        return traits
+    def _generate_personality_traits(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        """Generate Big Five personality traits, one column per trait"""
+        # Values between 0.0 and 1.0 with normal distribution
+        traits = np.clip(rng.normal(0.5, 0.2, (size, len(self.personality_traits))), 0.0, 1.0)
+        return np.round(traits, 2)
     
-    def _generate_values(self, age: int, income: int, personality_traits: Dict[str, float]) -> List[str]:
-        """Generate core values based on demographics and personality"""
-        selected_values = []
-        
-        # Age-based value tendencies
-        if age < 30:
-            age_values = ['innovation', 'independence', 'achievement', 'convenience']
-        elif age < 50:
-            age_values = ['family', 'security', 'quality', 'achievement']
-        else:
-            age_values = ['security', 'tradition', 'health', 'quality']
-        
-        # Income-based value tendencies
-        if income > 80000:
-            income_values = ['quality', 'status', 'convenience']
-        else:
-            income_values = ['security', 'family', 'community']
-        
-        # Personality-based values
-        if personality_traits.get('openness', 0.5) > 0.7:
-            selected_values.extend(['innovation', 'independence'])
-        if personality_traits.get('conscientiousness', 0.5) > 0.7:
-            selected_values.extend(['quality', 'achievement'])
-        if personality_traits.get('agreeableness', 0.5) > 0.7:
-            selected_values.extend(['family', 'community'])
-        
-        # Combine and randomize
-        all_possible = age_values + income_values + selected_values
-        final_values = list(set(random.choices(all_possible, k=random.randint(3, 6))))
+    def _generate_values(self, rng: np.random.Generator, ages: np.ndarray, incomes: np.ndarray,
+                         personality: np.ndarray) -> np.ndarray:
+        """
+        Generate core values based on demographics and personality.
         
-        return final_values[:5]  # Limit to 5 values
+        Each person draws 3-6 times (with replacement) from their pool of
+        age, income and personality values; the distinct values drawn, capped
+        at 5, are returned as a bitmask over `core_values`.
+        """
+        size = len(ages)
+        
+        # Candidate pool per person, padded with -1
+        age_tier = np.select([ages < 30, ages < 50], [0, 1], default=2)
+        income_tier = (incomes > 80000).astype(np.int64)
+        pools = [self._age_values[age_tier], self._income_values[income_tier]]
+        for trait, trait_values in self._personality_values:
+            high = personality[:, self.personality_traits.index(trait)] > 0.7
+            pools.append(np.where(high[:, None], trait_values, -1))
+        pool = np.concatenate(pools, axis=1)
+        
+        # Move the valid candidates to the front of each row
+        pool = np.take_along_axis(pool, np.argsort(pool < 0, axis=1, kind='stable'), axis=1)
+        pool_sizes = (pool >= 0).sum(axis=1)
+        
+        # Up to six uniform draws per person, of which the first k count
+        draws = np.take_along_axis(
+            pool, (rng.random((size, 6)) * pool_sizes[:, None]).astype(np.int64), axis=1
+        )
+        counts = rng.integers(3, 7, size)
+        drawn = np.arange(6) < counts[:, None]
+        bits = np.where(drawn, np.left_shift(1, draws), 0)
+        masks = np.bitwise_or.reduce(bits, axis=1)
+        
+        # Limit to 5 values: six distinct draws only happen when every draw
+        # was new, so dropping the last one keeps the first five
+        too_many = self._value_bit_counts[masks] > 5
+        masks[too_many] &= ~bits[too_many, 5]
+        
+        return masks.astype(np.uint16)
     
-    def _generate_lifestyle(self, age: int, income: int, location: str, personality_traits: Dict[str, float]) -> str:
-        """Generate lifestyle category"""
-        if age < 25:
-            return 'student'
-        elif age > 60:
-            return 'retiree'
-        elif income > 100000:
-            return 'luxury_oriented'
-        elif income < 35000:
-            return 'budget_conscious'
-        elif personality_traits.get('extraversion', 0.5) > 0.7 and 'New York' in location or 'London' in location:
-            return 'urban_professional'
-        elif personality_traits.get('openness', 0.5) > 0.7:
-            return 'entrepreneur'
-        else:
-            return random.choice(['suburban_family', 'urban_professional', 'rural_traditional'])
\ No newline at end of file
+    def _generate_lifestyle(self, rng: np.random.Generator, ages: np.ndarray, incomes: np.ndarray,
+                            locations: np.ndarray, personality: np.ndarray) -> np.ndarray:
+        """Generate lifestyle category codes"""
+        size = len(ages)
+        in_new_york = np.array(['New York' in city for city in LOCATIONS])[locations]
+        in_london = np.array(['London' in city for city in LOCATIONS])[locations]
+        extraversion = personality[:, self.personality_traits.index('extraversion')]
+        openness = personality[:, self.personality_traits.index('openness')]
+        
+        return np.select(
+            [ages < 25,
+             ages > 60,
+             incomes > 100000,
+             incomes < 35000,
+             (extraversion > 0.7) & in_new_york | in_london,
+             openness > 0.7],
+            [self.lifestyle_categories.index(category) for category in (
+                'student', 'retiree', 'luxury_oriented', 'budget_conscious', 'urban_professional', 'entrepreneur')],
+            default=self._pick(rng, self._codes(self.lifestyle_categories, [
+                'suburban_family', 'urban_professional', 'rural_traditional']), size)
+        )
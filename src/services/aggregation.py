@@ -0,0 +1,334 @@
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from src.models.population import LOCATIONS, PERSONALITY_TRAITS, REGIONS, PopulationFrame
+
+logger = logging.getLogger(__name__)
+
+REACTION_TYPES = ('positive', 'negative', 'neutral')
+REACTION_CODES = {reaction_type: code for code, reaction_type in enumerate(REACTION_TYPES)}
+
+# Likelihood to act above which a person counts as likely to act
+HIGH_ACTION_THRESHOLD = 0.7
+
+# Breakdown bands: lower edges of every band after the first
+AGE_BAND_EDGES = (18, 25, 35, 45, 55, 65)
+AGE_BAND_LABELS = ('<18', '18-24', '25-34', '35-44', '45-54', '55-64', '65+')
+INCOME_BAND_EDGES = (25000, 50000, 100000, 150000)
+INCOME_BAND_LABELS = ('<25k', '25k-50k', '50k-100k', '100k-150k', '150k+')
+TRAIT_LEVEL_LABELS = ('low', 'medium', 'high')  # equal thirds of the 0-1 trait scale
+
+# Age band of every possible uint8 age, so banding is a table lookup
+AGE_BAND_OF = np.searchsorted(AGE_BAND_EDGES, np.arange(256), side='right')
+
+# Region of each location code; cities only listed under 'global' count as 'other'
+REGION_LABELS = tuple(region for region in REGIONS if region != 'global') + ('other',)
+LOCATION_REGION = np.array([
+    next((code for code, region in enumerate(REGION_LABELS[:-1]) if city in REGIONS[region]),
+         len(REGION_LABELS) - 1)
+    for city in LOCATIONS
+], dtype=np.int64)
+
+class OnlineAggregator:
+    """
+    Population-level results maintained incrementally, O(1) per reaction.
+    
+    Reactions are added as they arrive, each with a weight (the number of
+    people it stands for, e.g. an archetype representative's group size),
+    and `snapshot()` returns the same results structure as a full
+    aggregation at any point. Nothing per person is retained. Safe to add
+    from one thread while others take snapshots.
+    """
+    
+    def __init__(self, decision_analysis: Optional[Dict] = None):
+        self.decision_analysis = decision_analysis or {}
+        self.version = 0  # bumped on every add, to detect changes
+        self._lock = threading.Lock()
+        
+        self.total = 0
+        self.fallback_people = 0  # people whose reaction is a fallback, weighted like every other count
+        self.strength_sum = 0.0
+        self.high_action = 0
+        self.counts = {reaction_type: 0 for reaction_type in REACTION_TYPES}
+        self.strength_by_type = {reaction_type: 0.0 for reaction_type in REACTION_TYPES}
+        self.strong = {reaction_type: 0 for reaction_type in REACTION_TYPES}    # strength > 0.7
+        self.moderate = {reaction_type: 0 for reaction_type in REACTION_TYPES}  # 0.3 <= strength <= 0.7
+    
+    def add(self, reaction: Dict, weight: int = 1):
+        """Fold one reaction, standing for `weight` people, into the totals"""
+        # Unknown reaction types count as neutral, as in the columnar path
+        reaction_type = reaction['reaction_type'] if reaction['reaction_type'] in REACTION_CODES else 'neutral'
+        strength = reaction['reaction_strength']
+        
+        with self._lock:
+            self.total += weight
+            self.strength_sum += strength * weight
+            self.counts[reaction_type] += weight
+            self.strength_by_type[reaction_type] += strength * weight
+            if strength > 0.7:
+                self.strong[reaction_type] += weight
+            elif strength >= 0.3:
+                self.moderate[reaction_type] += weight
+            if reaction['likelihood_to_act'] > HIGH_ACTION_THRESHOLD:
+                self.high_action += weight
+            if reaction.get('fallback'):
+                self.fallback_people += weight
+            self.version += 1
+    
+    def add_many(self, reactions: List[Dict], weights: Optional[List[int]] = None):
+        """Fold a sequence of reactions, optionally weighted"""
+        for position, reaction in enumerate(reactions):
+            self.add(reaction, 1 if weights is None else weights[position])
+    
+    def snapshot(self) -> Dict:
+        """Population-level results for the reactions added so far"""
+        with self._lock:
+            total = self.total
+            counts = dict(self.counts)
+            strength_by_type = dict(self.strength_by_type)
+            strong = dict(self.strong)
+            moderate = dict(self.moderate)
+            strength_sum = self.strength_sum
+            high_action = self.high_action
+            fallback_people = self.fallback_people
+        
+        net_sentiment = (strength_by_type['positive'] - strength_by_type['negative']) / total if total else 0.0
+        
+        return {
+            'total_population': total,
+            'reactions_summary': counts,
+            'average_reaction_strength': round(strength_sum / total, 3) if total else 0.0,
+            'demographic_breakdown': {},
+            'key_insights': self._insights(counts, high_action, total),
+            'behavioral_segments': {
+                'strong_supporters': strong['positive'],
+                'moderate_supporters': moderate['positive'],
+                'strong_opponents': strong['negative'],
+                'moderate_opponents': moderate['negative'],
+                'indifferent': counts['neutral']
+            },
+            'predicted_outcomes': predict_outcomes(net_sentiment),
+            'fallback_people': fallback_people
+        }
+    
+    def _insights(self, counts: Dict[str, int], high_action: int, total: int) -> List[str]:
+        """Key insights from the running totals"""
+        if not total:
+            return []
+        return generate_insights(
+            counts['positive'] / total * 100,
+            counts['negative'] / total * 100,
+            high_action / total * 100,
+            self.decision_analysis
+        )
+
+def generate_insights(positive_pct: float, negative_pct: float, high_action_pct: float,
+                      decision_analysis: Dict) -> List[str]:
+    """Key insights from the reaction mix (percentages of the population)"""
+    insights = []
+    
+    # Overall sentiment
+    if positive_pct > 60:
+        insights.append(f"Strong overall support ({positive_pct:.1f}% positive reactions)")
+    elif negative_pct > 60:
+        insights.append(f"Strong overall opposition ({negative_pct:.1f}% negative reactions)")
+    else:
+        insights.append("Mixed reactions with no clear consensus")
+    
+    # Action likelihood
+    if high_action_pct > 30:
+        insights.append(f"High action potential: {high_action_pct:.1f}% likely to act on their reaction")
+    
+    # Risk assessment
+    risk_level = decision_analysis.get('risk_level', 'medium')
+    if risk_level == 'high' and negative_pct > 40:
+        insights.append("⚠️ High-risk decision with significant negative sentiment")
+    
+    return insights
+
+def predict_outcomes(net_sentiment: float) -> Dict:
+    """Business outcome predictions from the net sentiment score"""
+    return {
+        'net_sentiment_score': round(net_sentiment, 3),
+        'predicted_adoption_rate': max(0, min(100, 50 + net_sentiment * 50)),
+        'churn_risk': max(0, min(100, abs(net_sentiment) * 30 if net_sentiment < 0 else 0)),
+        'revenue_impact_estimate': 'positive' if net_sentiment > 0.2 else 'negative' if net_sentiment < -0.2 else 'neutral'
+    }
+
+@dataclass
+class ReactionColumns:
+    """
+    Reactions stored as columns aligned with a PopulationFrame.
+    
+    Reaction types are codes into REACTION_TYPES (-1 while a person has no
+    reaction yet); a person costs 10 bytes instead of a dict.
+    """
+    reaction_type: np.ndarray  # int8
+    strength: np.ndarray       # float32
+    likelihood: np.ndarray     # float32
+    fallback: np.ndarray       # bool
+    
+    @classmethod
+    def empty(cls, size: int) -> 'ReactionColumns':
+        return cls(
+            reaction_type=np.full(size, -1, dtype=np.int8),
+            strength=np.zeros(size, dtype=np.float32),
+            likelihood=np.zeros(size, dtype=np.float32),
+            fallback=np.zeros(size, dtype=bool)
+        )
+    
+    def __len__(self) -> int:
+        return len(self.reaction_type)
+    
+    def __getitem__(self, index: Union[slice, np.ndarray, Sequence[int]]) -> 'ReactionColumns':
+        """Select reactions by slice or index array, e.g. fan representatives out to members"""
+        return ReactionColumns(
+            reaction_type=self.reaction_type[index],
+            strength=self.strength[index],
+            likelihood=self.likelihood[index],
+            fallback=self.fallback[index]
+        )
+    
+    def __setitem__(self, index: Union[slice, np.ndarray, Sequence[int]], other: 'ReactionColumns'):
+        """Copy reactions from `other` into the selected positions"""
+        self.reaction_type[index] = other.reaction_type
+        self.strength[index] = other.strength
+        self.likelihood[index] = other.likelihood
+        self.fallback[index] = other.fallback
+    
+    def set(self, offset: int, reactions: List[Dict]):
+        """Store reaction dicts at positions offset, offset + 1, ..."""
+        window = slice(offset, offset + len(reactions))
+        # Unknown reaction types count as neutral, as in the rest of the pipeline
+        self.reaction_type[window] = [
+            REACTION_CODES.get(reaction['reaction_type'], REACTION_CODES['neutral']) for reaction in reactions
+        ]
+        self.strength[window] = [reaction['reaction_strength'] for reaction in reactions]
+        self.likelihood[window] = [reaction['likelihood_to_act'] for reaction in reactions]
+        self.fallback[window] = [bool(reaction.get('fallback')) for reaction in reactions]
+
+def breakdown_dimensions(population: PopulationFrame) -> List[Tuple[str, np.ndarray, Sequence[str]]]:
+    """(name, group code per person, group labels) for every demographic breakdown"""
+    dimensions = [
+        ('age_band', AGE_BAND_OF[population.age], AGE_BAND_LABELS),
+        ('income_band', np.searchsorted(np.asarray(INCOME_BAND_EDGES, dtype=population.income.dtype),
+                                        population.income, side='right'), INCOME_BAND_LABELS),
+        ('region', LOCATION_REGION[population.location], REGION_LABELS)
+    ]
+    for column in ('occupation', 'lifestyle', 'education', 'tech_savviness',
+                   'price_sensitivity', 'innovation_adoption'):
+        dimensions.append((column, getattr(population, column), PopulationFrame.CATEGORIES[column]))
+    levels = np.minimum(population.personality * len(TRAIT_LEVEL_LABELS), len(TRAIT_LEVEL_LABELS) - 1)
+    levels = levels.astype(np.int8).T.copy()
+    for position, trait in enumerate(PERSONALITY_TRAITS):
+        dimensions.append((trait, levels[position], TRAIT_LEVEL_LABELS))
+    return dimensions
+
+def _group_stats(codes: np.ndarray, labels: Sequence[str], reaction_type: np.ndarray,
+                 strength: np.ndarray, likelihood: np.ndarray, weights: Optional[np.ndarray] = None) -> Dict:
+    """Reaction mix and mean scores per group, via bincounts over (group, reaction type) keys"""
+    groups = len(labels)
+    types = len(REACTION_TYPES)
+    keys = codes.astype(np.intp) * types + reaction_type
+    mix = np.bincount(keys, weights=weights, minlength=groups * types).reshape(groups, types)
+    strength_by_type = np.bincount(keys, weights=strength, minlength=groups * types).reshape(groups, types)
+    likelihood_sums = np.bincount(keys, weights=likelihood, minlength=groups * types).reshape(groups, types).sum(axis=1)
+    
+    counts = mix.sum(axis=1)
+    strength_sums = strength_by_type.sum(axis=1)
+    sentiment_sums = strength_by_type[:, REACTION_CODES['positive']] - strength_by_type[:, REACTION_CODES['negative']]
+    
+    breakdown = {}
+    for group in np.flatnonzero(counts).tolist():
+        count = float(counts[group])
+        breakdown[labels[group]] = {
+            'count': int(round(count)),
+            **{
+                reaction_type_name: round(float(mix[group, code]) / count * 100, 1)
+                for code, reaction_type_name in enumerate(REACTION_TYPES)
+            },
+            'average_reaction_strength': round(float(strength_sums[group]) / count, 3),
+            'average_likelihood_to_act': round(float(likelihood_sums[group]) / count, 3),
+            'net_sentiment_score': round(float(sentiment_sums[group]) / count, 3)
+        }
+    return breakdown
+
+def aggregate_columns(population: PopulationFrame, reactions: ReactionColumns,
+                      decision_analysis: Dict, breakdowns: bool = True,
+                      weights: Optional[np.ndarray] = None) -> Dict:
+    """
+    Population-level results from columnar reactions, fully vectorized.
+    
+    Args:
+        population: People the reactions belong to, aligned position by position
+        reactions: One reaction per person; people without one are skipped
+        decision_analysis: Analysis from DecisionAnalyzer, for insights
+        breakdowns: Whether to compute demographic_breakdown
+        weights: Optional number of people each row stands for (e.g. inverse
+            sampling rates); counts are weighted sums rounded to integers
+        
+    Returns:
+        The same results structure as OnlineAggregator.snapshot(), with a
+        demographic_breakdown of reaction mix (percent), mean strength, mean
+        likelihood to act and net sentiment per group of each dimension
+    """
+    answered = reactions.reaction_type >= 0
+    if not answered.all():
+        population, reactions = population[answered], reactions[answered]
+        if weights is not None:
+            weights = weights[answered]
+    
+    if len(reactions) == 0:
+        return OnlineAggregator(decision_analysis).snapshot()
+    
+    reaction_type = reactions.reaction_type.astype(np.intp)
+    strength = reactions.strength.astype(np.float64)
+    likelihood = reactions.likelihood.astype(np.float64)
+    weight = np.ones(len(reactions)) if weights is None else np.asarray(weights, dtype=np.float64)
+    weighted_strength = strength if weights is None else strength * weight
+    weighted_likelihood = likelihood if weights is None else likelihood * weight
+    total = float(weight.sum())
+    
+    counts = np.bincount(reaction_type, weights=weights, minlength=len(REACTION_TYPES))
+    strength_by_type = np.bincount(reaction_type, weights=weighted_strength, minlength=len(REACTION_TYPES))
+    strong_rows = strength > 0.7
+    moderate_rows = (strength >= 0.3) & (strength <= 0.7)
+    strong = np.bincount(reaction_type[strong_rows], weights=weight[strong_rows], minlength=len(REACTION_TYPES))
+    moderate = np.bincount(reaction_type[moderate_rows], weights=weight[moderate_rows], minlength=len(REACTION_TYPES))
+    high_action = float(weight[likelihood > HIGH_ACTION_THRESHOLD].sum())
+    
+    positive, negative, neutral = (REACTION_CODES[name] for name in REACTION_TYPES)
+    net_sentiment = float(strength_by_type[positive] - strength_by_type[negative]) / total
+    
+    demographic_breakdown = {}
+    if breakdowns:
+        for name, codes, labels in breakdown_dimensions(population):
+            demographic_breakdown[name] = _group_stats(
+                codes, labels, reaction_type, weighted_strength, weighted_likelihood, weights
+            )
+    
+    return {
+        'total_population': int(round(total)),
+        'reactions_summary': {name: int(round(count)) for name, count in zip(REACTION_TYPES, counts.tolist())},
+        'average_reaction_strength': round(float(weighted_strength.sum()) / total, 3),
+        'demographic_breakdown': demographic_breakdown,
+        'key_insights': generate_insights(
+            counts[positive] / total * 100,
+            counts[negative] / total * 100,
+            high_action / total * 100,
+            decision_analysis
+        ),
+        'behavioral_segments': {
+            'strong_supporters': int(round(strong[positive])),
+            'moderate_supporters': int(round(moderate[positive])),
+            'strong_opponents': int(round(strong[negative])),
+            'moderate_opponents': int(round(moderate[negative])),
+            'indifferent': int(round(counts[neutral]))
+        },
+        'predicted_outcomes': predict_outcomes(net_sentiment),
+        'fallback_people': int(round(float(weight[reactions.fallback].sum())))
+    }
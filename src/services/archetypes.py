@@ -0,0 +1,154 @@
+import logging
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.models.population import PERSONALITY_TRAITS, PopulationFrame
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ArchetypeSignature:
+    """
+    Resolution at which two people count as behaviorally equivalent.
+    
+    People whose discretized attributes match share an archetype and get
+    the same simulated reaction. Every extra field or bucketed trait
+    multiplies the number of archetypes, so the default keeps to the
+    attributes that drive most reactions; add 'occupation', 'values' or
+    personality traits for finer, more expensive groupings.
+    """
+    age_band: int = 10
+    income_bands: Tuple[int, ...] = (40000, 80000, 120000)
+    fields: Tuple[str, ...] = ('lifestyle', 'tech_savviness', 'price_sensitivity', 'innovation_adoption')
+    personality_traits: Tuple[str, ...] = ()
+    personality_buckets: int = 3
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ArchetypeSignature':
+        """Build a signature from request parameters, ignoring unknown keys"""
+        signature = cls()
+        for key in ('age_band', 'personality_buckets'):
+            if key in data:
+                setattr(signature, key, max(1, int(data[key])))
+        if 'income_bands' in data:
+            signature.income_bands = tuple(sorted(int(band) for band in data['income_bands']))
+        if 'fields' in data:
+            unknown = set(data['fields']) - set(PopulationFrame.COLUMNS)
+            if unknown:
+                raise ValueError(f"Unknown archetype fields: {sorted(unknown)}")
+            signature.fields = tuple(data['fields'])
+        if 'personality_traits' in data:
+            unknown = set(data['personality_traits']) - set(PERSONALITY_TRAITS)
+            if unknown:
+                raise ValueError(f"Unknown personality traits: {sorted(unknown)}")
+            signature.personality_traits = tuple(data['personality_traits'])
+        return signature
+
+@dataclass
+class Archetypes:
+    """Grouping of a population into archetypes"""
+    signature: ArchetypeSignature
+    group_of: np.ndarray           # archetype index per person
+    counts: np.ndarray             # members per archetype
+    representatives: np.ndarray    # positions of the people to simulate
+    representative_of: np.ndarray  # index into `representatives` per person
+    
+    def __len__(self) -> int:
+        return len(self.counts)
+    
+    def stats(self) -> Dict:
+        """Summary of the grouping for simulation results"""
+        population = len(self.group_of)
+        return {
+            'population': population,
+            'archetypes': len(self.counts),
+            'simulated': len(self.representatives),
+            'reduction_factor': round(population / max(len(self.representatives), 1), 2),
+            'largest_archetype': int(self.counts.max()) if len(self.counts) else 0,
+            'signature': asdict(self.signature)
+        }
+
+class ArchetypeGrouper:
+    """
+    Groups a population by a discretized behavioral signature and picks up
+    to `per_archetype` representatives from each group to simulate.
+    """
+    
+    def __init__(self, signature: Optional[ArchetypeSignature] = None, per_archetype: int = 1, seed: int = 0):
+        self.signature = signature or ArchetypeSignature()
+        self.per_archetype = max(1, per_archetype)
+        self.seed = seed
+    
+    def signature_columns(self, population: PopulationFrame) -> List[np.ndarray]:
+        """Discretized signature codes, one array per signature component"""
+        signature = self.signature
+        columns = [
+            population.age.astype(np.int64) // signature.age_band,
+            np.searchsorted(np.asarray(signature.income_bands), population.income, side='right')
+        ]
+        for name in signature.fields:
+            columns.append(getattr(population, name).astype(np.int64))
+        
+        for trait in signature.personality_traits:
+            scores = population.personality[:, PERSONALITY_TRAITS.index(trait)]
+            buckets = np.floor(scores * signature.personality_buckets).astype(np.int64)
+            columns.append(np.minimum(buckets, signature.personality_buckets - 1))
+        
+        return columns
+    
+    def signature_keys(self, population: PopulationFrame) -> np.ndarray:
+        """
+        One int64 key per person, equal for people with the same signature.
+        
+        Components are packed in mixed radix so grouping is a 1-D unique
+        instead of a row-wise one over a matrix.
+        """
+        keys = np.zeros(len(population), dtype=np.int64)
+        multiplier = 1
+        for column in self.signature_columns(population):
+            radix = int(column.max()) + 1 if len(column) else 1
+            if multiplier * radix >= 2 ** 63:
+                raise ValueError("Archetype signature too fine to pack into 64 bits")
+            keys += column * multiplier
+            multiplier *= radix
+        return keys
+    
+    def group(self, population: PopulationFrame) -> Archetypes:
+        """Group a population into archetypes and choose representatives"""
+        size = len(population)
+        _, group_of, counts = np.unique(
+            self.signature_keys(population), return_inverse=True, return_counts=True
+        )
+        group_of = group_of.reshape(-1)
+        
+        # Shuffle, then sort stably by archetype: members of a group become
+        # contiguous in random order and the first k of each are representatives
+        rng = np.random.default_rng(self.seed)
+        order = rng.permutation(size)
+        order = order[np.argsort(group_of[order], kind='stable')]
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)
+        rank = np.empty(size, dtype=np.int64)
+        rank[order] = np.arange(size) - starts[group_of[order]]
+        
+        is_representative = rank < self.per_archetype
+        representatives = np.flatnonzero(is_representative)
+        
+        # Members are spread round-robin over their group's representatives
+        slots = np.minimum(counts, self.per_archetype)
+        slot_of = rank % slots[group_of]
+        lookup = np.full((len(counts), self.per_archetype), -1, dtype=np.int64)
+        lookup[group_of[representatives], rank[representatives]] = np.arange(len(representatives))
+        representative_of = lookup[group_of, slot_of]
+        
+        logger.info(f"Grouped {size} people into {len(counts)} archetypes "
+                    f"({len(representatives)} representatives to simulate)")
+        
+        return Archetypes(
+            signature=self.signature,
+            group_of=group_of,
+            counts=counts,
+            representatives=representatives,
+            representative_of=representative_of
+        )
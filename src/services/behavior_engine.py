@@ -1,23 +1,40 @@
-import google.generativeai as genai
 import json
 import logging
 import asyncio
-import time
-from typing import Dict, List, Optional, Tuple
-from cachetools import TTLCache
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import hashlib
-from concurrent.futures import ThreadPoolExecutor
-from pydantic import BaseModel
+import numpy as np
+from cachetools import LRUCache
+from pydantic import BaseModel, Field
+from src.models.population import PopulationFrame
+from src.services.aggregation import REACTION_TYPES, OnlineAggregator, ReactionColumns, aggregate_columns
+from src.services.archetypes import ArchetypeGrouper
+from src.services.checkpoint_store import SimulationCheckpoint
+from src.services.llm_provider import GeminiProvider, LLMProvider, PromptPrefix
+from src.services.persona_encoding import encode_persona, encode_personas, persona_header
+from src.services.sampling import SamplingPlan, SequentialEstimator
+from src.services.structured_output import ModelValidator, ParseStats, load_json
+from src.services.surrogate import SurrogateModel, SurrogatePlan, holdout_accuracy
+from src.services.work_queue import RedisWorkQueue
+from src.utils.cache import TwoTierCache
+from src.utils.metrics import instrument_llm_async, time_stage
+from src.utils.single_flight import AsyncSingleFlight, SingleFlightAbandoned, SingleFlightTimeout
+from src.utils.tracing import span
+from src.utils.rate_limiter import AdaptiveRateLimiter, estimate_tokens
 
 logger = logging.getLogger(__name__)
 
+class SimulationCancelled(Exception):
+    """Raised when a simulation is stopped through its cancel event"""
+
 class PersonReaction(BaseModel):
     """Structure for individual person reaction"""
     person_id: str
     reaction_type: str  # positive, negative, neutral
     reaction_strength: float  # 0.0 to 1.0
-    reasoning: str
-    behavioral_change: Dict[str, any]
+    reasoning: str = 'No reasoning provided'
+    behavioral_change: Dict[str, Any] = Field(default_factory=dict)
     likelihood_to_act: float
 
 class PopulationResults(BaseModel):
@@ -28,26 +45,88 @@ class PopulationResults(BaseModel):
     demographic_breakdown: Dict[str, Dict]
     key_insights: List[str]
     behavioral_segments: Dict[str, Dict]
-    predicted_outcomes: Dict[str, any]
+    predicted_outcomes: Dict[str, Any]
+
+# Strict checker for model reactions, and the response schemas requested from the model
+REACTION_VALIDATOR = ModelValidator(
+    PersonReaction,
+    enums={'reaction_type': REACTION_TYPES},
+    bounds={'reaction_strength': (0.0, 1.0), 'likelihood_to_act': (0.0, 1.0)},
+    exclude=('person_id',)
+)
+REACTION_SCHEMA = REACTION_VALIDATOR.schema()
+BATCH_REACTION_SCHEMA = {'type': 'ARRAY', 'items': REACTION_VALIDATOR.schema(extra={'person': {'type': 'INTEGER'}})}
+
+def _consecutive_runs(positions: np.ndarray) -> List[Tuple[int, int]]:
+    """(start, end) index ranges of `positions` whose values increase by one"""
+    breaks = (np.flatnonzero(np.diff(positions) != 1) + 1).tolist()
+    return list(zip([0] + breaks, breaks + [len(positions)]))
 
 class BehaviorEngine:
     """
-    AI-powered behavior prediction engine using Google Gemini API.
+    AI-powered behavior prediction engine using Google Gemini API (or another LLMProvider).
     Simulates how individuals and populations react to business decisions.
+    
+    Gemini calls run on one long-lived asyncio event loop owned by the
+    engine (started lazily in a daemon thread); the synchronous methods
+    submit coroutines to it and wait for the result.
+    
+    With a `work_queue`, population simulations are queued as tasks for
+    `worker.py` processes instead of calling Gemini from this process.
     """
     
-    def __init__(self, api_key: str, cache_ttl: int = 3600, max_workers: int = 5):
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-pro')
-        self.cache = TTLCache(maxsize=5000, ttl=cache_ttl)
-        self.max_workers = max_workers
-        self.rate_limit_delay = 0.1  # Delay between API calls to respect rate limits
+    def __init__(self, api_key: Optional[str] = None, cache_ttl: int = 3600, max_workers: int = 5,
+                 cache: Optional[TwoTierCache] = None, personas_per_prompt: int = 1,
+                 max_batch_retries: int = 2, rate_limiter: Optional[AdaptiveRateLimiter] = None,
+                 provider: Optional[LLMProvider] = None, work_queue: Optional[RedisWorkQueue] = None,
+                 coalesce_timeout: Optional[float] = 120.0):
+        self.provider = provider or GeminiProvider(api_key)
+        self._generate_person = instrument_llm_async(self.provider.generate_async, 'person')
+        self._generate_batch = instrument_llm_async(self.provider.generate_async, 'batch')
+        self.cache = cache or TwoTierCache('reactions', ttl=cache_ttl, maxsize=5000)
+        self.max_workers = max(1, max_workers)  # Queue consumers per simulation
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter(max_concurrency=self.max_workers)
+        self.personas_per_prompt = max(1, personas_per_prompt)  # People simulated per Gemini request
+        self.max_batch_retries = max_batch_retries  # Re-asks for personas whose reaction is missing or invalid
+        self.parse_stats = ParseStats()
+        self.work_queue = work_queue
+        self.coalesce_timeout = coalesce_timeout  # Seconds a persona waits for an identical one in flight
+        self._flight = AsyncSingleFlight('reactions')  # Used on the engine's loop only
+        
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+        
+        # Decision-level prompt prefixes, compiled once per decision and prompt kind
+        self._prefixes: LRUCache = LRUCache(maxsize=64)
+        self._prompt_lock = threading.Lock()
+        self._prompt_counters = {'prompts': 0, 'prefix_tokens': 0, 'suffix_tokens': 0, 'prefixes_compiled': 0}
         
     def _get_cache_key(self, person_profile: Dict, decision_analysis: Dict) -> str:
-        """Generate cache key for person+decision combination"""
-        key_string = f"{json.dumps(person_profile, sort_keys=True)}_{json.dumps(decision_analysis, sort_keys=True)}"
+        """Generate cache key for person+decision combination (the person's id is not part of it)"""
+        profile = {key: value for key, value in person_profile.items() if key != 'id'}
+        key_string = f"{json.dumps(profile, sort_keys=True)}_{json.dumps(decision_analysis, sort_keys=True)}"
         return hashlib.md5(key_string.encode()).hexdigest()
     
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        """The engine's event loop, started on first use"""
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever, name='behavior-engine-loop', daemon=True
+                ).start()
+                self._loop = loop
+            return self._loop
+    
+    def _run(self, coroutine):
+        """Run a coroutine on the engine's loop and wait for its result"""
+        future = asyncio.run_coroutine_threadsafe(coroutine, self._get_loop())
+        try:
+            return future.result()
+        except BaseException:
+            future.cancel()
+            raise
+    
     def simulate_person_reaction(self, person_profile: Dict, decision_analysis: Dict) -> Dict:
         """
         Simulate how a specific person would react to a business decision.
@@ -59,83 +138,563 @@ class BehaviorEngine:
         Returns:
             Dictionary containing the person's predicted reaction
         """
+        return self._run(self.simulate_person_reaction_async(person_profile, decision_analysis))
+    
+    async def simulate_person_reaction_async(self, person_profile: Dict, decision_analysis: Dict) -> Dict:
+        """Async version of `simulate_person_reaction`"""
         cache_key = self._get_cache_key(person_profile, decision_analysis)
         
-        # Check cache first
-        if cache_key in self.cache:
-            return self.cache[cache_key]
+        # Check cache first; identical profiles share a cached reaction
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return {**cached, 'person_id': person_profile['id']}
         
-        try:
-            prompt = self._build_person_reaction_prompt(person_profile, decision_analysis)
-            
-            response = self.model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
+        # Identical profiles in flight, in this or a concurrent simulation, share one request
+        future, leader = self._flight.claim(cache_key)
+        if leader:
+            try:
+                reaction = await self._request_person_reaction(person_profile, decision_analysis, cache_key)
+            except BaseException:
+                self._flight.fail(cache_key,
+                                  SingleFlightAbandoned(f"Request for person {person_profile['id']} was cancelled"))
+                raise
+            # Fallbacks are shared too, so waiters do not repeat a request that just failed
+            self._flight.resolve(cache_key, reaction)
+            return reaction
+        
+        reaction = await self._follow(future, person_profile['id'])
+        if reaction is None:
+            reaction = await self._request_person_reaction(person_profile, decision_analysis, cache_key)
+        return reaction
+    
+    async def _request_person_reaction(self, person_profile: Dict, decision_analysis: Dict, cache_key: str) -> Dict:
+        """Ask Gemini for one person's reaction, falling back to a neutral one"""
+        # An invalid response is re-asked up to `max_batch_retries` times before falling back
+        for attempt in range(self.max_batch_retries + 1):
+            try:
+                with span('build_prompt', level=logging.DEBUG, people=1):
+                    prefix = self._get_prompt_prefix(decision_analysis, batched=False)
+                    suffix = self._build_person_reaction_suffix(person_profile)
+                
+                response = await self.rate_limiter.call_async(
+                    self._generate_person,
+                    suffix,
                     temperature=0.4,
                     max_output_tokens=800,
+                    prefix=prefix,
+                    response_schema=REACTION_SCHEMA,
+                    tokens=self._count_prompt_tokens(prefix, suffix) + 800
                 )
-            )
-            
-            reaction_text = response.text
-            reaction = self._parse_person_reaction(reaction_text, person_profile['id'])
+                
+                with span('parse_response', level=logging.DEBUG, people=1):
+                    reaction = self._parse_person_reaction(response.text, person_profile['id'])
+                
+            except ValueError as e:
+                logger.warning(f"Invalid reaction for person {person_profile['id']}: {str(e)}")
+                if attempt < self.max_batch_retries:
+                    self.parse_stats.record('reactions', 'retried')
+                continue
+            except Exception as e:
+                logger.error(f"Error simulating person reaction: {str(e)}")
+                break
             
             # Cache the result
-            self.cache[cache_key] = reaction
-            
-            # Rate limiting
-            time.sleep(self.rate_limit_delay)
+            self.cache.set(cache_key, reaction)
             
             return reaction
+        
+        self.parse_stats.record('reactions', 'fallback')
+        return self._get_fallback_person_reaction(person_profile['id'])
+    
+    def simulate_batch_reactions(self, people: List[Dict], decision_analysis: Dict) -> List[Dict]:
+        """
+        Simulate several people with a single Gemini request.
+        
+        The prompt carries the decision context once plus one compact record
+        per person, and the model answers with a JSON array of reactions
+        keyed by row number. People missing from the answer, whose reaction
+        is invalid, or whose request failed are re-queued without the rest
+        of the batch up to `max_batch_retries` times before falling back to
+        a neutral reaction.
+        
+        Args:
+            people: Person profile dictionaries
+            decision_analysis: Analysis from DecisionAnalyzer
+            
+        Returns:
+            Reactions in the same order as `people`
+        """
+        return self._run(self.simulate_batch_reactions_async(people, decision_analysis))
+    
+    async def simulate_batch_reactions_async(self, people: List[Dict], decision_analysis: Dict) -> List[Dict]:
+        """Async version of `simulate_batch_reactions`"""
+        reactions = {}
+        pending = []
+        led = {}  # Cache key -> id of the person whose reaction this batch simulates for it
+        followers = []
+        
+        # Cached people never reach the prompt, nor do people identical to one already in flight
+        # (earlier in this batch, or in a concurrent one); they wait for that reaction instead
+        for person in people:
+            cache_key = self._get_cache_key(person, decision_analysis)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                reactions[person['id']] = {**cached, 'person_id': person['id']}
+                continue
+            
+            future, leader = self._flight.claim(cache_key)
+            if leader:
+                led[cache_key] = person['id']
+                pending.append(person)
+            else:
+                followers.append((person, cache_key, future))
+        
+        try:
+            await self._request_batch_reactions(pending, decision_analysis, reactions)
+        finally:
+            # Hand reactions (fallbacks included) to waiting callers before waiting on anyone else, so
+            # batches waiting on each other cannot deadlock; people left without one were cancelled
+            for cache_key, person_id in led.items():
+                if person_id in reactions:
+                    self._flight.resolve(cache_key, reactions[person_id])
+                else:
+                    self._flight.fail(cache_key,
+                                      SingleFlightAbandoned(f"Request for person {person_id} was cancelled"))
+        
+        for person, cache_key, future in followers:
+            reaction = await self._follow(future, person['id'])
+            if reaction is None:
+                reaction = await self._request_person_reaction(person, decision_analysis, cache_key)
+            reactions[person['id']] = reaction
+        
+        return [reactions[person['id']] for person in people]
+    
+    async def _request_batch_reactions(self, pending: List[Dict], decision_analysis: Dict, reactions: Dict):
+        """
+        Simulate `pending` people with batched requests, re-asking for the
+        missing ones, and add their reactions to `reactions` (keyed by
+        person id) as they arrive.
+        """
+        for attempt in range(self.max_batch_retries + 1):
+            if not pending:
+                break
             
-        except Exception as e:
-            logger.error(f"Error simulating person reaction: {str(e)}")
-            return self._get_fallback_person_reaction(person_profile['id'])
+            try:
+                with span('build_prompt', level=logging.DEBUG, people=len(pending)):
+                    prefix = self._get_prompt_prefix(decision_analysis, batched=True)
+                    suffix = self._build_batch_reaction_suffix(pending)
+                
+                max_output_tokens = min(8192, 400 * len(pending))
+                response = await self.rate_limiter.call_async(
+                    self._generate_batch,
+                    suffix,
+                    temperature=0.4,
+                    max_output_tokens=max_output_tokens,
+                    prefix=prefix,
+                    response_schema=BATCH_REACTION_SCHEMA,
+                    tokens=self._count_prompt_tokens(prefix, suffix) + max_output_tokens
+                )
+                
+                with span('parse_response', level=logging.DEBUG, people=len(pending)):
+                    parsed = self._parse_batch_reactions(response.text, [person['id'] for person in pending])
+                
+            except Exception as e:
+                logger.error(f"Error simulating batch of {len(pending)} reactions: {str(e)}")
+                parsed = {}
+            
+            for person in pending:
+                if person['id'] in parsed:
+                    reactions[person['id']] = parsed[person['id']]
+                    self.cache.set(self._get_cache_key(person, decision_analysis), parsed[person['id']])
+            
+            missing = [person for person in pending if person['id'] not in parsed]
+            if missing and attempt < self.max_batch_retries:
+                logger.warning(f"Re-queueing {len(missing)}/{len(pending)} personas missing from batched response")
+                self.parse_stats.record('reactions', 'retried', len(missing))
+            pending = missing
+        
+        self.parse_stats.record('reactions', 'fallback', len(pending))
+        for person in pending:
+            reactions[person['id']] = self._get_fallback_person_reaction(person['id'])
+    
+    async def _follow(self, future: asyncio.Future, person_id) -> Optional[Dict]:
+        """
+        Reaction simulated for an identical person by another request, or
+        None if it was cancelled or did not arrive within `coalesce_timeout`.
+        """
+        try:
+            reaction = await self._flight.wait(future, self.coalesce_timeout)
+        except (SingleFlightTimeout, SingleFlightAbandoned) as e:
+            logger.warning(f"No shared reaction for person {person_id} ({str(e)}); simulating it directly")
+            return None
+        if reaction.get('fallback'):
+            self.parse_stats.record('reactions', 'fallback')
+        return {**reaction, 'person_id': person_id}
     
-    def simulate_population_behavior(self, population: List[Dict], decision_analysis: Dict, 
-                                   batch_size: int = 50) -> Dict:
+    def simulate_population_behavior(self, population: PopulationFrame, decision_analysis: Dict, 
+                                   batch_size: int = 50, archetypes: Optional[ArchetypeGrouper] = None,
+                                   cancel_event: Optional[threading.Event] = None,
+                                   progress: Optional[Callable[[List[Dict], int], None]] = None,
+                                   aggregator: Optional[OnlineAggregator] = None,
+                                   sampling: Optional[SamplingPlan] = None,
+                                   surrogate: Optional[SurrogatePlan] = None,
+                                   checkpoint: Optional[SimulationCheckpoint] = None) -> Dict:
         """
         Simulate how an entire population would react to a business decision.
         
+        Reactions are kept as compact columns (plus running totals in an
+        OnlineAggregator for partial results), and the final results,
+        including the demographic breakdown, come from one vectorized
+        aggregation over the population joined with its reactions.
+        
+        With a sampling plan, people are simulated in a random (optionally
+        stratified) order and the run stops as soon as the confidence
+        intervals reach the plan's precision. The sample is then weighted up
+        to the whole population, and results['sampling'] reports the
+        intervals and how many people were actually simulated.
+        
+        With a surrogate plan, Gemini simulates a training sample plus the
+        people a locally trained model is least sure about, and the model
+        predicts everyone else; results['surrogate'] reports how many
+        reactions came from each.
+        
+        With a checkpoint, every simulated reaction is written to it, and
+        people it already holds are answered from it instead of Gemini; a
+        run started again with the same checkpoint and options picks up
+        where the last one stopped.
+        
         Args:
-            population: List of person profiles
+            population: Columnar population; profiles are materialized one batch at a time
             decision_analysis: Analysis from DecisionAnalyzer
-            batch_size: Number of people to process in each batch
+            batch_size: Number of profiles materialized and queued at a time
+            archetypes: Optional grouper; when given, only each archetype's
+                representatives are simulated and each reaction counts once
+                per member it stands for
+            cancel_event: Optional event; setting it stops the simulation
+            progress: Optional callback invoked with each completed unit's
+                reactions and the number of people being simulated; it runs
+                on the engine's event loop and must not block
+            aggregator: Optional aggregator to fold reactions into, e.g. one
+                whose snapshots are served while the simulation runs
+            sampling: Optional plan for sequential sampling with early stopping
+            surrogate: Optional plan for surrogate-assisted simulation
+            checkpoint: Optional checkpoint to resume from and write to
             
         Returns:
             Dictionary containing population-level results
+            
+        Raises:
+            SimulationCancelled: If `cancel_event` was set before completion
+            ValueError: If more than one of `archetypes`, `sampling` and
+                `surrogate` is given, or the sampling plan names unknown strata
         """
         logger.info(f"Starting population simulation for {len(population)} people")
         
-        all_reactions = []
-        total_batches = (len(population) + batch_size - 1) // batch_size
+        if aggregator is None:
+            aggregator = OnlineAggregator(decision_analysis)
         
-        # Process population in batches to manage API rate limits
-        for batch_num in range(total_batches):
-            start_idx = batch_num * batch_size
-            end_idx = min(start_idx + batch_size, len(population))
-            batch = population[start_idx:end_idx]
-            
-            logger.info(f"Processing batch {batch_num + 1}/{total_batches} ({len(batch)} people)")
+        if sum(option is not None for option in (archetypes, sampling, surrogate)) > 1:
+            raise ValueError("Archetypes, sampling and surrogate cannot be combined")
+        if surrogate is not None:
+            return self._simulate_with_surrogate(population, decision_analysis, batch_size, surrogate,
+                                                 cancel_event, progress, aggregator, checkpoint)
+        if sampling is not None:
+            return self._simulate_sample(population, decision_analysis, batch_size, sampling,
+                                         cancel_event, progress, aggregator, checkpoint)
+        
+        if archetypes is not None:
+            groups = archetypes.group(population)
+            simulated = population[groups.representatives]
+            # Members served by each representative
+            weights = np.bincount(groups.representative_of, minlength=len(groups.representatives)).tolist()
+        else:
+            simulated = population
+            weights = None
+        
+        columns = ReactionColumns.empty(len(simulated))
+        
+        def on_unit(offset: int, reactions: List[Dict]):
+            columns.set(offset, reactions)
+            aggregator.add_many(reactions, None if weights is None else weights[offset:offset + len(reactions)])
+            if progress is not None:
+                progress(reactions, len(simulated))
+        
+        self._simulate_people(simulated, decision_analysis, batch_size, cancel_event, on_unit, checkpoint=checkpoint)
+        
+        # Every person gets their representative's reaction
+        if archetypes is not None:
+            columns = columns[groups.representative_of]
+        
+        with time_stage('aggregation'):
+            results = aggregate_columns(population, columns, decision_analysis)
+        if archetypes is not None:
+            results['archetypes'] = groups.stats()
+        
+        # Placeholders are not predictions; make them visible instead of silently neutral
+        if results['fallback_people']:
+            logger.warning(f"{results['fallback_people']}/{results['total_population']} people have fallback reactions")
+        
+        logger.info("Population simulation completed")
+        return results
+    
+    def _simulate_sample(self, population: PopulationFrame, decision_analysis: Dict, batch_size: int,
+                         plan: SamplingPlan, cancel_event: Optional[threading.Event],
+                         progress: Optional[Callable[[List[Dict], int], None]],
+                         aggregator: OnlineAggregator, checkpoint: Optional[SimulationCheckpoint] = None) -> Dict:
+        """Sequential sampling run of simulate_population_behavior"""
+        strata, strata_count = plan.strata(population)
+        strata_sizes = np.bincount(strata, minlength=strata_count)
+        order = plan.order(strata)
+        if plan.max_samples is not None:
+            order = order[:plan.max_samples]
+        ordered = population[order]
+        ordered_strata = strata[order]
+        
+        estimator = SequentialEstimator(plan, strata_sizes)
+        stop_event = threading.Event()
+        columns = ReactionColumns.empty(len(ordered))
+        
+        def on_unit(offset: int, reactions: List[Dict]):
+            columns.set(offset, reactions)
+            aggregator.add_many(reactions)
+            for position, reaction in enumerate(reactions, start=offset):
+                estimator.add(ordered_strata[position], reaction)
+            if estimator.converged():
+                stop_event.set()
+            if progress is not None:
+                progress(reactions, len(ordered))
+        
+        self._simulate_people(ordered, decision_analysis, batch_size, cancel_event, on_unit, stop_event, checkpoint)
+        
+        # Each simulated person stands for their stratum's unsampled members
+        answered = columns.reaction_type >= 0
+        sampled_per_stratum = np.bincount(ordered_strata[answered], minlength=strata_count)
+        weights = strata_sizes[ordered_strata] / np.maximum(sampled_per_stratum[ordered_strata], 1)
+        # Strata with nobody sampled yet are covered pro rata by the others
+        weights *= len(population) / max(float(weights[answered].sum()), 1.0)
+        
+        with time_stage('aggregation'):
+            results = aggregate_columns(ordered, columns, decision_analysis, weights=weights)
+        results['sampling'] = estimator.report(stopped=stop_event.is_set())
+        
+        if results['fallback_people']:
+            logger.warning(f"{results['fallback_people']}/{results['total_population']} people are extrapolated "
+                           f"from fallback reactions")
+        
+        logger.info(f"Sampled simulation completed after {estimator.samples}/{len(population)} people")
+        return results
+    
+    def _simulate_with_surrogate(self, population: PopulationFrame, decision_analysis: Dict, batch_size: int,
+                                 plan: SurrogatePlan, cancel_event: Optional[threading.Event],
+                                 progress: Optional[Callable[[List[Dict], int], None]],
+                                 aggregator: OnlineAggregator,
+                                 checkpoint: Optional[SimulationCheckpoint] = None) -> Dict:
+        """Surrogate-assisted run of simulate_population_behavior"""
+        size = len(population)
+        columns = ReactionColumns.empty(size)
+        simulated = np.zeros(size, dtype=bool)
+        # Gemini budget; the training sample always fits
+        budget = max(min(plan.training_samples, size), int(plan.max_llm_fraction * size))
+        
+        def simulate(positions: np.ndarray):
+            subset = ReactionColumns.empty(len(positions))
             
-            # Process batch with ThreadPoolExecutor for concurrent API calls
-            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                batch_reactions = list(executor.map(
-                    lambda person: self.simulate_person_reaction(person, decision_analysis),
-                    batch
-                ))
+            def on_unit(offset: int, reactions: List[Dict]):
+                subset.set(offset, reactions)
+                aggregator.add_many(reactions)
+                if progress is not None:
+                    progress(reactions, size)
             
-            all_reactions.extend(batch_reactions)
+            self._simulate_people(population[positions], decision_analysis, batch_size, cancel_event, on_unit,
+                                  checkpoint=checkpoint)
+            columns[positions] = subset
+            simulated[positions] = True
+        
+        rng = np.random.default_rng(plan.seed)
+        simulate(np.sort(rng.choice(size, min(plan.training_samples, size), replace=False)))
+        
+        trained = np.flatnonzero(simulated)
+        accuracy = holdout_accuracy(population[trained], columns[trained], plan.seed)
+        used = accuracy >= plan.min_accuracy and not simulated.all()
+        rounds = 0
+        
+        if used:
+            model = SurrogateModel().fit(population[trained], columns[trained])
+            # Active learning: escalate the least confident predictions, then refit
+            for round_number in range(plan.rounds):
+                remaining = np.flatnonzero(~simulated)
+                allowance = budget - int(simulated.sum())
+                if len(remaining) == 0 or allowance <= 0:
+                    break
+                
+                probabilities, _ = model.predict(population[remaining])
+                confidence = probabilities.max(axis=1)
+                uncertain = np.argsort(confidence, kind='stable')[:int((confidence < plan.confidence_threshold).sum())]
+                if len(uncertain) == 0:
+                    break
+                
+                per_round = -(-allowance // (plan.rounds - round_number))
+                simulate(np.sort(remaining[uncertain[:per_round]]))
+                rounds += 1
+                trained = np.flatnonzero(simulated)
+                model = SurrogateModel().fit(population[trained], columns[trained])
             
-            # Brief pause between batches
-            if batch_num < total_batches - 1:
-                time.sleep(1)
+            remaining = np.flatnonzero(~simulated)
+            if len(remaining):
+                _, columns[remaining] = model.predict(population[remaining])
+        elif not simulated.all():
+            logger.warning(f"Surrogate hold-out accuracy {accuracy:.2f} is below {plan.min_accuracy}; "
+                           f"simulating the remaining {size - int(simulated.sum())} people with Gemini")
+            simulate(np.flatnonzero(~simulated))
         
-        # Aggregate results
-        results = self._aggregate_population_results(all_reactions, decision_analysis)
+        llm_generated = int(simulated.sum())
+        with time_stage('aggregation'):
+            results = aggregate_columns(population, columns, decision_analysis)
+        results['surrogate'] = {
+            'used': used,
+            'holdout_accuracy': round(accuracy, 4),
+            'llm_generated': llm_generated,
+            'model_predicted': size - llm_generated,
+            'active_learning_rounds': rounds,
+            'confidence_threshold': plan.confidence_threshold
+        }
         
-        logger.info("Population simulation completed")
+        if results['fallback_people']:
+            logger.warning(f"{results['fallback_people']}/{results['total_population']} people have fallback reactions")
+        
+        logger.info(f"Surrogate simulation completed: {llm_generated} people simulated, "
+                    f"{size - llm_generated} predicted")
         return results
     
+    def _simulate_people(self, population: PopulationFrame, decision_analysis: Dict, batch_size: int,
+                         cancel_event: Optional[threading.Event] = None,
+                         on_unit: Optional[Callable[[int, List[Dict]], None]] = None,
+                         stop_event: Optional[threading.Event] = None,
+                         checkpoint: Optional[SimulationCheckpoint] = None):
+        """Simulate every person in a frame, passing each unit's position and reactions to `on_unit`"""
+        if checkpoint is not None:
+            population, on_unit = self._resume_from_checkpoint(population, batch_size, checkpoint, on_unit,
+                                                               cancel_event, stop_event)
+            if len(population) == 0:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise SimulationCancelled("Simulation cancelled while replaying its checkpoint")
+                return
+        
+        if self.work_queue is not None:
+            done = self.work_queue.simulate(population, decision_analysis, self.personas_per_prompt, batch_size,
+                                            on_unit, cancel_event, stop_event)
+            if cancel_event is not None and cancel_event.is_set():
+                raise SimulationCancelled(f"Simulation cancelled after {done}/{len(population)} people")
+            return
+        
+        self._run(self._simulate_people_async(population, decision_analysis, batch_size, cancel_event, on_unit,
+                                              stop_event))
+    
+    def _resume_from_checkpoint(self, population: PopulationFrame, batch_size: int,
+                                checkpoint: SimulationCheckpoint,
+                                on_unit: Optional[Callable[[int, List[Dict]], None]],
+                                cancel_event: Optional[threading.Event] = None,
+                                stop_event: Optional[threading.Event] = None
+                                ) -> Tuple[PopulationFrame, Callable[[int, List[Dict]], None]]:
+        """
+        Replay the checkpointed people of a frame through `on_unit`, then
+        return the people still to simulate and an `on_unit` for them that
+        checkpoints each reaction and reports it at its position in the
+        full frame. Fallback reactions are reported but not checkpointed, so
+        a resume simulates those people again.
+        """
+        done = np.isin(population.ids, checkpoint.completed)
+        replayed = np.flatnonzero(done)
+        for start in range(0, len(replayed), batch_size):
+            if any(event is not None and event.is_set() for event in (cancel_event, stop_event)):
+                return population[:0], on_unit
+            positions = replayed[start:start + batch_size]
+            reactions = checkpoint.load(population.ids[positions])
+            if on_unit is not None:
+                for run_start, run_end in _consecutive_runs(positions):
+                    on_unit(int(positions[run_start]), reactions[run_start:run_end])
+        
+        remaining = np.flatnonzero(~done)
+        if len(replayed):
+            logger.info(f"Resumed {len(replayed)} checkpointed reactions; {len(remaining)} people left to simulate")
+        
+        def record(offset: int, reactions: List[Dict]):
+            positions = remaining[offset:offset + len(reactions)]
+            ids = population.ids[positions].tolist()
+            simulated = [index for index, reaction in enumerate(reactions) if not reaction.get('fallback')]
+            checkpoint.record([ids[index] for index in simulated], [reactions[index] for index in simulated])
+            if on_unit is not None:
+                for run_start, run_end in _consecutive_runs(positions):
+                    on_unit(int(positions[run_start]), reactions[run_start:run_end])
+        
+        return population[remaining], record
+    
+    async def _simulate_people_async(self, population: PopulationFrame, decision_analysis: Dict, batch_size: int,
+                                     cancel_event: Optional[threading.Event] = None,
+                                     on_unit: Optional[Callable[[int, List[Dict]], None]] = None,
+                                     stop_event: Optional[threading.Event] = None):
+        """
+        Simulate a frame through one bounded work queue.
+        
+        A producer materializes profiles `batch_size` at a time and queues
+        them as prompt-sized units; `max_workers` consumers pull units as
+        soon as they are free, so a slow request never holds up the rest.
+        Setting `stop_event` ends the run early without an error: queued
+        units are skipped and units already in flight finish.
+        """
+        size = len(population)
+        done = 0
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_workers * 2)
+        unit_size = self.personas_per_prompt
+        
+        def cancelled() -> bool:
+            return cancel_event is not None and cancel_event.is_set()
+        
+        def stopped() -> bool:
+            return cancelled() or (stop_event is not None and stop_event.is_set())
+        
+        async def produce():
+            for start in range(0, size, batch_size):
+                if stopped():
+                    break
+                people = population.to_dicts(start, min(start + batch_size, size))
+                for offset in range(0, len(people), unit_size):
+                    await queue.put((start + offset, people[offset:offset + unit_size]))
+            
+            for _ in range(self.max_workers):
+                await queue.put(None)
+        
+        async def work():
+            nonlocal done
+            while True:
+                unit = await queue.get()
+                if unit is None:
+                    return
+                if stopped():
+                    continue  # drain the queue so the producer can finish
+                
+                offset, people = unit
+                if unit_size > 1:
+                    unit_reactions = await self.simulate_batch_reactions_async(people, decision_analysis)
+                else:
+                    unit_reactions = [await self.simulate_person_reaction_async(people[0], decision_analysis)]
+                done += len(unit_reactions)
+                if on_unit is not None:
+                    on_unit(offset, unit_reactions)
+        
+        tasks = [asyncio.ensure_future(produce())]
+        tasks.extend(asyncio.ensure_future(work()) for _ in range(self.max_workers))
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        
+        if cancelled():
+            logger.info(f"Simulation cancelled after {done}/{size} people")
+            raise SimulationCancelled(f"Simulation cancelled after {done}/{size} people")
+    
     def _get_person_system_prompt(self) -> str:
         """System prompt for individual person behavior simulation"""
         return """You are a behavioral psychology expert who can accurately predict how specific individuals react to business decisions based on their personality, demographics, and psychological traits.
@@ -158,23 +717,72 @@ Always respond as JSON with these fields:
 
 Be realistic and nuanced. People often have complex, mixed reactions. Consider both emotional and rational responses."""
 
-    def _build_person_reaction_prompt(self, person_profile: Dict, decision_analysis: Dict) -> str:
-        """Build prompt for simulating individual person reaction"""
-        return f"""{self._get_person_system_prompt()}
-
-You are roleplaying as this person:
-
-PERSON PROFILE:
-{json.dumps(person_profile, indent=2)}
-
-BUSINESS DECISION TO REACT TO:
+    def _build_decision_section(self, decision_analysis: Dict) -> str:
+        """Decision block shared by single and batched reaction prompts"""
+        return f"""BUSINESS DECISION TO REACT TO:
 Decision Type: {decision_analysis.get('decision_type', 'Unknown')}
 Key Factors: {decision_analysis.get('key_factors', [])}
 Decision Parameters: {decision_analysis.get('decision_parameters', {})}
 
 CONTEXT:
 The decision involves these psychological triggers: {decision_analysis.get('psychological_triggers', [])}
-Risk level assessed as: {decision_analysis.get('risk_level', 'medium')}
+Risk level assessed as: {decision_analysis.get('risk_level', 'medium')}"""
+
+    def _get_prompt_prefix(self, decision_analysis: Dict, batched: bool) -> PromptPrefix:
+        """
+        Decision-level part of every reaction prompt for this decision:
+        system prompt, decision, instructions and the persona row layout.
+        Compiled once and reused for every person or batch.
+        """
+        decision_key = hashlib.md5(json.dumps(decision_analysis, sort_keys=True, default=str).encode()).hexdigest()
+        key = f"{'batch' if batched else 'person'}:{decision_key}"
+        with self._prompt_lock:
+            prefix = self._prefixes.get(key)
+        if prefix is not None:
+            return prefix
+        
+        if batched:
+            text = self._build_batch_reaction_prefix(decision_analysis)
+        else:
+            text = self._build_person_reaction_prefix(decision_analysis)
+        prefix = PromptPrefix(key=key, text=text, tokens=estimate_tokens(text))
+        with self._prompt_lock:
+            self._prefixes[key] = prefix
+            self._prompt_counters['prefixes_compiled'] += 1
+        logger.debug(f"Compiled {key.split(':')[0]} prompt prefix: {prefix.tokens} tokens")
+        return prefix
+    
+    def _count_prompt_tokens(self, prefix: PromptPrefix, suffix: str) -> int:
+        """Estimated input tokens of one prompt, recorded in the prompt stats"""
+        suffix_tokens = estimate_tokens(suffix)
+        with self._prompt_lock:
+            self._prompt_counters['prompts'] += 1
+            self._prompt_counters['prefix_tokens'] += prefix.tokens
+            self._prompt_counters['suffix_tokens'] += suffix_tokens
+        logger.debug(f"Prompt tokens: {prefix.tokens} prefix + {suffix_tokens} persona")
+        return prefix.tokens + suffix_tokens
+    
+    def prompt_stats(self) -> Dict:
+        """Estimated input tokens per prompt, split into the shared prefix and persona part"""
+        with self._prompt_lock:
+            counters = dict(self._prompt_counters)
+        prompts = counters['prompts']
+        return {
+            'prompts': prompts,
+            'prefixes_compiled': counters['prefixes_compiled'],
+            'average_prefix_tokens': round(counters['prefix_tokens'] / prompts, 1) if prompts else 0.0,
+            'average_persona_tokens': round(counters['suffix_tokens'] / prompts, 1) if prompts else 0.0,
+            'total_input_tokens': counters['prefix_tokens'] + counters['suffix_tokens']
+        }
+    
+    def _build_person_reaction_prefix(self, decision_analysis: Dict) -> str:
+        """Decision-level start of a single-person prompt; the persona row follows it"""
+        return f"""{self._get_person_system_prompt()}
+
+{self._build_decision_section(decision_analysis)}
+
+You are roleplaying as one person, described by a row of |-separated fields in this order:
+{persona_header()}
 
 Please predict how this specific person would react to this business decision. Put yourself in their shoes and consider:
 
@@ -184,133 +792,139 @@ Please predict how this specific person would react to this business decision. P
 4. How would their personality traits shape their response?
 5. What specific actions (if any) would they likely take?
 
-Respond with your analysis in JSON format."""
+Respond with only the JSON object, without markdown fences or other text.
 
-    def _parse_person_reaction(self, response_text: str, person_id: str) -> Dict:
-        """Parse and validate person reaction response"""
-        try:
-            json_start = response_text.find('{')
-            json_end = response_text.rfind('}') + 1
-            
-            if json_start == -1 or json_end == 0:
-                raise ValueError("No JSON found in response")
-            
-            json_text = response_text[json_start:json_end]
-            reaction_data = json.loads(json_text)
-            
-            # Add person ID
-            reaction_data['person_id'] = person_id
-            
-            # Validate and normalize fields
-            reaction_data['reaction_type'] = reaction_data.get('reaction_type', 'neutral')
-            reaction_data['reaction_strength'] = float(reaction_data.get('reaction_strength', 0.5))
-            reaction_data['likelihood_to_act'] = float(reaction_data.get('likelihood_to_act', 0.5))
-            reaction_data['reasoning'] = reaction_data.get('reasoning', 'No reasoning provided')
-            reaction_data['behavioral_change'] = reaction_data.get('behavioral_change', {})
-            
-            # Ensure values are in valid ranges
-            reaction_data['reaction_strength'] = max(0.0, min(1.0, reaction_data['reaction_strength']))
-            reaction_data['likelihood_to_act'] = max(0.0, min(1.0, reaction_data['likelihood_to_act']))
-            
-            return reaction_data
-            
-        except Exception as e:
-            logger.error(f"Error parsing person reaction: {str(e)}")
-            return self._get_fallback_person_reaction(person_id)
+PERSON:
+"""
+
+    def _build_person_reaction_suffix(self, person_profile: Dict) -> str:
+        """Compact persona row for a single-person prompt"""
+        return encode_persona(person_profile)
     
-    def _get_fallback_person_reaction(self, person_id: str) -> Dict:
-        """Fallback reaction when parsing fails"""
-        return {
-            'person_id': person_id,
-            'reaction_type': 'neutral',
-            'reaction_strength': 0.5,
-            'reasoning': 'Unable to determine specific reaction',
-            'behavioral_change': {},
-            'likelihood_to_act': 0.3
-        }
+    def _build_person_reaction_prompt(self, person_profile: Dict, decision_analysis: Dict) -> str:
+        """Build prompt for simulating individual person reaction"""
+        prefix = self._get_prompt_prefix(decision_analysis, batched=False)
+        return prefix.text + self._build_person_reaction_suffix(person_profile)
     
-    def _aggregate_population_results(self, reactions: List[Dict], decision_analysis: Dict) -> Dict:
-        """Aggregate individual reactions into population-level insights"""
-        total_population = len(reactions)
-        
-        # Count reactions by type
-        reactions_summary = {
-            'positive': len([r for r in reactions if r['reaction_type'] == 'positive']),
-            'negative': len([r for r in reactions if r['reaction_type'] == 'negative']),
-            'neutral': len([r for r in reactions if r['reaction_type'] == 'neutral'])
-        }
-        
-        # Calculate average reaction strength
-        avg_reaction_strength = sum(r['reaction_strength'] for r in reactions) / total_population
+    def _build_batch_reaction_prefix(self, decision_analysis: Dict) -> str:
+        """Decision-level start of a batched prompt; numbered persona rows follow it"""
+        return f"""{self._get_person_system_prompt()}
+
+{self._build_decision_section(decision_analysis)}
+
+You will predict reactions for several different people, one at a time and independently of each other. Each person is one row of |-separated fields in this order:
+{persona_header(numbered=True)}
+
+For each person, put yourself in their shoes: consider their values, demographics, likely cognitive biases and personality, and what specific actions (if any) they would take. Keep each reasoning to one or two sentences.
+
+Respond with a JSON array containing exactly one object per person, in the same order, each with a "person" field copied from the row number "n" plus the fields described above. Respond with only the JSON array, without markdown fences or other text.
+
+PEOPLE:
+"""
+
+    def _build_batch_reaction_suffix(self, people: List[Dict]) -> str:
+        """Numbered compact persona rows for a batched prompt"""
+        return encode_personas(people)
+    
+    def _build_batch_reaction_prompt(self, people: List[Dict], decision_analysis: Dict) -> str:
+        """Build prompt for simulating several people in one request"""
+        prefix = self._get_prompt_prefix(decision_analysis, batched=True)
+        return prefix.text + self._build_batch_reaction_suffix(people)
+    
+    def _parse_batch_reactions(self, response_text: str, person_ids: List) -> Dict:
+        """
+        Parse a batched reaction response into {person_id: reaction}.
         
-        # Segment by reaction type and strength
-        behavioral_segments = {
-            'strong_supporters': len([r for r in reactions if r['reaction_type'] == 'positive' and r['reaction_strength'] > 0.7]),
-            'moderate_supporters': len([r for r in reactions if r['reaction_type'] == 'positive' and 0.3 <= r['reaction_strength'] <= 0.7]),
-            'strong_opponents': len([r for r in reactions if r['reaction_type'] == 'negative' and r['reaction_strength'] > 0.7]),
-            'moderate_opponents': len([r for r in reactions if r['reaction_type'] == 'negative' and 0.3 <= r['reaction_strength'] <= 0.7]),
-            'indifferent': len([r for r in reactions if r['reaction_type'] == 'neutral'])
-        }
+        Objects name their person by 1-based row number ("person"), matched
+        against `person_ids` in prompt order. Complete objects are salvaged
+        from truncated or malformed arrays; invalid reactions and reactions
+        for unknown rows are dropped, so callers re-queue whatever is
+        missing from the result.
+        """
+        ids_by_key = {str(number): person_id for number, person_id in enumerate(person_ids, start=1)}
+        items: List = []
+        salvaged = False
         
-        # Generate key insights
-        key_insights = self._generate_insights(reactions, decision_analysis)
+        try:
+            items, salvaged = load_json(response_text, container='[')
+        except ValueError:
+            # Walk the array object by object, keeping every complete one
+            salvaged = True
+            array_start = response_text.find('[')
+            if array_start != -1:
+                decoder = json.JSONDecoder()
+                position = array_start + 1
+                while True:
+                    position = response_text.find('{', position)
+                    if position == -1:
+                        break
+                    try:
+                        item, position = decoder.raw_decode(response_text, position)
+                        items.append(item)
+                    except ValueError:
+                        position += 1
         
-        # Predict outcomes
-        predicted_outcomes = self._predict_outcomes(reactions, decision_analysis)
+        reactions = {}
+        counts = dict.fromkeys(('parsed', 'repaired', 'invalid'), 0)
+        for item in items if isinstance(items, list) else []:
+            if not isinstance(item, dict):
+                continue
+            person_id = ids_by_key.get(str(item.pop('person', None)))
+            if person_id is None or person_id in reactions:
+                continue
+            try:
+                reactions[person_id], repaired = self._validate_reaction(item, person_id)
+            except ValueError as e:
+                counts['invalid'] += 1
+                logger.warning(f"Dropping invalid reaction for person {person_id}: {str(e)}")
+                continue
+            counts['repaired' if repaired or salvaged else 'parsed'] += 1
         
-        return {
-            'total_population': total_population,
-            'reactions_summary': reactions_summary,
-            'average_reaction_strength': round(avg_reaction_strength, 3),
-            'demographic_breakdown': {},  # Could be expanded with more analysis
-            'key_insights': key_insights,
-            'behavioral_segments': behavioral_segments,
-            'predicted_outcomes': predicted_outcomes
-        }
+        for outcome, count in counts.items():
+            self.parse_stats.record('reactions', outcome, count)
+        self.parse_stats.record('reactions', 'missing', len(person_ids) - len(reactions) - counts['invalid'])
+        return reactions
     
-    def _generate_insights(self, reactions: List[Dict], decision_analysis: Dict) -> List[str]:
-        """Generate key insights from population reactions"""
-        insights = []
-        total = len(reactions)
-        
-        positive_pct = len([r for r in reactions if r['reaction_type'] == 'positive']) / total * 100
-        negative_pct = len([r for r in reactions if r['reaction_type'] == 'negative']) / total * 100
-        
-        # Overall sentiment
-        if positive_pct > 60:
-            insights.append(f"Strong overall support ({positive_pct:.1f}% positive reactions)")
-        elif negative_pct > 60:
-            insights.append(f"Strong overall opposition ({negative_pct:.1f}% negative reactions)")
-        else:
-            insights.append("Mixed reactions with no clear consensus")
+    def _parse_person_reaction(self, response_text: str, person_id: str) -> Dict:
+        """
+        Parse and validate person reaction response.
         
-        # Action likelihood
-        high_action_likelihood = len([r for r in reactions if r['likelihood_to_act'] > 0.7]) / total * 100
-        if high_action_likelihood > 30:
-            insights.append(f"High action potential: {high_action_likelihood:.1f}% likely to act on their reaction")
+        Raises:
+            ValueError: If the response holds no valid reaction, so the
+                caller can re-ask for this person
+        """
+        try:
+            reaction_data, salvaged = load_json(response_text)
+            reaction, repaired = self._validate_reaction(reaction_data, person_id)
+        except ValueError:
+            self.parse_stats.record('reactions', 'invalid')
+            raise
+        
+        self.parse_stats.record('reactions', 'repaired' if repaired or salvaged else 'parsed')
+        return reaction
+    
+    def _validate_reaction(self, reaction_data: Any, person_id) -> Tuple[Dict, bool]:
+        """
+        Check a decoded reaction against PersonReaction.
         
-        # Risk assessment
-        risk_level = decision_analysis.get('risk_level', 'medium')
-        if risk_level == 'high' and negative_pct > 40:
-            insights.append("⚠️ High-risk decision with significant negative sentiment")
+        Returns:
+            (reaction with person_id, whether it had to be repaired)
         
-        return insights
+        Raises:
+            ValidationFailure: If it cannot be made valid
+        """
+        reaction, repaired = REACTION_VALIDATOR.validate(reaction_data)
+        reaction['person_id'] = person_id
+        return reaction, repaired
     
-    def _predict_outcomes(self, reactions: List[Dict], decision_analysis: Dict) -> Dict:
-        """Predict business outcomes based on population reactions"""
-        total = len(reactions)
-        
-        # Calculate net sentiment score
-        positive_score = sum(r['reaction_strength'] for r in reactions if r['reaction_type'] == 'positive')
-        negative_score = sum(r['reaction_strength'] for r in reactions if r['reaction_type'] == 'negative')
-        net_sentiment = (positive_score - negative_score) / total
-        
-        # Predict key metrics
-        outcomes = {
-            'net_sentiment_score': round(net_sentiment, 3),
-            'predicted_adoption_rate': max(0, min(100, 50 + net_sentiment * 50)),
-            'churn_risk': max(0, min(100, abs(net_sentiment) * 30 if net_sentiment < 0 else 0)),
-            'revenue_impact_estimate': 'positive' if net_sentiment > 0.2 else 'negative' if net_sentiment < -0.2 else 'neutral'
+    def _get_fallback_person_reaction(self, person_id: str) -> Dict:
+        """Fallback reaction when parsing or the API call fails"""
+        return {
+            'person_id': person_id,
+            'reaction_type': 'neutral',
+            'reaction_strength': 0.5,
+            'reasoning': 'Unable to determine specific reaction',
+            'behavioral_change': {},
+            'likelihood_to_act': 0.3,
+            'fallback': True
         }
-        
-        return outcomes
\ No newline at end of file
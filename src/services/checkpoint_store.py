@@ -0,0 +1,228 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Sequence, Set
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class CheckpointStore:
+    """
+    Durable record of simulated reactions, in a local SQLite file.
+    
+    Each simulation has a row with the request it was started from and its
+    decision analysis, and one row per simulated person keyed by
+    (simulation id, decision id, person id). Reactions are written as the
+    run goes, so a run interrupted by a crash, deploy or cancellation can
+    be resumed with only the remaining people, and a finished run can be
+    aggregated again without any Gemini calls. Every gunicorn worker on
+    the box opens the same file (WAL mode); simulations not updated for
+    `retention` seconds are pruned.
+    """
+    
+    def __init__(self, path: str, retention: float = 7 * 24 * 3600):
+        self.path = path
+        self.retention = retention
+        self._local = threading.local()
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        with self._connection() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS simulations ('
+                'simulation_id TEXT PRIMARY KEY, decision_id TEXT NOT NULL, request TEXT NOT NULL, '
+                'analysis TEXT NOT NULL, status TEXT NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS simulations_updated_at ON simulations (updated_at)')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS reactions ('
+                'simulation_id TEXT NOT NULL, decision_id TEXT NOT NULL, person_id INTEGER NOT NULL, '
+                'reaction TEXT NOT NULL, PRIMARY KEY (simulation_id, decision_id, person_id)) WITHOUT ROWID'
+            )
+    
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+    
+    def begin(self, simulation_id: str, decision_id: str, request: Dict, analysis: Dict):
+        """
+        Record that a simulation is running; a resumed simulation keeps the
+        request and analysis it was first started with.
+        
+        Args:
+            simulation_id: Id reactions are checkpointed under
+            decision_id: Content hash of the decision
+            request: Options needed to start the simulation again (population
+                id, decision text and parameters, archetypes/sampling/surrogate)
+            analysis: Decision analysis the reactions were simulated against
+        """
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT OR IGNORE INTO simulations '
+                '(simulation_id, decision_id, request, analysis, status, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (simulation_id, decision_id, json.dumps(request), json.dumps(analysis), 'running', now, now)
+            )
+            conn.execute(
+                'UPDATE simulations SET status = ?, updated_at = ? WHERE simulation_id = ?',
+                ('running', now, simulation_id)
+            )
+        self._prune()
+    
+    def finish(self, simulation_id: str, status: str):
+        """Record how a run ended: completed, cancelled or failed"""
+        with self._connection() as conn:
+            conn.execute(
+                'UPDATE simulations SET status = ?, updated_at = ? WHERE simulation_id = ?',
+                (status, time.time(), simulation_id)
+            )
+    
+    def get(self, simulation_id: str) -> Dict:
+        """
+        Look up a checkpointed simulation.
+        
+        Returns:
+            Record with simulation_id, decision_id, request, analysis, status,
+            created_at, updated_at and the number of checkpointed reactions
+        
+        Raises:
+            KeyError: If no simulation is checkpointed under this id
+        """
+        conn = self._connection()
+        row = conn.execute(
+            'SELECT decision_id, request, analysis, status, created_at, updated_at '
+            'FROM simulations WHERE simulation_id = ?', (simulation_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(simulation_id)
+        
+        decision_id, request, analysis, status, created_at, updated_at = row
+        reactions = conn.execute(
+            'SELECT COUNT(*) FROM reactions WHERE simulation_id = ? AND decision_id = ?',
+            (simulation_id, decision_id)
+        ).fetchone()[0]
+        return {
+            'simulation_id': simulation_id,
+            'decision_id': decision_id,
+            'request': json.loads(request),
+            'analysis': json.loads(analysis),
+            'status': status,
+            'created_at': created_at,
+            'updated_at': updated_at,
+            'reactions': reactions
+        }
+    
+    def open(self, simulation_id: str, decision_id: str, flush_every: int = 200,
+             flush_interval: float = 5.0) -> 'SimulationCheckpoint':
+        """Checkpoint for one run of a simulation, seeded with its reactions so far"""
+        ids = [row[0] for row in self._connection().execute(
+            'SELECT person_id FROM reactions WHERE simulation_id = ? AND decision_id = ?', (simulation_id, decision_id)
+        )]
+        return SimulationCheckpoint(self, simulation_id, decision_id, np.asarray(ids, dtype=np.int64),
+                                    flush_every, flush_interval)
+    
+    def load(self, simulation_id: str, decision_id: str, person_ids: Sequence[int]) -> List[Dict]:
+        """Checkpointed reactions of the given people, in the same order"""
+        conn = self._connection()
+        reactions = {}
+        # Stay under SQLite's limit on bound parameters
+        for start in range(0, len(person_ids), 500):
+            chunk = [int(person_id) for person_id in person_ids[start:start + 500]]
+            rows = conn.execute(
+                f"SELECT person_id, reaction FROM reactions WHERE simulation_id = ? AND decision_id = ? "
+                f"AND person_id IN ({','.join('?' * len(chunk))})",
+                (simulation_id, decision_id, *chunk)
+            )
+            reactions.update((person_id, json.loads(reaction)) for person_id, reaction in rows)
+        return [reactions[int(person_id)] for person_id in person_ids]
+    
+    def save(self, simulation_id: str, decision_id: str, person_ids: Sequence[int], reactions: List[Dict]):
+        """Write reactions; people already checkpointed keep their first reaction"""
+        with self._connection() as conn:
+            conn.executemany(
+                'INSERT OR IGNORE INTO reactions (simulation_id, decision_id, person_id, reaction) VALUES (?, ?, ?, ?)',
+                [(simulation_id, decision_id, int(person_id), json.dumps(reaction, separators=(',', ':')))
+                 for person_id, reaction in zip(person_ids, reactions)]
+            )
+            conn.execute('UPDATE simulations SET updated_at = ? WHERE simulation_id = ?', (time.time(), simulation_id))
+    
+    def population_ids(self) -> Set[str]:
+        """Stored populations that checkpointed simulations were started on, so they stay resumable"""
+        rows = self._connection().execute('SELECT request FROM simulations')
+        population_ids = (json.loads(request).get('population_id') for (request,) in rows)
+        return {population_id for population_id in population_ids if population_id}
+    
+    def _prune(self):
+        """Drop simulations, and their reactions, not touched within the retention period"""
+        cutoff = time.time() - self.retention
+        with self._connection() as conn:
+            expired = [row[0] for row in conn.execute(
+                'SELECT simulation_id FROM simulations WHERE updated_at < ?', (cutoff,)
+            )]
+            for simulation_id in expired:
+                conn.execute('DELETE FROM reactions WHERE simulation_id = ?', (simulation_id,))
+                conn.execute('DELETE FROM simulations WHERE simulation_id = ?', (simulation_id,))
+        if expired:
+            logger.info(f"Pruned {len(expired)} expired simulation checkpoints")
+    
+    def stats(self) -> Dict:
+        rows = self._connection().execute('SELECT status, COUNT(*) FROM simulations GROUP BY status').fetchall()
+        return {'path': self.path, 'simulations': dict(rows)}
+
+class SimulationCheckpoint:
+    """
+    Checkpoint of one run, handed to BehaviorEngine.simulate_population_behavior.
+    
+    `completed` lists the people checkpointed before the run started; new
+    reactions are buffered and written every `flush_every` reactions or
+    `flush_interval` seconds, whichever comes first, so a crash loses at
+    most one buffer.
+    """
+    
+    def __init__(self, store: CheckpointStore, simulation_id: str, decision_id: str, completed: np.ndarray,
+                 flush_every: int = 200, flush_interval: float = 5.0):
+        self.store = store
+        self.simulation_id = simulation_id
+        self.decision_id = decision_id
+        self.completed = completed
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._ids: List[int] = []
+        self._reactions: List[Dict] = []
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def load(self, person_ids: Sequence[int]) -> List[Dict]:
+        """Checkpointed reactions of people in `completed`"""
+        return self.store.load(self.simulation_id, self.decision_id, person_ids)
+    
+    def record(self, person_ids: Sequence[int], reactions: List[Dict]):
+        """Buffer newly simulated reactions, writing the buffer when it is due"""
+        with self._lock:
+            self._ids.extend(person_ids)
+            self._reactions.extend(reactions)
+            due = (len(self._ids) >= self.flush_every
+                   or time.monotonic() - self._flushed_at >= self.flush_interval)
+        if due:
+            self.flush()
+    
+    def flush(self):
+        with self._lock:
+            ids, reactions = self._ids, self._reactions
+            self._ids, self._reactions = [], []
+            self._flushed_at = time.monotonic()
+        if ids:
+            self.store.save(self.simulation_id, self.decision_id, ids, reactions)
@@ -1,10 +1,14 @@
-import google.generativeai as genai
 import json
 import logging
-from typing import Dict, List, Optional
-from cachetools import TTLCache
-import hashlib
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel
+from src.services.decision_registry import decision_key
+from src.services.llm_provider import GeminiProvider, LLMProvider
+from src.services.structured_output import ModelValidator, ParseStats, load_json
+from src.utils.cache import TwoTierCache
+from src.utils.metrics import instrument_llm
+from src.utils.rate_limiter import AdaptiveRateLimiter, estimate_tokens
+from src.utils.single_flight import SharedSingleFlight, SingleFlight
 
 logger = logging.getLogger(__name__)
 
@@ -15,26 +19,41 @@ class DecisionAnalysis(BaseModel):
     target_demographics: List[str]
     psychological_triggers: List[str]
     potential_reactions: Dict[str, str]
-    decision_parameters: Dict[str, any]
+    decision_parameters: Dict[str, Any]
     risk_level: str
     confidence_score: float
     reasoning: str
 
+# Strict checker for model analyses, and the response schema requested from the model
+ANALYSIS_VALIDATOR = ModelValidator(
+    DecisionAnalysis,
+    enums={'risk_level': ('low', 'medium', 'high')},
+    bounds={'confidence_score': (0.0, 1.0)}
+)
+ANALYSIS_SCHEMA = ANALYSIS_VALIDATOR.schema()
+
 class DecisionAnalyzer:
     """
-    AI-powered decision analysis using Google Gemini API.
+    AI-powered decision analysis using Google Gemini API (or another LLMProvider).
     Analyzes business decisions through the lens of behavioral economics.
     """
     
-    def __init__(self, api_key: str, cache_ttl: int = 3600):
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-pro')
-        self.cache = TTLCache(maxsize=1000, ttl=cache_ttl)
+    def __init__(self, api_key: Optional[str] = None, cache_ttl: int = 3600, cache: Optional[TwoTierCache] = None,
+                 rate_limiter: Optional[AdaptiveRateLimiter] = None, provider: Optional[LLMProvider] = None,
+                 max_parse_retries: int = 1, coalesce_timeout: Optional[float] = 120.0):
+        self.provider = provider or GeminiProvider(api_key)
+        self._generate = instrument_llm(self.provider.generate, 'analysis')
+        self.cache = cache or TwoTierCache('analyses', ttl=cache_ttl, maxsize=1000)
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter()
+        self.max_parse_retries = max_parse_retries  # Re-asks when the analysis is invalid
+        self.parse_stats = ParseStats()
+        self.coalesce_timeout = coalesce_timeout  # Seconds a caller waits for an identical analysis in flight
+        self._flight = SingleFlight('analyses')
+        self._shared_flight = SharedSingleFlight(self.cache, lock_ttl=int(coalesce_timeout or 120))
         
     def _get_cache_key(self, decision_text: str, decision_params: Optional[Dict] = None) -> str:
-        """Generate cache key for decision analysis"""
-        key_string = f"{decision_text}_{decision_params}"
-        return hashlib.md5(key_string.encode()).hexdigest()
+        """Generate cache key for decision analysis (the decision's content-addressed id)"""
+        return decision_key(decision_text, decision_params)
     
     def analyze_decision(self, decision_text: str, decision_params: Optional[Dict] = None) -> Dict:
         """
@@ -50,34 +69,67 @@ class DecisionAnalyzer:
         cache_key = self._get_cache_key(decision_text, decision_params)
         
         # Check cache first
-        if cache_key in self.cache:
+        cached = self.cache.get(cache_key)
+        if cached is not None:
             logger.info("Returning cached decision analysis")
-            return self.cache[cache_key]
+            return cached
         
         try:
-            prompt = self._build_analysis_prompt(decision_text, decision_params)
-            
-            response = self.model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.3,
-                    max_output_tokens=2000,
-                )
+            # Identical requests arriving together share one Gemini call
+            return self._flight.do(
+                cache_key,
+                lambda: self._analyze_uncached(cache_key, decision_text, decision_params),
+                self.coalesce_timeout
             )
-            
-            analysis_text = response.text
-            analysis = self._parse_analysis_response(analysis_text)
-            
-            # Cache the result
-            self.cache[cache_key] = analysis
-            
-            logger.info(f"Successfully analyzed decision: {decision_text[:50]}...")
-            return analysis
-            
         except Exception as e:
             logger.error(f"Error analyzing decision: {str(e)}")
             raise Exception(f"Failed to analyze decision: {str(e)}")
     
+    def _analyze_uncached(self, cache_key: str, decision_text: str, decision_params: Optional[Dict]) -> Dict:
+        """Analysis for a decision missing from the cache, coalesced with other workers through the shared tier"""
+        # The call this one would have waited for may have finished just before it started
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        return self._shared_flight.do(
+            cache_key,
+            lambda: self._request_analysis(cache_key, decision_text, decision_params),
+            self.coalesce_timeout
+        )
+    
+    def _request_analysis(self, cache_key: str, decision_text: str, decision_params: Optional[Dict]) -> Dict:
+        """Ask Gemini for an analysis, re-asking on invalid responses, and cache a valid one"""
+        prompt = self._build_analysis_prompt(decision_text, decision_params)
+        
+        for attempt in range(self.max_parse_retries + 1):
+            response = self.rate_limiter.call(
+                self._generate,
+                prompt,
+                temperature=0.3,
+                max_output_tokens=2000,
+                response_schema=ANALYSIS_SCHEMA,
+                tokens=estimate_tokens(prompt, 2000)
+            )
+            
+            analysis_text = response.text
+            try:
+                analysis = self._parse_analysis_response(analysis_text)
+                break
+            except ValueError as e:
+                logger.error(f"Invalid decision analysis response: {str(e)}")
+                if attempt < self.max_parse_retries:
+                    self.parse_stats.record('analyses', 'retried')
+        else:
+            # Not cached, so the next request for this decision asks again
+            self.parse_stats.record('analyses', 'fallback')
+            return self._get_fallback_analysis(analysis_text)
+        
+        # Cache the result
+        self.cache.set(cache_key, analysis)
+        
+        logger.info(f"Successfully analyzed decision: {decision_text[:50]}...")
+        return analysis
+    
     def _get_system_prompt(self) -> str:
         """System prompt that makes Gemini think like a behavioral economist"""
         return """You are an expert behavioral economist and decision analyst specializing in predicting human reactions to business decisions. Your role is to analyze business decisions through the lens of psychology, economics, and human behavior.
@@ -125,53 +177,29 @@ DECISION: {decision_text}
 5. What are the short-term vs. long-term behavioral impacts?
 6. What measurable parameters can we extract from this decision?
 
-Provide your analysis in the specified JSON format."""
+Provide your analysis in the specified JSON format, as a bare JSON object without markdown fences or other text."""
 
         return base_prompt
     
     def _parse_analysis_response(self, response_text: str) -> Dict:
-        """Parse and validate the GPT-4 analysis response"""
+        """
+        Parse and validate the Gemini analysis response.
+        
+        Raises:
+            ValueError: If the response holds no valid analysis
+        """
         try:
-            # Extract JSON from response
-            json_start = response_text.find('{')
-            json_end = response_text.rfind('}') + 1
-            
-            if json_start == -1 or json_end == 0:
-                raise ValueError("No JSON found in response")
-            
-            json_text = response_text[json_start:json_end]
-            analysis_data = json.loads(json_text)
-            
-            # Validate required fields
-            required_fields = [
-                'decision_type', 'key_factors', 'target_demographics',
-                'psychological_triggers', 'potential_reactions', 
-                'decision_parameters', 'risk_level', 'confidence_score', 'reasoning'
-            ]
-            
-            for field in required_fields:
-                if field not in analysis_data:
-                    raise ValueError(f"Missing required field: {field}")
-            
-            # Validate data types
-            if not isinstance(analysis_data['confidence_score'], (int, float)):
-                analysis_data['confidence_score'] = 0.5
-            
-            if analysis_data['confidence_score'] > 1.0:
-                analysis_data['confidence_score'] = analysis_data['confidence_score'] / 100
-            
-            return analysis_data
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON response: {str(e)}")
-            # Return fallback analysis
-            return self._get_fallback_analysis(response_text)
-        except Exception as e:
-            logger.error(f"Error parsing analysis response: {str(e)}")
-            return self._get_fallback_analysis(response_text)
+            analysis_data, salvaged = load_json(response_text)
+            analysis, repaired = ANALYSIS_VALIDATOR.validate(analysis_data)
+        except ValueError:
+            self.parse_stats.record('analyses', 'invalid')
+            raise
+        
+        self.parse_stats.record('analyses', 'repaired' if repaired or salvaged else 'parsed')
+        return analysis
     
     def _get_fallback_analysis(self, response_text: str) -> Dict:
-        """Provide a fallback analysis structure when parsing fails"""
+        """Provide a fallback analysis structure when parsing fails (flagged, so it is never registered)"""
         return {
             "decision_type": "unknown",
             "key_factors": ["Unable to parse detailed analysis"],
@@ -185,7 +213,8 @@ Provide your analysis in the specified JSON format."""
             "decision_parameters": {},
             "risk_level": "medium",
             "confidence_score": 0.3,
-            "reasoning": f"Analysis parsing failed. Raw response: {response_text[:200]}..."
+            "reasoning": f"Analysis parsing failed. Raw response: {response_text[:200]}...",
+            "fallback": True
         }
     
     def get_decision_categories(self) -> List[str]:
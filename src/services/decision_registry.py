@@ -0,0 +1,106 @@
+import hashlib
+import json
+import logging
+import time
+import unicodedata
+from typing import Callable, Dict, Optional, Tuple
+
+from src.utils.cache import TwoTierCache
+
+logger = logging.getLogger(__name__)
+
+def normalize_decision_text(decision_text: str) -> str:
+    """Unicode-normalized decision text with whitespace runs collapsed"""
+    return ' '.join(unicodedata.normalize('NFKC', decision_text).split())
+
+def canonical_params(decision_params: Optional[Dict] = None) -> str:
+    """Key-order independent JSON for decision parameters (None and {} are the same)"""
+    return json.dumps(decision_params or {}, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+
+def decision_key(decision_text: str, decision_params: Optional[Dict] = None) -> str:
+    """Content hash identifying a decision: same normalized text and parameters, same id"""
+    content = f"{normalize_decision_text(decision_text)}\x1f{canonical_params(decision_params)}"
+    return hashlib.sha256(content.encode()).hexdigest()[:32]
+
+class DecisionRegistry:
+    """
+    Decision analyses stored under content-addressed decision ids.
+    
+    Records live in a TwoTierCache, so with a shared CACHE_BACKEND (redis
+    or sqlite) an id returned by one worker resolves in every other, and
+    simulations can reuse an analysis instead of paying for a new one.
+    """
+    
+    def __init__(self, cache: TwoTierCache):
+        self.cache = cache
+    
+    def register(self, decision_text: str, decision_params: Optional[Dict], analysis: Dict) -> str:
+        """
+        Store an analysis and return its decision id.
+        
+        Args:
+            decision_text: Decision as the user wrote it
+            decision_params: Optional parameters the analysis was made with
+            analysis: Analysis from DecisionAnalyzer
+        
+        Returns:
+            The decision id
+        """
+        decision_id = decision_key(decision_text, decision_params)
+        self.cache.set(decision_id, {
+            'decision_id': decision_id,
+            'decision_text': decision_text,
+            'decision_params': decision_params or {},
+            'analysis': analysis,
+            'created_at': time.time()
+        })
+        return decision_id
+    
+    def get(self, decision_id: str) -> Dict:
+        """
+        Look up a registered decision.
+        
+        Returns:
+            Record with decision_id, decision_text, decision_params, analysis and created_at
+        
+        Raises:
+            KeyError: If the id is unknown or has expired
+        """
+        record = self.cache.get(decision_id)
+        if record is None:
+            raise KeyError(decision_id)
+        return record
+    
+    def resolve(self, decision_text: str, decision_params: Optional[Dict],
+                analyze: Callable[[str, Optional[Dict]], Dict]) -> Tuple[str, Dict]:
+        """
+        Decision id and analysis for a decision, analyzing it only if no
+        worker has registered it yet. Fallback analyses (the model's answer
+        could not be parsed) are returned but not registered, so the next
+        request for the decision asks the model again.
+        
+        Args:
+            decision_text: Decision as the user wrote it
+            decision_params: Optional decision parameters
+            analyze: Called as analyze(decision_text, decision_params) on a miss
+        
+        Returns:
+            (decision_id, analysis)
+        """
+        decision_id = decision_key(decision_text, decision_params)
+        try:
+            return decision_id, self.get(decision_id)['analysis']
+        except KeyError:
+            pass
+        
+        analysis = analyze(decision_text, decision_params)
+        if analysis.get('fallback'):
+            logger.warning(f"Not registering fallback analysis for decision {decision_id}")
+            return decision_id, analysis
+        
+        self.register(decision_text, decision_params, analysis)
+        logger.info(f"Registered decision {decision_id}")
+        return decision_id, analysis
+    
+    def stats(self) -> Dict:
+        return self.cache.stats()
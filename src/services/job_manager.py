@@ -0,0 +1,219 @@
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from src.utils.metrics import JOBS
+
+logger = logging.getLogger(__name__)
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+@dataclass
+class SimulationJob:
+    """State of one background simulation, updated by the thread running it"""
+    job_id: str
+    metadata: Dict = field(default_factory=dict)
+    status: str = 'queued'      # queued, running, completed, failed, cancelled
+    stage: str = 'queued'       # free-form step within a running job
+    completed: int = 0
+    total: int = 0
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict] = None
+    error: Optional[str] = None
+    timed_out: bool = False
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+    partial: Optional[Callable[[], Dict]] = field(default=None, repr=False)
+    partial_version: Optional[Callable[[], int]] = field(default=None, repr=False)  # changes when `partial` would
+    _done: threading.Event = field(default_factory=threading.Event, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    
+    @property
+    def finished(self) -> bool:
+        return self.status in JobManager.TERMINAL
+    
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the job finishes or `timeout` passes; True if it finished"""
+        return self._done.wait(timeout)
+    
+    def advance(self, count: int, total: Optional[int] = None):
+        """Record `count` more completed units of work (thread-safe)"""
+        with self._lock:
+            self.completed += count
+            if total is not None:
+                self.total = total
+    
+    def to_dict(self) -> Dict:
+        """Status view of the job, without its result"""
+        with self._lock:
+            completed, total = self.completed, self.total
+        end = self.finished_at or time.time()
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'stage': self.stage,
+            'completed': completed,
+            'total': total,
+            'progress': round(completed / total, 4) if total else 0.0,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'elapsed': round(end - self.started_at, 3) if self.started_at else 0.0,
+            'error': self.error,
+            **self.metadata
+        }
+
+class JobManager:
+    """
+    Runs simulations on a small background thread pool so HTTP workers
+    only submit and poll.
+    
+    At most `max_queued` jobs may wait for a thread; further submissions
+    raise JobQueueFull. Each job is cancelled once it has run for
+    `job_timeout` seconds, and finished jobs are forgotten after
+    `retention` seconds. Jobs live in the process that accepted them, so
+    status requests must reach the same process (one gunicorn worker with
+    threads, or sticky routing).
+    """
+    
+    TERMINAL = ('completed', 'failed', 'cancelled')
+    
+    def __init__(self, max_workers: int = 2, max_queued: int = 20, job_timeout: float = 3600,
+                 retention: float = 3600):
+        self.max_workers = max(1, max_workers)
+        self.max_queued = max_queued
+        self.job_timeout = job_timeout
+        self.retention = retention
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='simulation-job')
+        self.jobs: Dict[str, SimulationJob] = {}
+        self._lock = threading.Lock()
+    
+    def submit(self, fn: Callable[[SimulationJob], Dict], job_id: Optional[str] = None, **metadata) -> SimulationJob:
+        """
+        Queue `fn(job)` to run in the background.
+        
+        Args:
+            fn: Work function; it reports progress through the job and
+                should stop when `job.cancel_event` is set
+            job_id: Optional id for the job; a new one by default
+            **metadata: Extra fields included in the job's status
+        
+        Returns:
+            The queued job
+        
+        Raises:
+            JobQueueFull: If `max_queued` jobs are already waiting
+        """
+        self._prune()
+        job = SimulationJob(job_id=job_id or uuid.uuid4().hex, metadata=metadata)
+        with self._lock:
+            queued = sum(1 for existing in self.jobs.values() if existing.status == 'queued')
+            if queued >= self.max_queued:
+                raise JobQueueFull(f"{queued} jobs already queued")
+            self.jobs[job.job_id] = job
+        
+        JOBS.labels('queued').inc()
+        # The job runs in a copy of the caller's context, so it keeps the request's trace id
+        self.executor.submit(contextvars.copy_context().run, self._run, job, fn)
+        logger.info(f"Queued job {job.job_id}")
+        return job
+    
+    def get(self, job_id: str) -> SimulationJob:
+        """
+        Look up a job.
+        
+        Raises:
+            KeyError: If the job is unknown or has been pruned
+        """
+        with self._lock:
+            return self.jobs[job_id]
+    
+    def active(self, **metadata) -> List[SimulationJob]:
+        """Queued or running jobs whose metadata has the given values"""
+        with self._lock:
+            return [
+                job for job in self.jobs.values()
+                if not job.finished and all(job.metadata.get(key) == value for key, value in metadata.items())
+            ]
+    
+    def cancel(self, job_id: str) -> SimulationJob:
+        """
+        Ask a job to stop; queued jobs never start, running ones stop at
+        their next checkpoint.
+        
+        Raises:
+            KeyError: If the job is unknown or has been pruned
+        """
+        job = self.get(job_id)
+        if not job.finished:
+            job.cancel_event.set()
+            logger.info(f"Cancellation requested for job {job_id}")
+        return job
+    
+    def _run(self, job: SimulationJob, fn: Callable[[SimulationJob], Dict]):
+        """Execute a job on a pool thread and record its outcome"""
+        JOBS.labels('queued').dec()
+        if job.cancel_event.is_set():
+            self._finish(job, 'cancelled')
+            return
+        
+        job.status = job.stage = 'running'
+        job.started_at = time.time()
+        timer = threading.Timer(self.job_timeout, self._time_out, args=(job,))
+        timer.daemon = True
+        timer.start()
+        
+        JOBS.labels('running').inc()
+        try:
+            job.result = fn(job)
+            self._finish(job, 'completed')
+        except Exception as e:
+            if job.timed_out:
+                self._finish(job, 'failed', f"Job exceeded its {self.job_timeout:g}s time limit")
+            elif job.cancel_event.is_set():
+                self._finish(job, 'cancelled')
+            else:
+                logger.error(f"Job {job.job_id} failed: {str(e)}")
+                self._finish(job, 'failed', str(e))
+        finally:
+            timer.cancel()
+            JOBS.labels('running').dec()
+    
+    def _time_out(self, job: SimulationJob):
+        job.timed_out = True
+        job.cancel_event.set()
+    
+    def _finish(self, job: SimulationJob, status: str, error: Optional[str] = None):
+        job.status = job.stage = status
+        job.error = error
+        job.finished_at = time.time()
+        job._done.set()
+        logger.info(f"Job {job.job_id} {status}")
+    
+    def _prune(self):
+        """Forget finished jobs older than the retention period"""
+        cutoff = time.time() - self.retention
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self.jobs.items()
+                if job.finished and job.finished_at < cutoff
+            ]
+            for job_id in expired:
+                del self.jobs[job_id]
+    
+    def stats(self) -> Dict:
+        """Job counts by status"""
+        with self._lock:
+            statuses: List[str] = [job.status for job in self.jobs.values()]
+        return {
+            'workers': self.max_workers,
+            'max_queued': self.max_queued,
+            **{status: statuses.count(status) for status in ('queued', 'running', *self.TERMINAL)}
+        }
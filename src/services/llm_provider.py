@@ -0,0 +1,289 @@
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import google.generativeai as genai
+
+from src.services.persona_encoding import decode_persona
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class LLMUsage:
+    """Token usage of one request, named like Gemini's usage metadata"""
+    total_token_count: int
+
+@dataclass
+class PromptPrefix:
+    """
+    Decision-level start of a prompt, compiled once and shared by every
+    prompt of a simulation; `key` identifies it for context caching.
+    """
+    key: str
+    text: str
+    tokens: int
+
+@dataclass
+class LLMResponse:
+    """Text of a completion, plus token usage when the backend reports it"""
+    text: str
+    usage_metadata: Optional[Any] = None
+
+class LLMProvider(ABC):
+    """
+    Text generation backend used by DecisionAnalyzer and BehaviorEngine.
+    
+    Subclasses implement `generate` and `generate_async`; both take the
+    prompt and sampling settings and return an LLMResponse. When `prefix`
+    is given, `prompt` is only the part after it: backends with context
+    caching can reuse a cached prefix, others send `full_prompt()`. When
+    `response_schema` is given, backends with a JSON mode constrain the
+    output to it; callers validate the text either way.
+    Errors should carry an HTTP-style `code` attribute so the rate limiter
+    can tell throttling (429) and transient failures (5xx) apart.
+    """
+    
+    name = 'base'
+    
+    @staticmethod
+    def full_prompt(prompt: str, prefix: Optional[PromptPrefix] = None) -> str:
+        return prompt if prefix is None else prefix.text + prompt
+    
+    @abstractmethod
+    def generate(self, prompt: str, temperature: float = 0.4, max_output_tokens: int = 2000,
+                 prefix: Optional[PromptPrefix] = None, response_schema: Optional[Dict] = None) -> LLMResponse:
+        """Completion of `prompt` (after `prefix`, when given)"""
+    
+    @abstractmethod
+    async def generate_async(self, prompt: str, temperature: float = 0.4, max_output_tokens: int = 2000,
+                             prefix: Optional[PromptPrefix] = None,
+                             response_schema: Optional[Dict] = None) -> LLMResponse:
+        """Async version of `generate`"""
+
+class GeminiProvider(LLMProvider):
+    """
+    Google Gemini through the google-generativeai SDK.
+    
+    The pinned SDK (0.3.2) has no context caching, so prefixes are sent
+    in full with every request; SDKs with `caching.CachedContent` could
+    create one cache per PromptPrefix.key instead. JSON mode is used when
+    the SDK's GenerationConfig has `response_schema`; 0.3.2 has not, so
+    it relies on the prompts asking for bare JSON.
+    """
+    
+    name = 'gemini'
+    
+    def __init__(self, api_key: str, model_name: str = 'gemini-pro'):
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+        self.json_mode = 'response_schema' in getattr(genai.types.GenerationConfig, '__annotations__', {})
+    
+    def _config(self, temperature: float, max_output_tokens: int, response_schema: Optional[Dict] = None):
+        settings = {'temperature': temperature, 'max_output_tokens': max_output_tokens}
+        if response_schema is not None and self.json_mode:
+            settings.update(response_mime_type='application/json', response_schema=response_schema)
+        return genai.types.GenerationConfig(**settings)
+    
+    def generate(self, prompt: str, temperature: float = 0.4, max_output_tokens: int = 2000,
+                 prefix: Optional[PromptPrefix] = None, response_schema: Optional[Dict] = None) -> LLMResponse:
+        response = self.model.generate_content(
+            self.full_prompt(prompt, prefix),
+            generation_config=self._config(temperature, max_output_tokens, response_schema)
+        )
+        return LLMResponse(response.text, getattr(response, 'usage_metadata', None))
+    
+    async def generate_async(self, prompt: str, temperature: float = 0.4, max_output_tokens: int = 2000,
+                             prefix: Optional[PromptPrefix] = None,
+                             response_schema: Optional[Dict] = None) -> LLMResponse:
+        response = await self.model.generate_content_async(
+            self.full_prompt(prompt, prefix),
+            generation_config=self._config(temperature, max_output_tokens, response_schema)
+        )
+        return LLMResponse(response.text, getattr(response, 'usage_metadata', None))
+
+class StubProviderError(Exception):
+    """Injected failure from StubProvider; `code` is 429 or 503"""
+    
+    def __init__(self, message: str, code: int):
+        super().__init__(message)
+        self.code = code
+
+class StubProvider(LLMProvider):
+    """
+    Offline backend for benchmarks and load tests; no network, no spend.
+    
+    Recognizes the decision analysis, single reaction and batched reaction
+    prompts and answers each with schema-valid JSON. Reactions depend on
+    the person's traits plus a hash of their profile and the decision, so
+    the same person always reacts the same way. Latency is drawn from a
+    fixed, exponential or lognormal distribution around `latency` seconds,
+    `error_rate` / `rate_limit_rate` inject 503 and 429 failures, and
+    `malformed_rate` wraps answers in markdown or truncates them, the way
+    a model without JSON mode sometimes does.
+    """
+    
+    name = 'stub'
+    LATENCY_DISTRIBUTIONS = ('fixed', 'exponential', 'lognormal')
+    
+    def __init__(self, latency: float = 0.05, latency_distribution: str = 'lognormal', error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, malformed_rate: float = 0.0, seed: Optional[int] = None):
+        if latency_distribution not in self.LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {latency_distribution}")
+        self.latency = max(0.0, latency)
+        self.latency_distribution = latency_distribution
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.malformed_rate = malformed_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+    
+    def _draw(self) -> Tuple[float, Optional[str]]:
+        """
+        Latency and injected malformation ('fenced', 'truncated' or None)
+        for one call, raising an injected failure if one is drawn
+        """
+        with self._lock:
+            failure = self._random.random()
+            malformed = self._random.random()
+            malformation = self._random.choice(('fenced', 'truncated'))
+            if self.latency_distribution == 'fixed':
+                delay = self.latency
+            elif self.latency_distribution == 'exponential':
+                delay = self._random.expovariate(1 / self.latency) if self.latency else 0.0
+            else:
+                # sigma 0.5, scaled so the mean stays at `latency`
+                delay = self.latency * self._random.lognormvariate(-0.125, 0.5)
+        
+        if failure < self.rate_limit_rate:
+            raise StubProviderError("429 Resource has been exhausted (e.g. check quota)", 429)
+        if failure < self.rate_limit_rate + self.error_rate:
+            raise StubProviderError("503 The service is currently unavailable", 503)
+        return delay, malformation if malformed < self.malformed_rate else None
+    
+    def generate(self, prompt: str, temperature: float = 0.4, max_output_tokens: int = 2000,
+                 prefix: Optional[PromptPrefix] = None, response_schema: Optional[Dict] = None) -> LLMResponse:
+        delay, malformation = self._draw()
+        time.sleep(delay)
+        return self._malform(self._respond(self.full_prompt(prompt, prefix)), malformation)
+    
+    async def generate_async(self, prompt: str, temperature: float = 0.4, max_output_tokens: int = 2000,
+                             prefix: Optional[PromptPrefix] = None,
+                             response_schema: Optional[Dict] = None) -> LLMResponse:
+        delay, malformation = self._draw()
+        await asyncio.sleep(delay)
+        return self._malform(self._respond(self.full_prompt(prompt, prefix)), malformation)
+    
+    @staticmethod
+    def _malform(response: LLMResponse, malformation: Optional[str]) -> LLMResponse:
+        if malformation == 'fenced':
+            response.text = f"Here is the prediction:\n```json\n{response.text}\n```"
+        elif malformation == 'truncated':
+            response.text = response.text[:len(response.text) * 2 // 3]
+        return response
+    
+    def _respond(self, prompt: str) -> LLMResponse:
+        decision = prompt.split('BUSINESS DECISION TO REACT TO:', 1)[-1].split('\nPEOPLE:\n')[0].split('\nPERSON:\n')[0]
+        if '\nPEOPLE:\n' in prompt:
+            rows = prompt.split('\nPEOPLE:\n', 1)[1].splitlines()
+            people = [decode_persona(row, numbered=True) for row in rows if row.strip()]
+            text = json.dumps([{'person': person.pop('n'), **self._reaction(person, decision)} for person in people])
+        elif '\nPERSON:\n' in prompt:
+            person = decode_persona(prompt.split('\nPERSON:\n', 1)[1].splitlines()[0])
+            text = json.dumps(self._reaction(person, decision))
+        else:
+            text = json.dumps(self._analysis(prompt))
+        
+        return LLMResponse(text, LLMUsage(total_token_count=(len(prompt) + len(text)) // 4))
+    
+    @staticmethod
+    def _unit_values(*parts: str, count: int = 2) -> List[float]:
+        """Deterministic pseudo-random numbers in [0, 1) derived from the given text"""
+        digest = hashlib.md5('\x1f'.join(parts).encode()).hexdigest()
+        return [int(digest[8 * index:8 * index + 8], 16) / 2 ** 32 for index in range(count)]
+    
+    def _reaction(self, person: Dict, decision: str) -> Dict:
+        """Trait-driven reaction with a stable per-person, per-decision jitter"""
+        profile = json.dumps(person, sort_keys=True)
+        noise, likelihood = self._unit_values(profile, decision)
+        
+        score = (noise - 0.5) * 0.8
+        score += {'low': 0.25, 'high': -0.25}.get(person.get('price_sensitivity'), 0.0)
+        score += {'early': 0.2, 'late': -0.2}.get(person.get('innovation_adoption'), 0.0)
+        score += {'high': 0.1, 'low': -0.1}.get(person.get('tech_savviness'), 0.0)
+        if 'Risk level assessed as: high' in decision:
+            score -= 0.1
+        
+        reaction_type = 'positive' if score > 0.15 else 'negative' if score < -0.15 else 'neutral'
+        return {
+            'reaction_type': reaction_type,
+            'reaction_strength': round(min(1.0, 0.2 + abs(score)), 3),
+            'reasoning': f"Stub reaction driven by {person.get('price_sensitivity', 'unknown')} price sensitivity "
+                         f"and {person.get('innovation_adoption', 'unknown')} innovation adoption.",
+            'behavioral_change': {'action': {'positive': 'adopt', 'negative': 'churn'}.get(reaction_type, 'wait')},
+            'likelihood_to_act': round(0.2 + 0.7 * likelihood, 3)
+        }
+    
+    def _analysis(self, prompt: str) -> Dict:
+        """Decision analysis whose type and risk follow keywords in the decision text"""
+        decision = prompt.split('DECISION:', 1)[-1].split('\n\n', 1)[0].strip()
+        lowered = decision.lower()
+        keywords = {
+            'pricing': ('price', 'pricing', 'discount', 'fee'),
+            'product': ('feature', 'product', 'launch'),
+            'marketing': ('marketing', 'advertis', 'campaign'),
+            'ux': ('onboarding', 'design', 'ux', 'account creation'),
+            'business_model': ('subscription', 'business model', 'freemium')
+        }
+        decision_type = next(
+            (name for name, words in keywords.items() if any(word in lowered for word in words)), 'strategy'
+        )
+        confidence, = self._unit_values(decision, count=1)
+        
+        return {
+            'decision_type': decision_type,
+            'key_factors': [f"{decision_type} change", 'customer expectations'],
+            'target_demographics': ['price-sensitive customers', 'early adopters'],
+            'psychological_triggers': ['loss aversion', 'status quo bias'],
+            'potential_reactions': {
+                'positive': 'Some customers welcome the change',
+                'negative': 'Some customers resist the change',
+                'neutral': 'Many customers are indifferent'
+            },
+            'decision_parameters': {'summary': decision[:100]},
+            'risk_level': 'high' if decision_type in ('pricing', 'business_model') else 'medium',
+            'confidence_score': round(0.5 + 0.4 * confidence, 3),
+            'reasoning': 'Stub analysis based on keywords in the decision text.'
+        }
+
+def create_provider(provider: str, api_key: Optional[str] = None, stub_latency: float = 0.05,
+                    stub_latency_distribution: str = 'lognormal', stub_error_rate: float = 0.0,
+                    stub_rate_limit_rate: float = 0.0, stub_malformed_rate: float = 0.0) -> LLMProvider:
+    """
+    Build the LLM backend named by the LLM_PROVIDER setting.
+    
+    Args:
+        provider: 'gemini', or 'stub' for the offline backend
+        api_key: Gemini API key
+        stub_latency: Mean stub latency in seconds
+        stub_latency_distribution: 'fixed', 'exponential' or 'lognormal'
+        stub_error_rate: Share of stub calls failing with 503
+        stub_rate_limit_rate: Share of stub calls failing with 429
+        stub_malformed_rate: Share of stub answers fenced in markdown or truncated
+    
+    Returns:
+        The provider
+    """
+    if provider == 'gemini':
+        return GeminiProvider(api_key)
+    if provider == 'stub':
+        logger.warning("Using the offline stub LLM provider; results are synthetic")
+        return StubProvider(stub_latency, stub_latency_distribution, stub_error_rate, stub_rate_limit_rate,
+                            stub_malformed_rate)
+    raise ValueError(f"Unknown LLM provider: {provider}")
@@ -0,0 +1,68 @@
+from typing import Dict, List, Optional
+
+from src.models.population import PERSONALITY_TRAITS
+
+# Column order of an encoded persona row; ids never reach the prompt
+PERSONA_FIELDS = (
+    'age', 'income', 'location', 'occupation', 'education', 'tech_savviness',
+    'price_sensitivity', 'innovation_adoption', 'lifestyle', 'values', 'personality_traits'
+)
+FIELD_SEPARATOR = '|'
+LIST_SEPARATOR = ','
+
+def persona_header(numbered: bool = False) -> str:
+    """Row layout described to the model, e.g. 'n|age|income|...|personality (openness,...)'"""
+    fields = [
+        f"personality_traits ({LIST_SEPARATOR.join(PERSONALITY_TRAITS)})" if field == 'personality_traits'
+        else "values (comma-separated)" if field == 'values'
+        else field
+        for field in PERSONA_FIELDS
+    ]
+    return FIELD_SEPARATOR.join((['n'] if numbered else []) + fields)
+
+def encode_persona(person: Dict, number: Optional[int] = None) -> str:
+    """
+    One compact row for a person profile: no id, no keys, no whitespace
+    beyond what labels contain. A profile is roughly a quarter of its
+    indented JSON size.
+    """
+    traits = person.get('personality_traits', {})
+    cells = [] if number is None else [str(number)]
+    for field in PERSONA_FIELDS:
+        if field == 'values':
+            cells.append(LIST_SEPARATOR.join(person.get('values', [])))
+        elif field == 'personality_traits':
+            cells.append(LIST_SEPARATOR.join(f"{traits.get(trait, 0.5):g}" for trait in PERSONALITY_TRAITS))
+        else:
+            cells.append(str(person.get(field, '')))
+    return FIELD_SEPARATOR.join(cells)
+
+def decode_persona(row: str, numbered: bool = False) -> Dict:
+    """
+    Profile dictionary from an encoded row (the inverse of encode_persona).
+    
+    Raises:
+        ValueError: If the row does not have the expected number of fields
+    """
+    cells = row.strip().split(FIELD_SEPARATOR)
+    expected = len(PERSONA_FIELDS) + (1 if numbered else 0)
+    if len(cells) != expected:
+        raise ValueError(f"Expected {expected} persona fields, got {len(cells)}")
+    
+    person: Dict = {}
+    if numbered:
+        person['n'] = int(cells.pop(0))
+    for field, cell in zip(PERSONA_FIELDS, cells):
+        if field in ('age', 'income'):
+            person[field] = int(cell)
+        elif field == 'values':
+            person[field] = [value for value in cell.split(LIST_SEPARATOR) if value]
+        elif field == 'personality_traits':
+            person[field] = dict(zip(PERSONALITY_TRAITS, (float(value) for value in cell.split(LIST_SEPARATOR))))
+        else:
+            person[field] = cell
+    return person
+
+def encode_personas(people: List[Dict]) -> str:
+    """Numbered rows (1-based) for a batched prompt, one person per line"""
+    return '\n'.join(encode_persona(person, number) for number, person in enumerate(people, start=1))
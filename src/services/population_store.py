@@ -0,0 +1,161 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from src.models.population import PopulationFrame
+
+logger = logging.getLogger(__name__)
+
+class PopulationStore:
+    """
+    Server-side storage for generated populations.
+    
+    Each population is a directory holding one `.npy` file per PopulationFrame
+    column plus a `meta.json`. Columns are loaded memory-mapped, so any
+    worker on the box can serve a stored population without reading it into
+    memory, and clients only ever exchange a `population_id`.
+    
+    Beyond `max_populations`, the least recently used populations are
+    evicted, except those `pinned` returns (ids still needed by running
+    jobs or resumable checkpoints).
+    """
+    
+    META_FILE = 'meta.json'
+    
+    def __init__(self, root_dir: str, max_populations: int = 100,
+                 pinned: Optional[Callable[[], Iterable[str]]] = None):
+        self.root_dir = root_dir
+        self.max_populations = max_populations
+        self.pinned = pinned
+        os.makedirs(root_dir, exist_ok=True)
+    
+    def _path(self, population_id: str) -> str:
+        """Directory of a stored population"""
+        # Ids are hex strings; reject anything that could escape the root
+        if not population_id or not all(c in '0123456789abcdef' for c in population_id):
+            raise KeyError(population_id)
+        return os.path.join(self.root_dir, population_id)
+    
+    def exists(self, population_id: str) -> bool:
+        """Whether a population is stored under this id"""
+        try:
+            return os.path.exists(os.path.join(self._path(population_id), self.META_FILE))
+        except KeyError:
+            return False
+    
+    def save(self, population: PopulationFrame, population_id: Optional[str] = None,
+             metadata: Optional[Dict] = None) -> str:
+        """
+        Persist a population and return its id.
+        
+        Args:
+            population: Population to store
+            population_id: Optional id, e.g. a `population_key` for seeded
+                populations so identical requests share one copy
+            metadata: Optional extra fields kept in meta.json (parameters, seed)
+        
+        Returns:
+            The population id
+        """
+        population_id = population_id or uuid.uuid4().hex
+        target = self._path(population_id)
+        
+        if self.exists(population_id):
+            self._touch(population_id)
+            return population_id
+        
+        # Write to a temporary directory and rename, so readers never see a
+        # partially written population
+        staging = tempfile.mkdtemp(dir=self.root_dir, prefix='.tmp-')
+        try:
+            for column in PopulationFrame.COLUMNS:
+                np.save(os.path.join(staging, f"{column}.npy"), getattr(population, column))
+            
+            meta = {
+                'population_id': population_id,
+                'size': len(population),
+                'created_at': time.time(),
+                **(metadata or {})
+            }
+            with open(os.path.join(staging, self.META_FILE), 'w') as f:
+                json.dump(meta, f)
+            
+            os.rename(staging, target)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+            # Another worker stored the same id first
+            if self.exists(population_id):
+                return population_id
+            raise
+        
+        logger.info(f"Stored population {population_id} ({len(population)} people)")
+        self._evict()
+        return population_id
+    
+    def load(self, population_id: str) -> PopulationFrame:
+        """
+        Load a stored population with memory-mapped columns.
+        
+        Raises:
+            KeyError: If no population is stored under this id
+        """
+        if not self.exists(population_id):
+            raise KeyError(population_id)
+        
+        path = self._path(population_id)
+        self._touch(population_id)
+        return PopulationFrame(**{
+            column: np.load(os.path.join(path, f"{column}.npy"), mmap_mode='r')
+            for column in PopulationFrame.COLUMNS
+        })
+    
+    def metadata(self, population_id: str) -> Dict:
+        """
+        Metadata recorded when the population was stored.
+        
+        Raises:
+            KeyError: If no population is stored under this id
+        """
+        if not self.exists(population_id):
+            raise KeyError(population_id)
+        
+        with open(os.path.join(self._path(population_id), self.META_FILE)) as f:
+            return json.load(f)
+    
+    def _touch(self, population_id: str):
+        """Mark a population as used; eviction goes by the directory's mtime"""
+        try:
+            os.utime(self._path(population_id))
+        except OSError:
+            pass  # evicted meanwhile, or a read-only store
+    
+    def _stored_ids(self) -> List[str]:
+        """Stored population ids, least recently used first"""
+        ids = [name for name in os.listdir(self.root_dir) if self.exists(name)]
+        return sorted(ids, key=lambda name: os.path.getmtime(os.path.join(self.root_dir, name)))
+    
+    def _evict(self):
+        """Remove the least recently used populations beyond max_populations, skipping pinned ones"""
+        stored = self._stored_ids()
+        excess = len(stored) - self.max_populations
+        if excess <= 0:
+            return
+        
+        pinned = set()
+        if self.pinned is not None:
+            try:
+                pinned = set(self.pinned())
+            except Exception as e:
+                # Better to keep too many populations than to drop one still in use
+                logger.error(f"Could not list pinned populations, skipping eviction: {str(e)}")
+                return
+        for population_id in [population_id for population_id in stored if population_id not in pinned][:excess]:
+            shutil.rmtree(self._path(population_id), ignore_errors=True)
+            logger.info(f"Evicted stored population {population_id}")
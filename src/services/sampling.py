@@ -0,0 +1,226 @@
+import threading
+from dataclasses import asdict, dataclass
+from statistics import NormalDist
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from src.models.population import PopulationFrame
+from src.services.aggregation import REACTION_CODES, REACTION_TYPES, breakdown_dimensions
+
+@dataclass
+class SamplingPlan:
+    """
+    Settings for sequential sampling: simulate people in random order and
+    stop once every confidence interval is narrow enough.
+    
+    `precision` is the target half-width for the positive/negative/neutral
+    shares (0.03 = ±3 points); net sentiment, which spans -1..1, gets
+    `sentiment_precision` (twice `precision` by default). `stratify_by`
+    names breakdown dimensions (e.g. 'age_band', 'region') whose groups are
+    sampled in proportion to their size.
+    """
+    precision: float = 0.03
+    sentiment_precision: Optional[float] = None
+    confidence: float = 0.95
+    min_samples: int = 200
+    max_samples: Optional[int] = None
+    stratify_by: Tuple[str, ...] = ()
+    seed: int = 0
+    
+    def __post_init__(self):
+        if self.sentiment_precision is None:
+            self.sentiment_precision = 2 * self.precision
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'SamplingPlan':
+        """
+        Build a plan from request parameters.
+        
+        Raises:
+            ValueError: On out-of-range settings or unknown strata
+        """
+        plan = cls()
+        for key in ('precision', 'sentiment_precision', 'confidence'):
+            if data.get(key) is not None:
+                setattr(plan, key, float(data[key]))
+        for key in ('min_samples', 'max_samples', 'seed'):
+            if data.get(key) is not None:
+                setattr(plan, key, int(data[key]))
+        if 'precision' in data and data.get('sentiment_precision') is None:
+            plan.sentiment_precision = 2 * plan.precision
+        
+        stratify_by = data.get('stratify_by') or ()
+        plan.stratify_by = (stratify_by,) if isinstance(stratify_by, str) else tuple(stratify_by)
+        
+        if not 0 < plan.precision < 1 or not 0 < plan.sentiment_precision < 2:
+            raise ValueError("Precision must be between 0 and 1")
+        if not 0.5 <= plan.confidence < 1:
+            raise ValueError("Confidence must be between 0.5 and 1")
+        if plan.min_samples < 1:
+            raise ValueError("min_samples must be at least 1")
+        if plan.max_samples is not None and plan.max_samples < 1:
+            raise ValueError("max_samples must be at least 1")
+        return plan
+    
+    def strata(self, population: PopulationFrame) -> Tuple[np.ndarray, int]:
+        """
+        Stratum code per person and the number of strata.
+        
+        Raises:
+            ValueError: If a stratify_by name is not a breakdown dimension
+        """
+        dimensions = {name: (codes, labels) for name, codes, labels in breakdown_dimensions(population)}
+        unknown = set(self.stratify_by) - set(dimensions)
+        if unknown:
+            raise ValueError(f"Unknown strata: {sorted(unknown)}")
+        
+        strata = np.zeros(len(population), dtype=np.int64)
+        count = 1
+        for name in self.stratify_by:
+            codes, labels = dimensions[name]
+            strata = strata * len(labels) + codes
+            count *= len(labels)
+        return strata, count
+    
+    def order(self, strata: np.ndarray) -> np.ndarray:
+        """
+        Random simulation order in which every prefix is close to
+        proportionally stratified.
+        
+        Each person's key is their random rank within their stratum divided
+        by the stratum size (plus jitter), so the k-th member of a stratum
+        of size N_h lands near position k * N / N_h.
+        """
+        rng = np.random.default_rng(self.seed)
+        size = len(strata)
+        shuffled = rng.permutation(size)
+        
+        # Random rank of each person within their stratum
+        by_stratum = shuffled[np.argsort(strata[shuffled], kind='stable')]
+        sizes = np.bincount(strata)
+        starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        rank = np.empty(size, dtype=np.float64)
+        rank[by_stratum] = np.arange(size) - starts[strata[by_stratum]]
+        
+        keys = (rank + rng.random(size)) / sizes[strata]
+        return np.argsort(keys, kind='stable')
+
+class SequentialEstimator:
+    """
+    Running stratified estimates of the reaction shares and net sentiment
+    with normal-approximation confidence intervals.
+    
+    Updated in O(1) per reaction from per-stratum sums; intervals use the
+    stratified variance with a finite population correction. Strata with
+    fewer than two sampled people contribute their worst-case variance,
+    so small strata never make the intervals look narrower than they are.
+    """
+    
+    def __init__(self, plan: SamplingPlan, strata_sizes: np.ndarray):
+        self.plan = plan
+        self.sizes = strata_sizes.astype(np.float64)
+        self.population = float(self.sizes.sum())
+        self.z = NormalDist().inv_cdf(0.5 + plan.confidence / 2)
+        
+        strata = len(strata_sizes)
+        self.n = np.zeros(strata)
+        self.type_counts = np.zeros((strata, len(REACTION_TYPES)))
+        self.sentiment_sum = np.zeros(strata)
+        self.sentiment_squares = np.zeros(strata)
+        self._lock = threading.Lock()
+    
+    @property
+    def samples(self) -> int:
+        return int(self.n.sum())
+    
+    def add(self, stratum: int, reaction: Dict):
+        """Fold one simulated person's reaction into their stratum's sums"""
+        code = REACTION_CODES[reaction['reaction_type']]
+        sentiment = {'positive': 1.0, 'negative': -1.0}.get(reaction['reaction_type'], 0.0) * reaction['reaction_strength']
+        with self._lock:
+            self.n[stratum] += 1
+            self.type_counts[stratum, code] += 1
+            self.sentiment_sum[stratum] += sentiment
+            self.sentiment_squares[stratum] += sentiment * sentiment
+    
+    def intervals(self) -> Dict[str, Dict]:
+        """Estimate and confidence interval for each share and for net sentiment"""
+        with self._lock:
+            n = self.n.copy()
+            type_counts = self.type_counts.copy()
+            sentiment_sum = self.sentiment_sum.copy()
+            sentiment_squares = self.sentiment_squares.copy()
+        
+        total = n.sum()
+        weights = self.sizes / self.population
+        sampled = n > 0
+        exhausted = n >= self.sizes
+        estimable = n >= 2
+        safe_n = np.maximum(n, 1)
+        # Finite population correction; unsampled strata fall back to the pooled mean
+        fpc = np.where(exhausted, 0.0, 1 - n / np.maximum(self.sizes, 1))
+        
+        def interval(means: np.ndarray, variances: np.ndarray, pooled: float, worst_case: float,
+                     low: float, high: float) -> Dict:
+            means = np.where(sampled, means, pooled)
+            variances = np.where(estimable, variances, worst_case)
+            estimate = float((weights * means).sum())
+            # Variances are sample variances already, so the mean's variance divides by n
+            half_width = self.z * float(np.sqrt((weights ** 2 * fpc * variances / safe_n).sum()))
+            return {
+                'estimate': round(estimate, 4),
+                # Clipped to the quantity's range; the half-width is the unclipped one
+                'lower': round(max(estimate - half_width, low), 4),
+                'upper': round(min(estimate + half_width, high), 4),
+                'half_width': round(half_width, 4)
+            }
+        
+        results = {}
+        for code, reaction_type in enumerate(REACTION_TYPES):
+            shares = type_counts[:, code] / safe_n
+            pooled = type_counts[:, code].sum() / total if total else 0.0
+            variances = shares * (1 - shares) * n / np.maximum(n - 1, 1)
+            results[reaction_type] = interval(shares, variances, pooled, 0.25, 0.0, 1.0)
+        
+        means = sentiment_sum / safe_n
+        pooled = sentiment_sum.sum() / total if total else 0.0
+        variances = np.maximum(sentiment_squares - n * means ** 2, 0) / np.maximum(n - 1, 1)
+        results['net_sentiment_score'] = interval(means, variances, pooled, 1.0, -1.0, 1.0)
+        return results
+    
+    def precision_reached(self) -> bool:
+        """Whether every interval is as narrow as the plan's precision asks"""
+        intervals = self.intervals()
+        return (
+            all(intervals[reaction_type]['half_width'] <= self.plan.precision for reaction_type in REACTION_TYPES)
+            and intervals['net_sentiment_score']['half_width'] <= self.plan.sentiment_precision
+        )
+    
+    def budget_exhausted(self) -> bool:
+        """Whether max_samples people have been simulated"""
+        return self.plan.max_samples is not None and self.samples >= self.plan.max_samples
+    
+    def converged(self) -> bool:
+        """Whether sampling should stop: precision reached (after min_samples) or max_samples hit"""
+        if self.budget_exhausted():
+            return True
+        return self.samples >= self.plan.min_samples and self.precision_reached()
+    
+    def report(self, stopped: bool) -> Dict:
+        """
+        Sampling summary attached to simulation results. `stopped_early` is
+        only claimed when the run stopped with the plan's precision reached;
+        a run cut off by max_samples reports `budget_exhausted` instead.
+        """
+        precision_reached = self.precision_reached()
+        return {
+            'mode': 'sequential',
+            'simulated': self.samples,
+            'population': int(self.population),
+            'stopped_early': stopped and precision_reached,
+            'precision_reached': precision_reached,
+            'budget_exhausted': self.budget_exhausted(),
+            'intervals': self.intervals(),
+            'plan': asdict(self.plan)
+        }
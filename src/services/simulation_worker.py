@@ -0,0 +1,131 @@
+import logging
+import os
+import socket
+import threading
+import uuid
+from typing import Dict, List, Optional
+
+from src.services.behavior_engine import BehaviorEngine
+from src.services.work_queue import QueueTask, RedisSemaphore, RedisWorkQueue
+from src.utils.metrics import QUEUE_TASKS
+from src.utils.tracing import end_trace, span, start_trace
+
+logger = logging.getLogger(__name__)
+
+class SimulationWorker:
+    """
+    Processes distributed simulation tasks from a RedisWorkQueue.
+    
+    `concurrency` threads each take a slot of the global budget (when one
+    is given), reserve a task, simulate its people with the engine and
+    complete it. A heartbeat thread keeps the worker listed as alive and
+    extends the visibility deadline and budget slot of every task in
+    progress, so only tasks of a worker that died are redelivered. A task
+    delivered more than the queue's `max_attempts` times gets fallback
+    reactions instead of another attempt.
+    """
+    
+    def __init__(self, queue: RedisWorkQueue, engine: BehaviorEngine, concurrency: int = 5,
+                 budget: Optional[RedisSemaphore] = None, poll_interval: float = 0.5):
+        self.queue = queue
+        self.engine = engine
+        self.concurrency = max(1, concurrency)
+        self.budget = budget
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.stop_event = threading.Event()
+        self._stopped = threading.Event()
+        self._active: Dict[str, QueueTask] = {}  # Task in progress per thread (holder) name
+        self._lock = threading.Lock()
+    
+    def run(self):
+        """Process tasks until `stop` is called; tasks in progress are finished first"""
+        logger.info(f"Simulation worker {self.worker_id} started with {self.concurrency} threads")
+        threads = [
+            threading.Thread(target=self._work, args=(f"{self.worker_id}:{index}",), name=f"queue-worker-{index}")
+            for index in range(self.concurrency)
+        ]
+        heartbeat = threading.Thread(target=self._heartbeat, name='queue-heartbeat', daemon=True)
+        heartbeat.start()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self._stopped.set()
+        self.queue.leave(self.worker_id)
+        logger.info(f"Simulation worker {self.worker_id} stopped")
+    
+    def stop(self):
+        self.stop_event.set()
+    
+    def _work(self, holder: str):
+        while not self.stop_event.is_set():
+            try:
+                if self.budget is not None and not self.budget.acquire(holder):
+                    self.stop_event.wait(self.poll_interval)
+                    continue
+                try:
+                    task = self.queue.reserve()
+                    if task is not None:
+                        self._process(holder, task)
+                finally:
+                    if self.budget is not None:
+                        self.budget.release(holder)
+                # Idle threads wait without holding a slot of the budget
+                if task is None:
+                    self.stop_event.wait(self.poll_interval)
+            except Exception as e:
+                # Redis unreachable or similar; reserved tasks come back after the visibility timeout
+                logger.error(f"Queue worker {holder} error: {str(e)}")
+                self.stop_event.wait(self.poll_interval)
+    
+    def _process(self, holder: str, task: QueueTask):
+        context = self.queue.run_context(task.run_id)
+        if context is None:
+            # The run finished or was withdrawn
+            self.queue.discard(task)
+            return
+        
+        with self._lock:
+            self._active[holder] = task
+        tokens = start_trace(context.get('trace_id'))
+        try:
+            with span('queue_task', run_id=task.run_id, offset=task.offset, people=len(task.people),
+                      attempt=task.attempts):
+                reactions = self._simulate(task, context)
+            self.queue.complete(task, reactions)
+        except Exception:
+            self.queue.release(task)
+            raise
+        finally:
+            end_trace(tokens)
+            with self._lock:
+                self._active.pop(holder, None)
+    
+    def _simulate(self, task: QueueTask, context: Dict) -> List[Dict]:
+        if task.attempts > self.queue.max_attempts:
+            logger.warning(f"Task {task.task_id} was delivered {task.attempts} times; using fallback reactions")
+            QUEUE_TASKS.labels('exhausted').inc()
+            self.engine.parse_stats.record('reactions', 'fallback', len(task.people))
+            return [self.engine._get_fallback_person_reaction(person['id']) for person in task.people]
+        
+        decision_analysis = context['decision_analysis']
+        if context.get('unit_size', len(task.people)) > 1:
+            return self.engine.simulate_batch_reactions(task.people, decision_analysis)
+        return [self.engine.simulate_person_reaction(person, decision_analysis) for person in task.people]
+    
+    def _heartbeat(self):
+        interval = max(1.0, self.queue.visibility_timeout / 3)
+        while True:
+            try:
+                self.queue.heartbeat(self.worker_id)
+                with self._lock:
+                    active = list(self._active.items())
+                for holder, task in active:
+                    self.queue.extend(task)
+                    if self.budget is not None:
+                        self.budget.refresh(holder)
+            except Exception as e:
+                logger.error(f"Queue heartbeat failed: {str(e)}")
+            if self._stopped.wait(interval):
+                return
@@ -0,0 +1,266 @@
+import json
+import re
+import threading
+import typing
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+from pydantic import BaseModel
+
+from src.utils.metrics import PARSE_OUTCOMES
+
+# Trailing commas before a closing bracket, the most common JSON slip in model output
+_TRAILING_COMMA = re.compile(r',\s*([}\]])')
+
+class ValidationFailure(ValueError):
+    """A response that does not satisfy its model, even after repair"""
+
+@dataclass
+class _Field:
+    name: str
+    kind: str  # 'string', 'number', 'list', 'dict' or 'any'
+    required: bool
+    default: Callable[[], Any]
+    item_kind: str = 'any'
+    enum: Optional[Sequence[str]] = None
+    bounds: Optional[Tuple[float, float]] = None
+
+def _kind(annotation) -> str:
+    origin = typing.get_origin(annotation) or annotation
+    if origin is str:
+        return 'string'
+    if origin in (int, float):
+        return 'number'
+    if origin in (list, tuple):
+        return 'list'
+    if origin is dict:
+        return 'dict'
+    return 'any'
+
+def _model_fields(model: typing.Type[BaseModel]) -> Dict[str, Tuple[Any, bool, Callable[[], Any]]]:
+    """{name: (annotation, required, default factory)} for a pydantic v2 or v1 model"""
+    hints = typing.get_type_hints(model)
+    if hasattr(model, 'model_fields'):
+        return {
+            name: (hints[name], field.is_required(), lambda field=field: field.get_default(call_default_factory=True))
+            for name, field in model.model_fields.items()
+        }
+    return {name: (hints[name], field.required, field.get_default) for name, field in model.__fields__.items()}
+
+class ModelValidator:
+    """
+    Strict, fast checker for decoded JSON against a pydantic model.
+    
+    The field table is built once from the model's annotations, so checking
+    a response is a handful of isinstance tests rather than a model
+    instantiation. Values that are recognizably right but badly typed are
+    repaired (numeric strings, percentages for 0..1 fields, enum case, a
+    bare string for a list) and the result is flagged as repaired; missing
+    required fields and unknown enum values raise ValidationFailure.
+    """
+    
+    SCHEMA_TYPES = {'string': 'STRING', 'number': 'NUMBER', 'list': 'ARRAY'}
+    
+    def __init__(self, model: typing.Type[BaseModel], enums: Optional[Dict[str, Sequence[str]]] = None,
+                 bounds: Optional[Dict[str, Tuple[float, float]]] = None, exclude: Iterable[str] = ()):
+        enums, bounds, exclude = enums or {}, bounds or {}, set(exclude)
+        self.model = model
+        self.fields = []
+        for name, (annotation, required, default) in _model_fields(model).items():
+            if name in exclude:
+                continue
+            args = typing.get_args(annotation)
+            self.fields.append(_Field(
+                name=name,
+                kind=_kind(annotation),
+                required=required,
+                default=default,
+                item_kind=_kind(args[-1]) if args else 'any',
+                enum=enums.get(name),
+                bounds=bounds.get(name)
+            ))
+    
+    def validate(self, data: Any) -> Tuple[Dict, bool]:
+        """
+        Check and clean one decoded object; keys the model does not know are dropped.
+        
+        Returns:
+            (clean object, whether anything had to be repaired)
+        
+        Raises:
+            ValidationFailure: If the object cannot be made to fit the model
+        """
+        if not isinstance(data, dict):
+            raise ValidationFailure(f"Expected a JSON object, got {type(data).__name__}")
+        
+        clean = {}
+        repaired = False
+        for field in self.fields:
+            value = data.get(field.name)
+            if value is None:
+                if field.required:
+                    raise ValidationFailure(f"Missing required field: {field.name}")
+                clean[field.name] = field.default()
+                continue
+            clean[field.name], changed = self._coerce(field, value)
+            repaired = repaired or changed
+        return clean, repaired
+    
+    def _coerce(self, field: _Field, value: Any) -> Tuple[Any, bool]:
+        if field.kind == 'number':
+            return self._coerce_number(field, value)
+        if field.kind == 'string':
+            return self._coerce_string(field, value)
+        if field.kind == 'list':
+            if isinstance(value, str):
+                return [value], True
+            if not isinstance(value, list):
+                raise ValidationFailure(f"{field.name} must be a list")
+            if field.item_kind == 'string' and not all(isinstance(item, str) for item in value):
+                return [item if isinstance(item, str) else json.dumps(item) for item in value], True
+            return value, False
+        if field.kind == 'dict':
+            if isinstance(value, str):
+                # The response schema asks for objects as JSON strings (see `schema`)
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    raise ValidationFailure(f"{field.name} must be an object, got {value[:20]!r}")
+            if not isinstance(value, dict):
+                raise ValidationFailure(f"{field.name} must be an object")
+            if field.item_kind == 'string' and not all(isinstance(item, str) for item in value.values()):
+                return {key: item if isinstance(item, str) else json.dumps(item) for key, item in value.items()}, True
+            return value, False
+        return value, False
+    
+    @staticmethod
+    def _coerce_number(field: _Field, value: Any) -> Tuple[float, bool]:
+        changed = percent = False
+        if isinstance(value, bool):
+            raise ValidationFailure(f"{field.name} must be a number")
+        if isinstance(value, (int, float)):
+            number = float(value)
+        elif isinstance(value, str):
+            text = value.strip()
+            percent = text.endswith('%')
+            try:
+                number, changed = float(text.rstrip('%')), True
+            except ValueError:
+                raise ValidationFailure(f"{field.name} must be a number, got {value[:20]!r}")
+        else:
+            raise ValidationFailure(f"{field.name} must be a number")
+        
+        if number != number:
+            raise ValidationFailure(f"{field.name} is NaN")
+        if field.bounds:
+            low, high = field.bounds
+            # A percentage for a 0..1 field: written with '%', or too large to be a slightly
+            # out-of-range fraction (1.5 is clamped to 1.0, not read as 1.5%)
+            if high == 1.0 and (percent or 2.0 <= number <= 100.0):
+                number, changed = number / 100, True
+            bounded = min(max(number, low), high)
+            changed = changed or bounded != number
+            number = bounded
+        return number, changed
+    
+    @staticmethod
+    def _coerce_string(field: _Field, value: Any) -> Tuple[str, bool]:
+        if isinstance(value, str):
+            text, changed = value, False
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            text, changed = str(value), True
+        else:
+            raise ValidationFailure(f"{field.name} must be a string")
+        
+        if field.enum is not None:
+            normalized = text.strip().lower()
+            if normalized not in field.enum:
+                raise ValidationFailure(f"{field.name} must be one of {', '.join(field.enum)}, got {text[:20]!r}")
+            changed = changed or normalized != text
+            text = normalized
+        return text, changed
+    
+    def schema(self, extra: Optional[Dict[str, Dict]] = None) -> Dict:
+        """
+        Response schema for constrained (JSON mode) generation, in the
+        OpenAPI subset Gemini accepts; `extra` adds required properties.
+        Gemini rejects OBJECT properties without a fixed set of properties,
+        so free-form dict fields are requested as JSON-encoded strings,
+        which `validate` decodes.
+        """
+        properties, required = {}, []
+        for field in self.fields:
+            if field.kind == 'dict':
+                properties[field.name] = {'type': 'STRING', 'description': 'JSON object encoded as a string'}
+                if field.required:
+                    required.append(field.name)
+                continue
+            prop: Dict[str, Any] = {'type': self.SCHEMA_TYPES.get(field.kind, 'STRING')}
+            if field.kind == 'list':
+                prop['items'] = {'type': self.SCHEMA_TYPES.get(field.item_kind, 'STRING')}
+            if field.enum is not None:
+                prop['enum'] = list(field.enum)
+            properties[field.name] = prop
+            if field.required:
+                required.append(field.name)
+        for name, prop in (extra or {}).items():
+            properties[name] = prop
+            required.append(name)
+        return {'type': 'OBJECT', 'properties': properties, 'required': required}
+
+def load_json(text: str, container: str = '{') -> Tuple[Any, bool]:
+    """
+    Decode a model response.
+    
+    The fast path is the whole text being JSON, which is what JSON mode
+    returns. Otherwise the outermost object (or array, with container='[')
+    is cut out of surrounding prose or markdown fences, and trailing commas
+    are dropped as a last resort.
+    
+    Returns:
+        (decoded value, whether the text had to be repaired)
+    
+    Raises:
+        ValueError: If no JSON can be recovered
+    """
+    try:
+        return json.loads(text), False
+    except ValueError:
+        pass
+    
+    closing = ']' if container == '[' else '}'
+    start, end = text.find(container), text.rfind(closing) + 1
+    if start == -1 or end <= start:
+        raise ValueError(f"No JSON {'array' if container == '[' else 'object'} found in response")
+    snippet = text[start:end]
+    try:
+        return json.loads(snippet), True
+    except ValueError:
+        return json.loads(_TRAILING_COMMA.sub(r'\1', snippet)), True
+
+class ParseStats:
+    """
+    Thread-safe counters of how model responses parsed, per response kind.
+    
+    Outcomes: parsed (valid as returned), repaired (valid after repair),
+    invalid (undecodable or failing validation), missing (absent from a
+    batched response), retried (re-asked) and fallback (gave up).
+    """
+    
+    OUTCOMES = ('parsed', 'repaired', 'invalid', 'missing', 'retried', 'fallback')
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = {}
+    
+    def record(self, kind: str, outcome: str, count: int = 1):
+        if count <= 0:
+            return
+        with self._lock:
+            counts = self._counts.setdefault(kind, dict.fromkeys(self.OUTCOMES, 0))
+            counts[outcome] += count
+        PARSE_OUTCOMES.labels(kind, outcome).inc(count)
+    
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {kind: dict(counts) for kind, counts in self._counts.items()}
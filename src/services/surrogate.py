@@ -0,0 +1,178 @@
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+import numpy as np
+
+from src.models.population import (
+    CORE_VALUES, EDUCATION_LEVELS, LIFESTYLE_CATEGORIES, OCCUPATIONS, PERSONALITY_TRAITS, PopulationFrame
+)
+from src.services.aggregation import LOCATION_REGION, REACTION_TYPES, REGION_LABELS, ReactionColumns
+
+# People encoded per chunk when predicting, to bound feature-matrix memory
+PREDICT_CHUNK = 65536
+
+@dataclass
+class SurrogatePlan:
+    """
+    Settings for surrogate-assisted simulation.
+    
+    Gemini simulates `training_samples` random people, a small model is
+    fitted to their reactions, and then up to `rounds` rounds send the
+    people the model is least sure about (top-class probability below
+    `confidence_threshold`) to Gemini and refit. Gemini never simulates
+    more than `max_llm_fraction` of the population (or the training
+    sample, if larger). If the model's hold-out accuracy on the training
+    sample is below `min_accuracy`, everyone is simulated by Gemini.
+    """
+    training_samples: int = 500
+    confidence_threshold: float = 0.6
+    max_llm_fraction: float = 0.3
+    rounds: int = 3
+    min_accuracy: float = 0.5
+    seed: int = 0
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'SurrogatePlan':
+        """
+        Build a plan from request parameters.
+        
+        Raises:
+            ValueError: On out-of-range settings
+        """
+        plan = cls()
+        for key in ('confidence_threshold', 'max_llm_fraction', 'min_accuracy'):
+            if data.get(key) is not None:
+                setattr(plan, key, float(data[key]))
+        for key in ('training_samples', 'rounds', 'seed'):
+            if data.get(key) is not None:
+                setattr(plan, key, int(data[key]))
+        
+        if plan.training_samples < 10:
+            raise ValueError("training_samples must be at least 10")
+        if not 0 < plan.max_llm_fraction <= 1 or not 0 <= plan.confidence_threshold <= 1:
+            raise ValueError("max_llm_fraction and confidence_threshold must be between 0 and 1")
+        if plan.rounds < 0:
+            raise ValueError("rounds cannot be negative")
+        return plan
+
+def encode_features(population: PopulationFrame) -> np.ndarray:
+    """
+    Numeric feature matrix built from the frame's columns.
+    
+    Ordinal traits (tech savviness, price sensitivity, innovation adoption)
+    become 0..1 scores, the Big Five and values bitmask are used as is, and
+    occupation, education, lifestyle and region are one-hot encoded.
+    """
+    size = len(population)
+    value_bits = (population.values[:, None] >> np.arange(len(CORE_VALUES), dtype=np.uint16)) & 1
+    
+    def one_hot(codes: np.ndarray, width: int) -> np.ndarray:
+        encoded = np.zeros((size, width), dtype=np.float32)
+        encoded[np.arange(size), codes] = 1
+        return encoded
+    
+    return np.hstack([
+        (population.age.astype(np.float32) / 100)[:, None],
+        (np.log1p(population.income.astype(np.float32)) / 12)[:, None],
+        (population.tech_savviness.astype(np.float32) / 2)[:, None],
+        (population.price_sensitivity.astype(np.float32) / 2)[:, None],
+        (population.innovation_adoption.astype(np.float32) / 2)[:, None],
+        population.personality.reshape(size, len(PERSONALITY_TRAITS)),
+        value_bits.astype(np.float32),
+        one_hot(population.occupation, len(OCCUPATIONS)),
+        one_hot(population.education, len(EDUCATION_LEVELS)),
+        one_hot(population.lifestyle, len(LIFESTYLE_CATEGORIES)),
+        one_hot(LOCATION_REGION[population.location], len(REGION_LABELS))
+    ])
+
+class SurrogateModel:
+    """
+    CPU-only stand-in for Gemini within one decision: softmax regression
+    for the reaction type and ridge regressions for strength and
+    likelihood to act, all on standardized `encode_features` columns.
+    """
+    
+    def __init__(self, l2: float = 1.0, iterations: int = 300, learning_rate: float = 0.5):
+        self.l2 = l2
+        self.iterations = iterations
+        self.learning_rate = learning_rate
+        self.mean = self.scale = None
+        self.classifier = self.regressor = None
+    
+    def _design(self, features: np.ndarray) -> np.ndarray:
+        """Standardized features plus an intercept column"""
+        standardized = (features - self.mean) / self.scale
+        return np.hstack([standardized, np.ones((len(features), 1))])
+    
+    def fit(self, population: PopulationFrame, reactions: ReactionColumns) -> 'SurrogateModel':
+        """
+        Fit to people's simulated reactions; fallback placeholders are ignored.
+        
+        Raises:
+            ValueError: If there is no real reaction to learn from
+        """
+        usable = (reactions.reaction_type >= 0) & ~reactions.fallback
+        if not usable.any():
+            raise ValueError("No simulated reactions to train on")
+        
+        features = encode_features(population[usable]).astype(np.float64)
+        self.mean = features.mean(axis=0)
+        self.scale = np.where(features.std(axis=0) > 1e-6, features.std(axis=0), 1.0)
+        design = self._design(features)
+        size, width = design.shape
+        
+        # Softmax regression by full-batch gradient descent
+        targets = np.eye(len(REACTION_TYPES))[reactions.reaction_type[usable]]
+        weights = np.zeros((width, len(REACTION_TYPES)))
+        for _ in range(self.iterations):
+            probabilities = self._softmax(design @ weights)
+            gradient = (design.T @ (probabilities - targets) + self.l2 * weights) / size
+            weights -= self.learning_rate * gradient
+        self.classifier = weights
+        
+        # Closed-form ridge for strength and likelihood together
+        outputs = np.column_stack([reactions.strength[usable], reactions.likelihood[usable]]).astype(np.float64)
+        self.regressor = np.linalg.solve(design.T @ design + self.l2 * np.eye(width), design.T @ outputs)
+        return self
+    
+    @staticmethod
+    def _softmax(logits: np.ndarray) -> np.ndarray:
+        exponentials = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return exponentials / exponentials.sum(axis=1, keepdims=True)
+    
+    def predict(self, population: PopulationFrame) -> Tuple[np.ndarray, ReactionColumns]:
+        """
+        Predict reactions for a frame, encoding it in chunks.
+        
+        Returns:
+            (class probabilities of shape (people, 3), predicted reactions)
+        """
+        probabilities = np.empty((len(population), len(REACTION_TYPES)))
+        outputs = np.empty((len(population), 2))
+        for start in range(0, len(population), PREDICT_CHUNK):
+            window = slice(start, start + PREDICT_CHUNK)
+            design = self._design(encode_features(population[window]).astype(np.float64))
+            probabilities[window] = self._softmax(design @ self.classifier)
+            outputs[window] = design @ self.regressor
+        
+        outputs = np.clip(outputs, 0.0, 1.0)
+        return probabilities, ReactionColumns(
+            reaction_type=probabilities.argmax(axis=1).astype(np.int8),
+            strength=outputs[:, 0].astype(np.float32),
+            likelihood=outputs[:, 1].astype(np.float32),
+            fallback=np.zeros(len(population), dtype=bool)
+        )
+
+def holdout_accuracy(population: PopulationFrame, reactions: ReactionColumns, seed: int = 0,
+                     holdout: float = 0.2) -> float:
+    """Reaction-type accuracy of a model fitted on the rest of the sample, on a random hold-out slice"""
+    usable = np.flatnonzero((reactions.reaction_type >= 0) & ~reactions.fallback)
+    if len(usable) < 10:
+        return 0.0
+    
+    shuffled = np.random.default_rng(seed).permutation(usable)
+    cut = max(1, int(len(shuffled) * holdout))
+    test, train = shuffled[:cut], shuffled[cut:]
+    model = SurrogateModel().fit(population[train], reactions[train])
+    _, predicted = model.predict(population[test])
+    return float((predicted.reaction_type == reactions.reaction_type[test]).mean())
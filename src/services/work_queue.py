@@ -0,0 +1,379 @@
+import logging
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import redis
+from cachetools import LRUCache
+
+from src.models.population import PopulationFrame
+from src.utils.cache import deserialize, serialize
+from src.utils.metrics import QUEUE_TASKS
+from src.utils.tracing import current_trace_id
+
+logger = logging.getLogger(__name__)
+
+# Scripts read the server clock, so visibility deadlines and semaphore
+# leases do not depend on the clocks of the machines running workers
+_NOW = "local t = redis.call('TIME') local now = tonumber(t[1]) + tonumber(t[2]) / 1000000 "
+
+# Claim the oldest visible task by pushing its visibility deadline out.
+# KEYS: ready, tasks, attempts; ARGV: visibility timeout
+_RESERVE = _NOW + """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now, 'LIMIT', 0, 1)
+if #ids == 0 then return false end
+local id = ids[1]
+local payload = redis.call('HGET', KEYS[2], id)
+if not payload then
+    redis.call('ZREM', KEYS[1], id)
+    redis.call('HDEL', KEYS[3], id)
+    return {id}
+end
+redis.call('ZADD', KEYS[1], now + tonumber(ARGV[1]), id)
+return {id, payload, redis.call('HINCRBY', KEYS[3], id, 1)}
+"""
+
+# Write a task's result once and acknowledge the task; later deliveries of
+# the same task (or of a cancelled run) write nothing.
+# KEYS: ready, tasks, attempts, results, done; ARGV: task id, offset, result, ttl
+_COMPLETE = """
+if redis.call('HEXISTS', KEYS[2], ARGV[1]) == 0 then return 0 end
+local written = redis.call('HSETNX', KEYS[4], ARGV[2], ARGV[3])
+if written == 1 then
+    redis.call('RPUSH', KEYS[5], ARGV[2])
+    redis.call('EXPIRE', KEYS[4], ARGV[4])
+    redis.call('EXPIRE', KEYS[5], ARGV[4])
+end
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[2], ARGV[1])
+redis.call('HDEL', KEYS[3], ARGV[1])
+return written
+"""
+
+# Move a member's deadline, if it is still there. KEYS: zset; ARGV: member, seconds from now
+_TOUCH = _NOW + """
+if redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+    redis.call('ZADD', KEYS[1], now + tonumber(ARGV[2]), ARGV[1])
+    return 1
+end
+return 0
+"""
+
+# Take a slot of a counting semaphore whose holders expire.
+# KEYS: semaphore; ARGV: holder, lease seconds, limit
+_ACQUIRE = _NOW + """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZSCORE', KEYS[1], ARGV[1]) or redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[3]) then
+    redis.call('ZADD', KEYS[1], now + tonumber(ARGV[2]), ARGV[1])
+    return 1
+end
+return 0
+"""
+
+@dataclass
+class QueueTask:
+    """One reserved unit of a distributed simulation: a prompt's worth of people"""
+    task_id: str
+    run_id: str
+    offset: int
+    people: List[Dict]
+    attempts: int
+
+class RedisSemaphore:
+    """
+    Counting semaphore shared by every process using the same Redis.
+    
+    Holders are members of a sorted set scored by lease expiry, so a slot
+    held by a crashed process frees itself after `lease` seconds; live
+    holders keep theirs with `refresh`.
+    """
+    
+    def __init__(self, client: redis.Redis, key: str, limit: int, lease: float = 300):
+        self.client = client
+        self.key = key
+        self.limit = limit
+        self.lease = lease
+        self._acquire = client.register_script(_ACQUIRE)
+        self._touch = client.register_script(_TOUCH)
+    
+    def acquire(self, holder: str) -> bool:
+        """Take a slot for `holder` without waiting; True if one was free"""
+        return bool(self._acquire(keys=[self.key], args=[holder, self.lease, self.limit]))
+    
+    def refresh(self, holder: str) -> bool:
+        """Extend a held slot's lease; False if it had already expired"""
+        return bool(self._touch(keys=[self.key], args=[holder, self.lease]))
+    
+    def release(self, holder: str):
+        self.client.zrem(self.key, holder)
+
+class RedisWorkQueue:
+    """
+    Work queue for distributed simulations, on Redis.
+    
+    A coordinating web worker splits a simulation into prompt-sized tasks
+    and queues at most `max_pending` of them at a time; `worker.py`
+    processes on any box reserve tasks, simulate them and write the
+    reactions back, and the coordinator folds results in as they arrive.
+    
+    Delivery is at least once: a reserved task stays in the ready set with
+    its score pushed `visibility_timeout` seconds out, and reappears to
+    other workers if it is not completed by then (a crashed worker, or one
+    that stopped heartbeating). Results are written idempotently: the first
+    completion of a task stores its reactions and acknowledges it, and any
+    later completion of the same task is dropped.
+    
+    Keys (under `namespace`): ready (sorted set of task ids by visibility
+    time), tasks and attempts (hashes by task id), and per run: the run's
+    context, its task ids, its results hash and a list of completed offsets.
+    """
+    
+    def __init__(self, client: redis.Redis, namespace: str = 'heuristics:queue',
+                 visibility_timeout: float = 300, max_attempts: int = 3, max_pending: int = 200,
+                 ttl: int = 86400):
+        self.client = client
+        self.namespace = namespace
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max(1, max_attempts)
+        self.max_pending = max(1, max_pending)  # Tasks queued per run at any time
+        self.ttl = ttl  # Expiry of per-run keys left behind by a coordinator that died
+        self._reserve = client.register_script(_RESERVE)
+        self._complete = client.register_script(_COMPLETE)
+        self._touch = client.register_script(_TOUCH)
+        self._contexts: LRUCache = LRUCache(maxsize=64)
+        self._contexts_lock = threading.Lock()
+    
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> 'RedisWorkQueue':
+        # Blocking pops wait up to a second, so reads need more headroom than cache lookups
+        return cls(redis.Redis.from_url(url, socket_timeout=10.0, socket_connect_timeout=1.0), **kwargs)
+    
+    def _key(self, *parts: str) -> str:
+        return ':'.join((self.namespace,) + parts)
+    
+    def _now(self) -> float:
+        """Redis server time, the one clock every node agrees on"""
+        seconds, microseconds = self.client.time()
+        return seconds + microseconds / 1e6
+    
+    def semaphore(self, limit: int) -> RedisSemaphore:
+        """Global concurrency budget over the tasks being processed by all workers"""
+        return RedisSemaphore(self.client, self._key('budget'), limit, lease=self.visibility_timeout)
+    
+    # Coordinator side
+    
+    def simulate(self, population: PopulationFrame, decision_analysis: Dict, unit_size: int, batch_size: int,
+                 on_unit: Optional[Callable[[int, List[Dict]], None]] = None,
+                 cancel_event: Optional[threading.Event] = None,
+                 stop_event: Optional[threading.Event] = None) -> int:
+        """
+        Simulate every person in a frame on the queue's workers.
+        
+        Profiles are materialized `batch_size` at a time and queued as
+        tasks of `unit_size` people while fewer than `max_pending` are
+        outstanding. Setting `cancel_event` or `stop_event` withdraws the
+        run's remaining tasks; results still in flight are discarded.
+        
+        Args:
+            population: People to simulate
+            decision_analysis: Analysis from DecisionAnalyzer
+            unit_size: People per task (one Gemini request)
+            batch_size: Profiles materialized at a time
+            on_unit: Called with each completed task's position and reactions
+            cancel_event: Optional event; setting it stops the run
+            stop_event: Optional event; setting it ends the run early
+        
+        Returns:
+            Number of people whose reactions were received
+        """
+        size = len(population)
+        run_id = uuid.uuid4().hex
+        self.client.set(self._key('run', run_id), serialize({
+            'decision_analysis': decision_analysis,
+            'unit_size': unit_size,
+            'trace_id': current_trace_id()
+        }), ex=self.ttl)
+        
+        next_start, done = 0, 0
+        outstanding = set()
+        last_result = time.monotonic()
+        warned = False
+        try:
+            while True:
+                if any(event is not None and event.is_set() for event in (cancel_event, stop_event)):
+                    break
+                
+                while next_start < size and len(outstanding) < self.max_pending:
+                    end = min(next_start + batch_size, size)
+                    people = population.to_dicts(next_start, end)
+                    units = [(next_start + offset, people[offset:offset + unit_size])
+                             for offset in range(0, len(people), unit_size)]
+                    self._enqueue(run_id, units)
+                    outstanding.update(offset for offset, _ in units)
+                    next_start = end
+                
+                if not outstanding:
+                    break
+                
+                results = self._collect(run_id)
+                for offset, reactions in results:
+                    if offset not in outstanding:
+                        continue
+                    outstanding.discard(offset)
+                    done += len(reactions)
+                    if on_unit is not None:
+                        on_unit(offset, reactions)
+                
+                if results:
+                    last_result = time.monotonic()
+                elif not warned and time.monotonic() - last_result > self.visibility_timeout:
+                    logger.warning(f"Run {run_id} has had no results for {self.visibility_timeout:g}s "
+                                   f"({self.live_workers()} simulation workers alive)")
+                    warned = True
+        finally:
+            self._cleanup(run_id)
+        
+        logger.info(f"Distributed run {run_id} finished: {done}/{size} people")
+        return done
+    
+    def _enqueue(self, run_id: str, units: List[Tuple[int, List[Dict]]]):
+        now = self._now()
+        task_ids = [f"{run_id}:{offset}" for offset, _ in units]
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hset(self._key('tasks'), mapping={
+            task_id: serialize({'run_id': run_id, 'offset': offset, 'people': people})
+            for task_id, (offset, people) in zip(task_ids, units)
+        })
+        pipe.zadd(self._key('ready'), {task_id: now for task_id in task_ids})
+        pipe.sadd(self._key('run', run_id, 'tasks'), *task_ids)
+        pipe.expire(self._key('run', run_id, 'tasks'), self.ttl)
+        pipe.execute()
+    
+    def _collect(self, run_id: str, timeout: int = 1) -> List[Tuple[int, List[Dict]]]:
+        """Results of tasks completed since the last call, waiting up to `timeout` seconds for one"""
+        done_key, results_key = self._key('run', run_id, 'done'), self._key('run', run_id, 'results')
+        first = self.client.blpop([done_key], timeout=timeout)
+        if first is None:
+            return []
+        
+        pipe = self.client.pipeline()
+        pipe.lrange(done_key, 0, -1)
+        pipe.delete(done_key)
+        rest, _ = pipe.execute()
+        fields = [first[1]] + rest
+        
+        values = self.client.hmget(results_key, fields)
+        self.client.hdel(results_key, *fields)
+        return [(int(field), deserialize(value)) for field, value in zip(fields, values) if value is not None]
+    
+    def _cleanup(self, run_id: str):
+        """Withdraw a run's unfinished tasks and delete its keys"""
+        tasks_key = self._key('run', run_id, 'tasks')
+        task_ids = list(self.client.smembers(tasks_key))
+        pipe = self.client.pipeline(transaction=False)
+        for start in range(0, len(task_ids), 1000):
+            chunk = task_ids[start:start + 1000]
+            pipe.zrem(self._key('ready'), *chunk)
+            pipe.hdel(self._key('tasks'), *chunk)
+            pipe.hdel(self._key('attempts'), *chunk)
+        pipe.delete(tasks_key, self._key('run', run_id), self._key('run', run_id, 'results'),
+                    self._key('run', run_id, 'done'))
+        pipe.execute()
+        if task_ids:
+            logger.info(f"Withdrew {len(task_ids)} unfinished tasks of run {run_id}")
+    
+    # Worker side
+    
+    def reserve(self) -> Optional[QueueTask]:
+        """Claim the next visible task, or None if there is none"""
+        while True:
+            claimed = self._reserve(keys=[self._key('ready'), self._key('tasks'), self._key('attempts')],
+                                    args=[self.visibility_timeout])
+            if not claimed:
+                return None
+            if len(claimed) == 1:
+                continue  # a task whose run was withdrawn; it has been dropped
+            
+            task_id, payload, attempts = claimed
+            task = deserialize(payload)
+            return QueueTask(task_id=task_id.decode(), run_id=task['run_id'], offset=task['offset'],
+                             people=task['people'], attempts=int(attempts))
+    
+    def run_context(self, run_id: str) -> Optional[Dict]:
+        """Decision analysis, unit size and trace id of a run, or None once the run has ended"""
+        with self._contexts_lock:
+            context = self._contexts.get(run_id)
+        if context is not None:
+            return context
+        
+        data = self.client.get(self._key('run', run_id))
+        if data is None:
+            return None
+        context = deserialize(data)
+        with self._contexts_lock:
+            self._contexts[run_id] = context
+        return context
+    
+    def extend(self, task: QueueTask) -> bool:
+        """Push a reserved task's visibility deadline out again; False if the task is gone"""
+        return bool(self._touch(keys=[self._key('ready')], args=[task.task_id, self.visibility_timeout]))
+    
+    def complete(self, task: QueueTask, reactions: List[Dict]) -> bool:
+        """
+        Store a task's reactions and acknowledge it.
+        
+        Returns:
+            False if the task had already been completed (or its run withdrawn)
+            and nothing was written
+        """
+        written = self._complete(
+            keys=[self._key('ready'), self._key('tasks'), self._key('attempts'),
+                  self._key('run', task.run_id, 'results'), self._key('run', task.run_id, 'done')],
+            args=[task.task_id, task.offset, serialize(reactions), self.ttl]
+        )
+        QUEUE_TASKS.labels('completed' if written else 'duplicate').inc()
+        return bool(written)
+    
+    def discard(self, task: QueueTask):
+        """Drop a task of a run that has ended, without a result"""
+        pipe = self.client.pipeline()
+        pipe.zrem(self._key('ready'), task.task_id)
+        pipe.hdel(self._key('tasks'), task.task_id)
+        pipe.hdel(self._key('attempts'), task.task_id)
+        pipe.execute()
+        QUEUE_TASKS.labels('discarded').inc()
+    
+    def release(self, task: QueueTask):
+        """Make a reserved task visible again right away, e.g. when its worker shuts down"""
+        self.client.zadd(self._key('ready'), {task.task_id: self._now()}, xx=True)
+        QUEUE_TASKS.labels('released').inc()
+    
+    def heartbeat(self, worker_id: str):
+        """Record that a worker is alive"""
+        self.client.zadd(self._key('workers'), {worker_id: self._now()})
+    
+    def leave(self, worker_id: str):
+        self.client.zrem(self._key('workers'), worker_id)
+    
+    def live_workers(self) -> int:
+        """Workers that heartbeated within the visibility timeout"""
+        cutoff = self._now() - self.visibility_timeout
+        self.client.zremrangebyscore(self._key('workers'), '-inf', cutoff)
+        return self.client.zcard(self._key('workers'))
+    
+    def stats(self) -> Dict:
+        now = self._now()
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zcount(self._key('ready'), '-inf', now)
+        pipe.zcount(self._key('ready'), f"({now}", '+inf')
+        pipe.zcount(self._key('budget'), now, '+inf')
+        ready, reserved, budget_in_use = pipe.execute()
+        return {
+            'ready': ready,
+            'reserved': reserved,
+            'budget_in_use': budget_in_use,
+            'workers': self.live_workers(),
+            'visibility_timeout': self.visibility_timeout
+        }
@@ -0,0 +1,254 @@
+import json
+import logging
+from abc import ABC, abstractmethod
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+import redis
+from cachetools import TTLCache
+
+from src.utils.metrics import CACHE_EVENTS
+
+logger = logging.getLogger(__name__)
+
+# Values above this size are zlib-compressed before going to the shared tier
+COMPRESS_THRESHOLD = 512
+
+def serialize(value: Any) -> bytes:
+    """Compact JSON encoding, compressed when large; the first byte flags compression"""
+    data = json.dumps(value, separators=(',', ':')).encode()
+    if len(data) > COMPRESS_THRESHOLD:
+        return b'z' + zlib.compress(data)
+    return b'j' + data
+
+def deserialize(data: bytes) -> Any:
+    """Inverse of `serialize`"""
+    if data[:1] == b'z':
+        return json.loads(zlib.decompress(data[1:]))
+    return json.loads(data[1:])
+
+class CacheBackend(ABC):
+    """Shared cache tier used by every worker process"""
+    
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        """Stored value, or None if the key is missing or expired"""
+    
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: int):
+        """Store a value for `ttl` seconds"""
+    
+    @abstractmethod
+    def delete(self, key: str):
+        """Remove a key if present"""
+    
+    @abstractmethod
+    def add(self, key: str, value: bytes, ttl: int) -> bool:
+        """Set a key only if it is absent (or expired); True if it was set"""
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Redis-backed shared tier.
+    
+    TTL is enforced per key; size eviction is left to the server's
+    `maxmemory-policy` (allkeys-lru is recommended).
+    """
+    
+    def __init__(self, url: str):
+        self.client = redis.Redis.from_url(url, socket_timeout=1.0, socket_connect_timeout=1.0)
+    
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+    
+    def set(self, key: str, value: bytes, ttl: int):
+        self.client.set(key, value, ex=ttl)
+    
+    def delete(self, key: str):
+        self.client.delete(key)
+    
+    def add(self, key: str, value: bytes, ttl: int) -> bool:
+        return bool(self.client.set(key, value, ex=ttl, nx=True))
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    SQLite-backed shared tier for single-box deploys.
+    
+    Every gunicorn worker on the box opens the same file (WAL mode), so
+    entries survive restarts. Expired rows and, beyond `max_entries`, the
+    least recently written rows are pruned periodically.
+    """
+    
+    PRUNE_EVERY = 500  # writes between prunes
+    
+    def __init__(self, path: str, max_entries: int = 100000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        with self._connection() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL, written_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS cache_written_at ON cache (written_at)')
+    
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            self._local.conn = conn
+        return conn
+    
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._connection().execute(
+            'SELECT value FROM cache WHERE key = ? AND expires_at > ?', (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+    
+    def set(self, key: str, value: bytes, ttl: int):
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires_at, written_at) VALUES (?, ?, ?, ?)',
+                (key, value, now + ttl, now)
+            )
+        
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self._prune()
+    
+    def delete(self, key: str):
+        with self._connection() as conn:
+            conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+    
+    def add(self, key: str, value: bytes, ttl: int) -> bool:
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute('DELETE FROM cache WHERE key = ? AND expires_at <= ?', (key, now))
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires_at, written_at) VALUES (?, ?, ?, ?)',
+                (key, value, now + ttl, now)
+            )
+        return cursor.rowcount == 1
+    
+    def _prune(self):
+        """Drop expired entries, then the oldest ones beyond max_entries"""
+        with self._connection() as conn:
+            conn.execute('DELETE FROM cache WHERE expires_at <= ?', (time.time(),))
+            conn.execute(
+                'DELETE FROM cache WHERE key IN ('
+                'SELECT key FROM cache ORDER BY written_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+
+class TwoTierCache:
+    """
+    In-process TTL/LRU cache in front of an optional shared backend.
+    
+    Lookups try the local tier, then the shared tier (promoting hits into
+    the local tier). Backend failures are logged and treated as misses, so
+    an unavailable Redis degrades to per-process caching instead of errors.
+    """
+    
+    def __init__(self, namespace: str, ttl: int = 3600, maxsize: int = 5000,
+                 backend: Optional[CacheBackend] = None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.backend = backend
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.counters = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'sets': 0, 'backend_errors': 0}
+    
+    def _shared_key(self, key: str) -> str:
+        return f"heuristics:{self.namespace}:{key}"
+    
+    def _count(self, counter: str):
+        with self._lock:
+            self.counters[counter] += 1
+        CACHE_EVENTS.labels(self.namespace, counter).inc()
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Cached value for a key, or None on a miss"""
+        with self._lock:
+            value = self.local.get(key)
+        if value is not None:
+            self._count('local_hits')
+            return value
+        
+        if self.backend is not None:
+            try:
+                data = self.backend.get(self._shared_key(key))
+                value = deserialize(data) if data is not None else None
+            except Exception as e:
+                # Unreachable backend or a corrupt entry; either way a miss
+                logger.warning(f"Shared cache read failed for {self.namespace}: {str(e)}")
+                self._count('backend_errors')
+                value = None
+            
+            if value is not None:
+                with self._lock:
+                    self.local[key] = value
+                self._count('shared_hits')
+                return value
+        
+        self._count('misses')
+        return None
+    
+    def set(self, key: str, value: Any):
+        """Store a value in both tiers"""
+        with self._lock:
+            self.local[key] = value
+        self._count('sets')
+        
+        if self.backend is not None:
+            try:
+                self.backend.set(self._shared_key(key), serialize(value), self.ttl)
+            except Exception as e:
+                logger.warning(f"Shared cache write failed for {self.namespace}: {str(e)}")
+                self._count('backend_errors')
+    
+    def stats(self) -> Dict:
+        """Hit/miss counters and hit rate"""
+        with self._lock:
+            counters = dict(self.counters)
+            local_size = len(self.local)
+        lookups = counters['local_hits'] + counters['shared_hits'] + counters['misses']
+        hits = counters['local_hits'] + counters['shared_hits']
+        return {
+            **counters,
+            'local_size': local_size,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0
+        }
+
+def create_cache_backend(backend: str, redis_url: Optional[str] = None, sqlite_path: Optional[str] = None,
+                         max_entries: int = 100000) -> Optional[CacheBackend]:
+    """
+    Build the shared cache tier named by the CACHE_BACKEND setting.
+    
+    Args:
+        backend: 'redis', 'sqlite', or 'memory' for no shared tier
+        redis_url: Redis connection URL for the 'redis' backend
+        sqlite_path: Database file for the 'sqlite' backend
+        max_entries: Size bound for the 'sqlite' backend
+    
+    Returns:
+        The backend, or None for in-process caching only
+    """
+    if backend == 'redis':
+        return RedisCacheBackend(redis_url)
+    if backend == 'sqlite':
+        return SQLiteCacheBackend(sqlite_path, max_entries=max_entries)
+    if backend != 'memory':
+        raise ValueError(f"Unknown cache backend: {backend}")
+    return None
@@ -3,6 +3,8 @@ import sys
 from datetime import datetime
 from pythonjsonlogger import jsonlogger
 
+from src.utils.tracing import TraceContextFilter
+
 def setup_logger(log_level: str = 'INFO'):
     """
     Setup application-wide logging configuration.
@@ -29,6 +31,7 @@ def setup_logger(log_level: str = 'INFO'):
     )
     
     console_handler.setFormatter(json_formatter)
+    console_handler.addFilter(TraceContextFilter())  # trace_id on every line logged during a request or job
     root_logger.addHandler(console_handler)
     
     # Set specific loggers
@@ -0,0 +1,144 @@
+"""
+Prometheus metrics for Heuristics AI.
+
+Metrics are module-level, as prometheus_client expects. Under gunicorn,
+set PROMETHEUS_MULTIPROC_DIR before anything imports prometheus_client
+(gunicorn.conf.py does) so every worker writes its values to files there
+and `render_metrics` serves the sum over all workers.
+"""
+
+import functools
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+
+from src.utils.rate_limiter import estimate_tokens
+from src.utils.tracing import span
+
+# Seconds; LLM calls and simulations run far longer than typical web requests
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+REQUEST_LATENCY = Histogram(
+    'heuristics_http_request_duration_seconds', 'HTTP request latency by route',
+    ['method', 'route', 'status'], buckets=LATENCY_BUCKETS
+)
+REQUEST_BYTES = Histogram(
+    'heuristics_http_request_bytes', 'HTTP request body size by route', ['route'], buckets=SIZE_BUCKETS
+)
+RESPONSE_BYTES = Histogram(
+    'heuristics_http_response_bytes', 'HTTP response body size by route (streamed responses excluded)',
+    ['route'], buckets=SIZE_BUCKETS
+)
+STAGE_LATENCY = Histogram(
+    'heuristics_stage_duration_seconds', 'Pipeline stage latency', ['stage'], buckets=LATENCY_BUCKETS
+)
+LLM_LATENCY = Histogram(
+    'heuristics_llm_call_duration_seconds', 'Latency of one LLM request, excluding rate limiter waits',
+    ['kind', 'outcome'], buckets=LATENCY_BUCKETS
+)
+LLM_TOKENS = Counter(
+    'heuristics_llm_tokens_total', 'LLM tokens (reported by the backend, else estimated)', ['kind']
+)
+LLM_IN_FLIGHT = Gauge(
+    'heuristics_llm_calls_in_flight', 'LLM requests currently awaiting a response', ['kind'],
+    multiprocess_mode='livesum'
+)
+CACHE_EVENTS = Counter(
+    'heuristics_cache_events_total', 'Cache lookups and writes by cache and outcome', ['cache', 'event']
+)
+PARSE_OUTCOMES = Counter(
+    'heuristics_parse_outcomes_total', 'Model responses by parse outcome (fallback counts fallback reactions)',
+    ['kind', 'outcome']
+)
+QUEUE_TASKS = Counter(
+    'heuristics_queue_tasks_total', 'Distributed simulation tasks handled by this process, by outcome', ['outcome']
+)
+SINGLE_FLIGHT = Counter(
+    'heuristics_single_flight_total',
+    'Coalesced calls by flight and outcome (leader ran it; shared, error or timeout for callers that waited)',
+    ['flight', 'outcome']
+)
+JOBS = Gauge(
+    'heuristics_jobs', 'Simulation jobs queued or running', ['state'], multiprocess_mode='livesum'
+)
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Exposition-format metrics, summed over workers in multiprocess mode, and their content type"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+@contextmanager
+def time_stage(stage: str):
+    """Record how long the block takes as one observation of `stage`, and as a trace span"""
+    started = time.perf_counter()
+    try:
+        with span(stage):
+            yield
+    finally:
+        STAGE_LATENCY.labels(stage).observe(time.perf_counter() - started)
+
+def _record_llm_call(kind: str, started: float, response, error: Optional[Exception], prompt: str, prefix,
+                     attributes: Dict):
+    LLM_LATENCY.labels(kind, 'error' if error else 'ok').observe(time.perf_counter() - started)
+    if error is not None:
+        return
+    usage = getattr(response, 'usage_metadata', None)
+    tokens = getattr(usage, 'total_token_count', None)
+    if tokens is None:
+        tokens = estimate_tokens((prefix.text if prefix else '') + prompt + response.text)
+    LLM_TOKENS.labels(kind).inc(tokens)
+    attributes['tokens'] = tokens
+
+def instrument_llm(generate: Callable, kind: str) -> Callable:
+    """
+    Wrap a provider's `generate` with latency, token and in-flight metrics,
+    and an `llm_call` trace span.
+    
+    Wrapping happens inside the rate limiter's call, so each attempt is
+    measured on its own and limiter waits are not counted as latency.
+    """
+    @functools.wraps(generate)
+    def wrapper(prompt: str, *args, **kwargs):
+        in_flight = LLM_IN_FLIGHT.labels(kind)
+        in_flight.inc()
+        started, response, error = time.perf_counter(), None, None
+        with span('llm_call', kind=kind) as attributes:
+            try:
+                response = generate(prompt, *args, **kwargs)
+                return response
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                in_flight.dec()
+                _record_llm_call(kind, started, response, error, prompt, kwargs.get('prefix'), attributes)
+    return wrapper
+
+def instrument_llm_async(generate: Callable, kind: str) -> Callable:
+    """Async version of `instrument_llm` for `generate_async`"""
+    @functools.wraps(generate)
+    async def wrapper(prompt: str, *args, **kwargs):
+        in_flight = LLM_IN_FLIGHT.labels(kind)
+        in_flight.inc()
+        started, response, error = time.perf_counter(), None, None
+        with span('llm_call', kind=kind) as attributes:
+            try:
+                response = await generate(prompt, *args, **kwargs)
+                return response
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                in_flight.dec()
+                _record_llm_call(kind, started, response, error, prompt, kwargs.get('prefix'), attributes)
+    return wrapper
@@ -0,0 +1,115 @@
+import collections
+import logging
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+from cachetools import LRUCache
+
+logger = logging.getLogger(__name__)
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is requested while another one is running"""
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler over every thread of the process.
+    
+    A daemon thread snapshots all thread stacks every `interval` seconds
+    and counts identical stacks. `collapsed()` renders them in the
+    collapsed-stack format read by flamegraph.pl, speedscope and inferno:
+    one `thread;outer;...;inner count` line per distinct stack, rooted at
+    the thread name. Threads waiting on I/O or locks are sampled too, so
+    network waits and sleeps show up next to CPU work. Sampling stops by
+    itself after `max_seconds`.
+    """
+    
+    def __init__(self, interval: float = 0.005, max_seconds: float = 300):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self.duration = 0.0
+        self._stacks: Dict[str, int] = collections.Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self) -> 'SamplingProfiler':
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self) -> 'SamplingProfiler':
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self.started_at
+        return self
+    
+    def _sample(self):
+        own = threading.get_ident()
+        deadline = time.perf_counter() + self.max_seconds
+        while not self._stop.wait(self.interval) and time.perf_counter() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                frames.append(names.get(ident, f"thread-{ident}"))
+                self._stacks[';'.join(reversed(frames))] += 1
+            self.samples += 1
+    
+    def collapsed(self) -> str:
+        """Profile in collapsed-stack format, heaviest stacks first"""
+        stacks = sorted(self._stacks.items(), key=lambda item: -item[1])
+        return ''.join(f"{stack} {count}\n" for stack, count in stacks)
+
+class ProfileStore:
+    """
+    Recent profiles of this process, by profile id. Only one profiler runs
+    at a time, since each one samples every thread.
+    """
+    
+    def __init__(self, interval: float = 0.005, max_seconds: float = 300, max_profiles: int = 20):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.profiles: LRUCache = LRUCache(maxsize=max_profiles)
+        self._active = threading.Lock()
+        self._lock = threading.Lock()
+    
+    def start(self) -> SamplingProfiler:
+        """
+        Start profiling.
+        
+        Raises:
+            ProfilerBusy: If another profile is being recorded
+        """
+        if not self._active.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already being recorded")
+        return SamplingProfiler(self.interval, self.max_seconds).start()
+    
+    def finish(self, profile_id: str, profiler: SamplingProfiler):
+        """Stop a profiler started by `start` and keep its profile under `profile_id`"""
+        try:
+            profiler.stop()
+        finally:
+            self._active.release()
+        with self._lock:
+            self.profiles[profile_id] = profiler
+        logger.info(f"Recorded profile {profile_id}: {profiler.samples} samples over {profiler.duration:.2f}s")
+    
+    def get(self, profile_id: str) -> SamplingProfiler:
+        """
+        Look up a finished profile.
+        
+        Raises:
+            KeyError: If there is no such profile (it may be on another worker)
+        """
+        with self._lock:
+            return self.profiles[profile_id]
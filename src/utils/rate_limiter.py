@@ -0,0 +1,303 @@
+import asyncio
+import logging
+import random
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from src.utils.tracing import log_span
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth retrying: throttling, and transient server errors
+RATE_LIMIT_STATUSES = {429}
+TRANSIENT_STATUSES = {500, 502, 503, 504}
+
+def _status_code(error: Exception) -> Optional[int]:
+    """HTTP status of an API error (google.api_core errors carry it as `code`)"""
+    code = getattr(error, 'code', None)
+    if code is None or callable(code):
+        return None
+    try:
+        return int(code)
+    except (TypeError, ValueError):
+        return None
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Whether an error means the quota was exceeded"""
+    if _status_code(error) in RATE_LIMIT_STATUSES:
+        return True
+    message = str(error).lower()
+    return '429' in message or 'quota' in message or 'rate limit' in message
+
+def is_transient_error(error: Exception) -> bool:
+    """Whether an error is a server-side hiccup worth retrying"""
+    return _status_code(error) in TRANSIENT_STATUSES or isinstance(error, (TimeoutError, ConnectionError))
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """
+    Server-suggested delay before retrying, if the error carries one.
+    
+    Looks at a Retry-After header, a gRPC RetryInfo detail, then a
+    "retry in Ns" hint in the message.
+    """
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    value = headers.get('Retry-After') or headers.get('retry-after')
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+    
+    for detail in getattr(error, 'details', None) or []:
+        delay = getattr(detail, 'retry_delay', None)
+        if delay is not None:
+            return delay.seconds + delay.nanos / 1e9
+    
+    match = re.search(r'retry (?:in|after) (\d+(?:\.\d+)?)\s*s', str(error), re.IGNORECASE)
+    return float(match.group(1)) if match else None
+
+def estimate_tokens(prompt: str, max_output_tokens: int = 0) -> int:
+    """Rough token cost of a request: ~4 characters per prompt token plus the output budget"""
+    return len(prompt) // 4 + max_output_tokens
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `per_minute` / 60 per second.
+    
+    Holds at most `burst_seconds` worth of tokens. A request larger than the
+    bucket waits for a full bucket and then overdraws it, so it is delayed
+    rather than blocked forever. Not thread-safe on its own; the limiter
+    holds its lock around every call.
+    """
+    
+    def __init__(self, per_minute: float, burst_seconds: float = 10.0):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+    
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` tokens can be taken (0 if they can be now)"""
+        self._refill(now)
+        needed = min(amount, self.capacity)
+        if self.level >= needed:
+            return 0.0
+        return (needed - self.level) / self.rate
+    
+    def take(self, amount: float):
+        self.level -= amount
+    
+    def refund(self, amount: float):
+        self.level = min(self.capacity, self.level + amount)
+    
+    def drain(self):
+        """Empty the bucket, e.g. after the server reports the quota as spent"""
+        self.level = min(self.level, 0.0)
+
+class AdaptiveRateLimiter:
+    """
+    Client-side limiter shared by every Gemini caller in the process.
+    
+    Each call waits for a request token, an estimated number of quota
+    tokens and a concurrency slot. The concurrency limit follows AIMD: it
+    grows by about one slot per round of successful calls and is halved
+    when the API answers 429, or cut by 10% when latency climbs well above
+    its baseline. Throttled and transient failures are retried with full
+    jitter backoff, honoring any retry-after the server sends, which also
+    pauses every other caller until it has passed.
+    
+    Limits apply per process; with several worker processes, divide the
+    quota between them.
+    """
+    
+    SLOT_POLL = 0.05  # seconds between checks for a free concurrency slot
+    
+    def __init__(self, requests_per_minute: float = 60, tokens_per_minute: float = 0,
+                 max_concurrency: int = 5, min_concurrency: int = 1, max_retries: int = 4,
+                 base_backoff: float = 1.0, max_backoff: float = 60.0, latency_tolerance: float = 2.0):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.latency_tolerance = latency_tolerance
+        
+        self.concurrency = float(self.max_concurrency)
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.latency: Optional[float] = None           # EWMA of successful call latency
+        self.baseline_latency: Optional[float] = None  # slowly drifting minimum of the EWMA
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self.counters = {'calls': 0, 'retries': 0, 'rate_limited': 0, 'failures': 0}
+    
+    def _reserve(self, tokens: int) -> float:
+        """Take a slot and quota if available now; otherwise seconds to wait before retrying"""
+        now = time.monotonic()
+        with self._lock:
+            waits = [self.blocked_until - now]
+            if self.in_flight >= int(self.concurrency):
+                waits.append(self.SLOT_POLL)
+            if self.requests is not None:
+                waits.append(self.requests.wait_time(1, now))
+            if self.tokens is not None and tokens:
+                waits.append(self.tokens.wait_time(tokens, now))
+            
+            wait = max(waits)
+            if wait > 0:
+                return wait
+            
+            self.in_flight += 1
+            self.counters['calls'] += 1
+            if self.requests is not None:
+                self.requests.take(1)
+            if self.tokens is not None and tokens:
+                self.tokens.take(tokens)
+            return 0.0
+    
+    def _decrease(self, factor: float, now: float) -> bool:
+        """Multiplicative decrease, at most once per round trip so one burst counts once"""
+        if now - self._last_decrease < (self.latency or 1.0):
+            return False
+        self.concurrency = max(float(self.min_concurrency), self.concurrency * factor)
+        self._last_decrease = now
+        return True
+    
+    def _on_success(self, latency: float, result: Any, tokens: int):
+        now = time.monotonic()
+        with self._lock:
+            self.in_flight -= 1
+            
+            # Newer SDKs report actual usage; return what the estimate overcharged
+            usage = getattr(getattr(result, 'usage_metadata', None), 'total_token_count', None)
+            if self.tokens is not None and tokens and isinstance(usage, int):
+                self.tokens.refund(tokens - usage)
+            
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            if self.baseline_latency is None:
+                self.baseline_latency = self.latency
+            else:
+                self.baseline_latency = min(self.latency, self.baseline_latency * 1.002)
+            
+            if self.latency > self.latency_tolerance * self.baseline_latency:
+                self._decrease(0.9, now)
+            else:
+                self.concurrency = min(float(self.max_concurrency), self.concurrency + 1.0 / self.concurrency)
+    
+    def _on_error(self, error: Exception, attempt: int) -> Optional[float]:
+        """Release the slot and return the delay before retrying, or None to give up"""
+        now = time.monotonic()
+        rate_limited = is_rate_limit_error(error)
+        retry_after = retry_after_seconds(error) if rate_limited else None
+        
+        with self._lock:
+            self.in_flight -= 1
+            if rate_limited:
+                self.counters['rate_limited'] += 1
+                if self._decrease(0.5, now) and self.requests is not None:
+                    self.requests.drain()
+                if retry_after:
+                    self.blocked_until = max(self.blocked_until, now + retry_after)
+            
+            if not (rate_limited or is_transient_error(error)) or attempt >= self.max_retries:
+                self.counters['failures'] += 1
+                return None
+            self.counters['retries'] += 1
+        
+        # Full jitter; a server-provided delay is a floor
+        delay = random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+        if retry_after:
+            delay += retry_after
+        logger.warning(f"Gemini call failed ({str(error)[:100]}), retry {attempt + 1}/{self.max_retries} "
+                       f"in {delay:.2f}s")
+        return delay
+    
+    def call(self, fn: Callable, *args, tokens: int = 0, **kwargs) -> Any:
+        """
+        Call `fn(*args, **kwargs)` under the limiter, retrying throttled and transient failures.
+        
+        Args:
+            fn: Blocking API call
+            tokens: Estimated quota tokens the call consumes
+        
+        Returns:
+            Whatever `fn` returns
+        
+        Raises:
+            The last error once it is not retryable or retries are exhausted
+        """
+        attempt = 0
+        while True:
+            wait, waited = self._reserve(tokens), 0.0
+            while wait > 0:
+                time.sleep(wait)
+                waited += wait
+                wait = self._reserve(tokens)
+            if waited:
+                log_span('rate_limit_wait', waited, attempt=attempt)
+            
+            started = time.monotonic()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._on_error(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                log_span('retry_backoff', delay, attempt=attempt, error=type(e).__name__)
+                attempt += 1
+                continue
+            
+            self._on_success(time.monotonic() - started, result, tokens)
+            return result
+    
+    async def call_async(self, fn: Callable, *args, tokens: int = 0, **kwargs) -> Any:
+        """Async version of `call` for coroutine functions"""
+        attempt = 0
+        while True:
+            wait, waited = self._reserve(tokens), 0.0
+            while wait > 0:
+                await asyncio.sleep(wait)
+                waited += wait
+                wait = self._reserve(tokens)
+            if waited:
+                log_span('rate_limit_wait', waited, attempt=attempt)
+            
+            started = time.monotonic()
+            try:
+                result = await fn(*args, **kwargs)
+            except asyncio.CancelledError:
+                with self._lock:
+                    self.in_flight -= 1
+                raise
+            except Exception as e:
+                delay = self._on_error(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                log_span('retry_backoff', delay, attempt=attempt, error=type(e).__name__)
+                attempt += 1
+                continue
+            
+            self._on_success(time.monotonic() - started, result, tokens)
+            return result
+    
+    def stats(self) -> Dict:
+        """Counters and current adaptive state"""
+        with self._lock:
+            return {
+                **self.counters,
+                'concurrency_limit': round(self.concurrency, 2),
+                'in_flight': self.in_flight,
+                'latency_ewma': round(self.latency, 3) if self.latency is not None else None,
+                'blocked_for': round(max(0.0, self.blocked_until - time.monotonic()), 2)
+            }
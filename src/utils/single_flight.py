@@ -0,0 +1,244 @@
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from src.utils.cache import TwoTierCache
+from src.utils.metrics import SINGLE_FLIGHT
+
+logger = logging.getLogger(__name__)
+
+class SingleFlightTimeout(TimeoutError):
+    """Raised to a caller that gave up waiting for an identical call in flight"""
+
+class SingleFlightAbandoned(Exception):
+    """Raised to waiters when the call they were waiting for was cancelled"""
+
+class SingleFlightError(Exception):
+    """An identical call in another process failed; carries its error message"""
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+class SingleFlight:
+    """
+    In-process deduplication of identical concurrent calls.
+    
+    The first caller for a key runs the function; callers arriving while
+    it runs wait for its result (or exception) instead of repeating the
+    work, for up to `timeout` seconds. Nothing is remembered once the call
+    returns; caching stays the caller's job.
+    """
+    
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+    
+    def do(self, key: str, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """
+        Run `fn()` unless an identical call is in flight, and return its result.
+        
+        Raises:
+            SingleFlightTimeout: If the call in flight did not finish within `timeout`
+            Exception: Whatever `fn` (this caller's or the one waited for) raised
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        
+        if not leader:
+            if not call.done.wait(timeout):
+                SINGLE_FLIGHT.labels(self.name, 'timeout').inc()
+                raise SingleFlightTimeout(f"Gave up after {timeout:g}s waiting for an identical {self.name} call")
+            SINGLE_FLIGHT.labels(self.name, 'error' if call.error is not None else 'shared').inc()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        SINGLE_FLIGHT.labels(self.name, 'leader').inc()
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+class AsyncSingleFlight:
+    """
+    asyncio version of SingleFlight, for callers on one event loop.
+    
+    Besides `do`, keys can be claimed and settled by hand (`claim`,
+    `resolve`, `fail`), so one coroutine can lead several keys at once,
+    e.g. every persona of a batched prompt.
+    """
+    
+    def __init__(self, name: str):
+        self.name = name
+        self._futures: Dict[str, asyncio.Future] = {}
+    
+    def claim(self, key: str) -> Tuple[asyncio.Future, bool]:
+        """
+        Future for a key's result, and whether the caller leads it. A leader
+        must settle the key with `resolve` or `fail`.
+        """
+        future = self._futures.get(key)
+        if future is not None:
+            return future, False
+        future = self._futures[key] = asyncio.get_running_loop().create_future()
+        SINGLE_FLIGHT.labels(self.name, 'leader').inc()
+        return future, True
+    
+    def resolve(self, key: str, result: Any):
+        future = self._futures.pop(key)
+        if not future.done():
+            future.set_result(result)
+    
+    def fail(self, key: str, error: BaseException):
+        future = self._futures.pop(key)
+        if not future.done():
+            future.set_exception(error)
+            future.exception()  # retrieved here, so unawaited failures are not logged as errors
+    
+    async def wait(self, future: asyncio.Future, timeout: Optional[float] = None) -> Any:
+        """
+        Result of a key led by someone else.
+        
+        Raises:
+            SingleFlightTimeout: If it did not settle within `timeout`
+            Exception: Whatever the leader failed with
+        """
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            SINGLE_FLIGHT.labels(self.name, 'timeout').inc()
+            raise SingleFlightTimeout(f"Gave up after {timeout:g}s waiting for an identical {self.name} call")
+        except Exception:
+            SINGLE_FLIGHT.labels(self.name, 'error').inc()
+            raise
+        SINGLE_FLIGHT.labels(self.name, 'shared').inc()
+        return result
+    
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]], timeout: Optional[float] = None) -> Any:
+        """Await `fn()` unless an identical call is in flight, and return its result"""
+        future, leader = self.claim(key)
+        if not leader:
+            return await self.wait(future, timeout)
+        
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            self.fail(key, SingleFlightAbandoned(f"The {self.name} call being waited for was cancelled"))
+            raise
+        except Exception as e:
+            self.fail(key, e)
+            raise
+        self.resolve(key, result)
+        return result
+
+class SharedSingleFlight:
+    """
+    Deduplication of identical calls across processes sharing a cache
+    backend (redis or sqlite).
+    
+    The caller that takes the key's lock in the shared tier runs the
+    function, which is expected to store its result in `cache` under the
+    same key; other processes poll the cache until the result appears. A
+    failed call leaves its error in the lock for `error_ttl` seconds, so
+    waiting processes (and callers arriving right after) fail with it
+    instead of retrying at once. Locks expire after `lock_ttl` seconds in
+    case their holder dies.
+    """
+    
+    ERROR_PREFIX = b'!'
+    
+    def __init__(self, cache: TwoTierCache, lock_ttl: int = 120, error_ttl: int = 5, poll_interval: float = 0.1):
+        self.cache = cache
+        self.lock_ttl = lock_ttl
+        self.error_ttl = error_ttl
+        self.poll_interval = poll_interval
+    
+    def _lock_key(self, key: str) -> str:
+        return f"heuristics:{self.cache.namespace}:lock:{key}"
+    
+    def do(self, key: str, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """
+        Run `fn()` unless another process is already running it for `key`,
+        in which case wait for the value it caches. Without a shared tier,
+        or if it fails, `fn` simply runs.
+        
+        Raises:
+            SingleFlightTimeout: If the other process did not finish within `timeout`
+            SingleFlightError: If the other process failed
+            Exception: Whatever `fn` raised
+        """
+        backend = self.cache.backend
+        if backend is None:
+            return fn()
+        
+        lock_key = self._lock_key(key)
+        token = uuid.uuid4().hex.encode()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waited = False
+        while True:
+            try:
+                locked = backend.add(lock_key, token, self.lock_ttl)
+                holder = None if locked else backend.get(lock_key)
+            except Exception as e:
+                logger.warning(f"Shared lock unavailable for {self.cache.namespace}: {str(e)}")
+                return fn()
+            
+            if locked:
+                # The previous holder may have cached the value just before releasing the lock
+                value = self.cache.get(key) if waited else None
+                if value is not None:
+                    self._release(lock_key, token)
+                    return value
+                return self._run_locked(lock_key, token, fn)
+            
+            if holder is not None and holder.startswith(self.ERROR_PREFIX):
+                SINGLE_FLIGHT.labels(f"{self.cache.namespace}_shared", 'error').inc()
+                raise SingleFlightError(holder[1:].decode(errors='replace'))
+            
+            value = self.cache.get(key)
+            if value is not None:
+                SINGLE_FLIGHT.labels(f"{self.cache.namespace}_shared", 'shared').inc()
+                return value
+            if deadline is not None and time.monotonic() >= deadline:
+                SINGLE_FLIGHT.labels(f"{self.cache.namespace}_shared", 'timeout').inc()
+                raise SingleFlightTimeout(f"Gave up after {timeout:g}s waiting for another worker's "
+                                          f"{self.cache.namespace} call")
+            waited = True
+            time.sleep(self.poll_interval)
+    
+    def _run_locked(self, lock_key: str, token: bytes, fn: Callable[[], Any]) -> Any:
+        SINGLE_FLIGHT.labels(f"{self.cache.namespace}_shared", 'leader').inc()
+        try:
+            result = fn()
+        except Exception as e:
+            try:
+                self.cache.backend.set(lock_key, self.ERROR_PREFIX + str(e)[:500].encode(), self.error_ttl)
+            except Exception as backend_error:
+                logger.warning(f"Could not share failure for {self.cache.namespace}: {str(backend_error)}")
+            raise
+        self._release(lock_key, token)
+        return result
+    
+    def _release(self, lock_key: str, token: bytes):
+        try:
+            if self.cache.backend.get(lock_key) == token:
+                self.cache.backend.delete(lock_key)
+        except Exception as e:
+            # The lock expires on its own
+            logger.warning(f"Could not release shared lock for {self.cache.namespace}: {str(e)}")
@@ -0,0 +1,83 @@
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Current trace and innermost open span; contextvars follow the work into
+# job threads (JobManager copies the context) and the engine's event loop
+_trace_id: ContextVar[Optional[str]] = ContextVar('trace_id', default=None)
+_span_id: ContextVar[Optional[str]] = ContextVar('span_id', default=None)
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex
+
+def start_trace(trace_id: Optional[str] = None):
+    """
+    Make `trace_id` (or a new one) the current trace.
+    
+    Returns:
+        Token for `end_trace`
+    """
+    return _trace_id.set(trace_id or new_trace_id()), _span_id.set(None)
+
+def end_trace(tokens):
+    """Restore the trace that was current before `start_trace`"""
+    trace_token, span_token = tokens
+    try:
+        _span_id.reset(span_token)
+        _trace_id.reset(trace_token)
+    except ValueError:
+        # Ended in another context than it started in; nothing to restore there
+        pass
+
+def current_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+def log_span(name: str, duration: float, level: int = logging.INFO, span_id: Optional[str] = None, **attributes):
+    """
+    Write one finished span, as a child of the current span, to the JSON
+    logs; the trace id is added by TraceContextFilter.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    logger.log(level, f"span {name} {duration * 1000:.1f}ms", extra={
+        'span': name,
+        'span_id': span_id or uuid.uuid4().hex[:16],
+        'parent_span_id': _span_id.get(),
+        'duration_ms': round(duration * 1000, 3),
+        **attributes
+    })
+
+@contextmanager
+def span(name: str, level: int = logging.INFO, **attributes):
+    """
+    Time the block as a span of the current trace.
+    
+    Spans opened inside the block are its children. The block may add
+    attributes to the yielded dictionary; an exception is recorded as
+    `error` and re-raised.
+    """
+    span_id = uuid.uuid4().hex[:16]
+    token = _span_id.set(span_id)
+    started = time.perf_counter()
+    try:
+        yield attributes
+    except BaseException as e:
+        attributes['error'] = type(e).__name__
+        raise
+    finally:
+        _span_id.reset(token)
+        log_span(name, time.perf_counter() - started, level, span_id=span_id, **attributes)
+
+class TraceContextFilter(logging.Filter):
+    """Adds the current trace id to every log record, so all lines of a request can be grouped"""
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        trace_id = _trace_id.get()
+        if trace_id is not None:
+            record.trace_id = trace_id
+        return True
@@ -4,8 +4,11 @@ console.log('Dashboard JS Loaded');
 // Dashboard state management
 const DashboardState = {
     currentStep: 1,
-    populationData: null,
+    populationId: null,
+    populationSize: 0,
+    populationSummary: null,
     decisionAnalysis: null,
+    decisionId: null,
     simulationResults: null,
     
     // Step management
@@ -82,7 +85,10 @@ const PopulationManager = {
             const response = await HeuristicsAI.api.generatePopulation(size, parameters);
             
             if (response.success) {
-                DashboardState.populationData = response.population;
+                // The population stays on the server; keep only its handle
+                DashboardState.populationId = response.population_id;
+                DashboardState.populationSize = response.size;
+                DashboardState.populationSummary = response.summary;
                 
                 // Update status
                 document.getElementById('population-status').innerHTML = 
@@ -141,6 +147,7 @@ const DecisionManager = {
             
             if (response.success) {
                 DashboardState.decisionAnalysis = response.analysis;
+                DashboardState.decisionId = response.decision_id;
                 
                 // Update status
                 document.getElementById('analysis-status').innerHTML = 
@@ -170,9 +177,9 @@ const DecisionManager = {
     },
     
     updateSimulationPreview() {
-        if (DashboardState.populationData && DashboardState.decisionAnalysis) {
+        if (DashboardState.populationId && DashboardState.decisionAnalysis) {
             document.getElementById('preview-population-size').textContent = 
-                HeuristicsAI.utils.formatNumber(DashboardState.populationData.length);
+                HeuristicsAI.utils.formatNumber(DashboardState.populationSize);
             document.getElementById('preview-decision-type').textContent = 
                 DashboardState.decisionAnalysis.decision_type;
         }
@@ -184,7 +191,7 @@ const SimulationManager = {
     async runSimulation() {
         try {
             // Validate we have all required data
-            if (!DashboardState.populationData) {
+            if (!DashboardState.populationId) {
                 throw new Error('Population data is missing. Please go back and generate a population.');
             }
             
@@ -198,19 +205,27 @@ const SimulationManager = {
             // Get decision text from step 2
             const decisionText = document.getElementById('decision-text').value;
             
-            // Simulate progress updates
-            this.updateProgress(10, 'Initializing simulation...');
+            // Queue the job, then follow its real progress
+            this.updateProgress(0, 'Queued...');
+            const job = await HeuristicsAI.api.submitSimulation(
+                decisionText, DashboardState.populationId, DashboardState.decisionId
+            );
+            this.jobId = job.job_id;
             
-            await new Promise(resolve => setTimeout(resolve, 1000));
-            this.updateProgress(25, 'Processing population data...');
+            const response = await this.watchJob(job.job_id);
+            this.jobId = null;
             
-            // Call API
-            const response = await HeuristicsAI.api.runSimulation(decisionText, DashboardState.populationData);
-            
-            this.updateProgress(75, 'Analyzing reactions...');
-            await new Promise(resolve => setTimeout(resolve, 1000));
+            if (response.status === 'cancelled') {
+                this.hideProgress();
+                if (this.liveResults) {
+                    this.displayResults('Simulation cancelled: results cover the people simulated before it stopped');
+                }
+                this.liveResults = false;
+                HeuristicsAI.utils.showNotification('Simulation cancelled', 'info');
+                return;
+            }
             
-            if (response.success) {
+            if (response.status === 'completed') {
                 DashboardState.simulationResults = response.simulation_results;
                 
                 this.updateProgress(100, 'Simulation complete!');
@@ -219,7 +234,10 @@ const SimulationManager = {
                 setTimeout(() => {
                     this.hideProgress();
                     this.displayResults();
-                    DashboardState.nextStep();
+                    if (!this.liveResults) {
+                        DashboardState.nextStep();
+                    }
+                    this.liveResults = false;
                 }, 1500);
                 
                 HeuristicsAI.utils.showNotification('Simulation completed successfully!', 'success');
@@ -229,11 +247,97 @@ const SimulationManager = {
             
         } catch (error) {
             console.error('Simulation error:', error);
+            this.jobId = null;
+            this.liveResults = false;
             this.hideProgress();
             HeuristicsAI.utils.showNotification(error.message, 'error');
         }
     },
     
+    jobId: null,
+    pollInterval: 1000,
+    liveResults: false,
+    
+    // Follow a job over Server-Sent Events, rendering partial results as they arrive
+    watchJob(jobId) {
+        if (!window.EventSource) {
+            return this.pollJob(jobId);
+        }
+        
+        return new Promise((resolve, reject) => {
+            const source = new EventSource(`${HeuristicsAI.apiBaseUrl}/simulations/${jobId}/events`);
+            
+            source.addEventListener('progress', event => {
+                const status = JSON.parse(event.data);
+                this.showStatus(status);
+                if (status.partial_results && status.partial_results.total_population) {
+                    this.showLiveResults(status.partial_results, status);
+                }
+            });
+            
+            source.addEventListener('done', event => {
+                source.close();
+                resolve(JSON.parse(event.data));
+            });
+            
+            // Stream dropped (e.g. by a proxy); fall back to polling
+            source.onerror = () => {
+                source.close();
+                this.pollJob(jobId).then(resolve, reject);
+            };
+        });
+    },
+    
+    // Poll a job until it finishes, updating the progress bar with its real counts
+    async pollJob(jobId) {
+        while (true) {
+            const status = await HeuristicsAI.api.getSimulation(jobId);
+            
+            if (['completed', 'failed', 'cancelled'].includes(status.status)) {
+                return status;
+            }
+            
+            this.showStatus(status);
+            await new Promise(resolve => setTimeout(resolve, this.pollInterval));
+        }
+    },
+    
+    showStatus(status) {
+        if (status.stage === 'simulating' && status.total) {
+            this.updateProgress(
+                Math.floor(status.progress * 100),
+                `${HeuristicsAI.utils.formatNumber(status.completed)} / ${HeuristicsAI.utils.formatNumber(status.total)} people simulated`
+            );
+        } else {
+            this.updateProgress(0, status.stage === 'analyzing' ? 'Analyzing decision...' : 'Queued...');
+        }
+    },
+    
+    // Render partial results, moving to the results step on the first snapshot
+    showLiveResults(results, status) {
+        DashboardState.simulationResults = results;
+        if (!this.liveResults) {
+            this.liveResults = true;
+            DashboardState.nextStep();
+        }
+        this.displayResults(
+            `Live results: ${HeuristicsAI.utils.formatNumber(status.completed)} of ${HeuristicsAI.utils.formatNumber(status.total)} simulated so far`
+        );
+    },
+    
+    async cancelSimulation() {
+        if (!this.jobId) {
+            return;
+        }
+        
+        try {
+            await HeuristicsAI.api.cancelSimulation(this.jobId);
+        } catch (error) {
+            console.error('Cancel error:', error);
+            HeuristicsAI.utils.showNotification(error.message, 'error');
+        }
+    },
+    
     showProgress() {
         document.getElementById('simulation-progress').classList.remove('hidden');
     },
@@ -251,7 +355,7 @@ const SimulationManager = {
         }
     },
     
-    displayResults() {
+    displayResults(note = null) {
         const results = DashboardState.simulationResults;
         const resultsContainer = document.getElementById('results-content');
         
@@ -262,6 +366,7 @@ const SimulationManager = {
         
         // Build results HTML
         const html = `
+            ${note ? `<p class="text-sm text-blue-600 mb-4">${note}</p>` : ''}
             <div class="grid md:grid-cols-2 gap-8 mb-8">
                 <!-- Overall Sentiment -->
                 <div class="bg-gray-50 rounded-lg p-6">
@@ -395,6 +500,13 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    const cancelSimulationBtn = document.getElementById('cancel-simulation');
+    if (cancelSimulationBtn) {
+        cancelSimulationBtn.addEventListener('click', () => {
+            SimulationManager.cancelSimulation();
+        });
+    }
+    
     // Auto-resize textareas
     const textareas = document.querySelectorAll('textarea');
     textareas.forEach(textarea => {
@@ -113,12 +113,52 @@ const HeuristicsAI = {
             });
         },
         
-        // Run simulation
-        runSimulation: async function(decision, population) {
-            return await this.call('/run-simulation', 'POST', {
+        // Summary of a stored population
+        getPopulation: async function(populationId) {
+            return await this.call(`/populations/${populationId}`);
+        },
+        
+        // One page of people from a stored population
+        getPopulationPeople: async function(populationId, offset = 0, limit = 100) {
+            return await this.call(`/populations/${populationId}/people?offset=${offset}&limit=${limit}`);
+        },
+        
+        // Run simulation on a stored population; a decisionId from
+        // analyzeDecision reuses that analysis instead of the text
+        runSimulation: async function(decision, populationId, decisionId = null) {
+            return await this.call('/run-simulation', 'POST', decisionId ? {
+                decision_id: decisionId,
+                population_id: populationId
+            } : {
+                decision: decision,
+                population_id: populationId
+            });
+        },
+        
+        // Queue a simulation job; resolves with its job_id and status
+        submitSimulation: async function(decision, populationId, decisionId = null) {
+            return await this.call('/simulations', 'POST', decisionId ? {
+                decision_id: decisionId,
+                population_id: populationId
+            } : {
                 decision: decision,
-                population: population
+                population_id: populationId
             });
+        },
+        
+        // Job status, including results once completed
+        getSimulation: async function(jobId) {
+            return await this.call(`/simulations/${jobId}`);
+        },
+        
+        // Results over the reactions completed so far
+        getSimulationPartial: async function(jobId) {
+            return await this.call(`/simulations/${jobId}/partial`);
+        },
+        
+        // Stop a queued or running job
+        cancelSimulation: async function(jobId) {
+            return await this.call(`/simulations/${jobId}/cancel`, 'POST');
         }
     }
 };
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Simulation worker for Heuristics AI
+
+Processes distributed simulation tasks queued on REDIS_URL by web workers
+running with SIMULATION_BACKEND=redis. Start as many as needed, on any box
+that can reach Redis:
+
+    python worker.py
+"""
+
+import os
+import signal
+
+from prometheus_client import start_http_server
+
+from config import config
+from src.services.behavior_engine import BehaviorEngine
+from src.services.llm_provider import create_provider
+from src.services.simulation_worker import SimulationWorker
+from src.services.work_queue import RedisWorkQueue
+from src.utils.cache import TwoTierCache, create_cache_backend
+from src.utils.logger import setup_logger
+from src.utils.rate_limiter import AdaptiveRateLimiter
+
+def create_worker(config_name=None):
+    """Build a SimulationWorker from the same configuration as the web app"""
+    settings = config[config_name or os.environ.get('FLASK_ENV', 'default')]
+    setup_logger(settings.LOG_LEVEL)
+    
+    cache_backend = create_cache_backend(
+        settings.CACHE_BACKEND,
+        redis_url=settings.REDIS_URL,
+        sqlite_path=settings.CACHE_SQLITE_PATH,
+        max_entries=settings.CACHE_MAX_ENTRIES
+    )
+    rate_limiter = AdaptiveRateLimiter(
+        requests_per_minute=settings.GEMINI_REQUESTS_PER_MINUTE,
+        tokens_per_minute=settings.GEMINI_TOKENS_PER_MINUTE,
+        max_concurrency=settings.MAX_WORKERS,
+        max_retries=settings.GEMINI_MAX_RETRIES
+    )
+    llm_provider = create_provider(
+        settings.LLM_PROVIDER,
+        api_key=settings.GEMINI_API_KEY,
+        stub_latency=settings.STUB_LATENCY,
+        stub_latency_distribution=settings.STUB_LATENCY_DISTRIBUTION,
+        stub_error_rate=settings.STUB_ERROR_RATE,
+        stub_rate_limit_rate=settings.STUB_RATE_LIMIT_RATE,
+        stub_malformed_rate=settings.STUB_MALFORMED_RATE
+    )
+    behavior_engine = BehaviorEngine(
+        cache_ttl=settings.CACHE_TTL,
+        max_workers=settings.MAX_WORKERS,
+        cache=TwoTierCache('reactions', ttl=settings.CACHE_TTL, maxsize=5000, backend=cache_backend),
+        personas_per_prompt=settings.PERSONAS_PER_PROMPT,
+        max_batch_retries=settings.MAX_BATCH_RETRIES,
+        rate_limiter=rate_limiter,
+        provider=llm_provider,
+        coalesce_timeout=settings.COALESCE_TIMEOUT
+    )
+    
+    work_queue = RedisWorkQueue.from_url(
+        settings.REDIS_URL,
+        visibility_timeout=settings.QUEUE_VISIBILITY_TIMEOUT,
+        max_attempts=settings.QUEUE_MAX_ATTEMPTS
+    )
+    budget = work_queue.semaphore(settings.WORKER_GLOBAL_CONCURRENCY) if settings.WORKER_GLOBAL_CONCURRENCY else None
+    return SimulationWorker(work_queue, behavior_engine, concurrency=settings.WORKER_CONCURRENCY, budget=budget)
+
+if __name__ == '__main__':
+    worker = create_worker()
+    
+    # Finish the tasks in hand on SIGTERM/SIGINT, then exit
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: worker.stop())
+    
+    # Prometheus metrics of this worker (the web app's /api/metrics does not see them)
+    metrics_port = config[os.environ.get('FLASK_ENV', 'default')].WORKER_METRICS_PORT
+    if metrics_port:
+        start_http_server(metrics_port)
+    
+    worker.run()